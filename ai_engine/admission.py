@@ -0,0 +1,210 @@
+"""
+Admission control for the AI Engine's request endpoints.
+
+Each endpoint gets a lane with its own concurrency limit and a bounded wait
+queue; all lanes also share one process-wide capacity (the threadpool the
+sync endpoints run on). When a slot frees up, waiting requests are admitted
+in lane priority order, so a burst of /recommend calls cannot starve
+/guide/query. A request that finds its lane's queue full, or waits longer
+than the queue timeout, is shed with a 429 and a Retry-After estimated from
+the lane's recent service times.
+
+Each lane also tracks queue pressure (an exponentially weighted average of
+how full its queue is). Sustained pressure above DEGRADE_AT switches the
+lane to degraded until it falls below RECOVER_AT; endpoints check
+degraded() and serve a cheaper answer while it lasts.
+
+The controller is only used from middleware on the event loop, so it needs
+no locks; ResponseCache is read and filled from the threadpool.
+"""
+import json
+import math
+import time
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional
+
+from metrics import Counter, Gauge, Histogram
+
+ADMISSION = Counter("clustaura_admission_total", "Admission decisions by lane",
+                    ["lane", "outcome"])
+ADMISSION_WAIT = Histogram("clustaura_admission_wait_seconds", "Time spent queued before admission", ["lane"])
+ADMISSION_ACTIVE = Gauge("clustaura_admission_active", "Requests running per lane", ["lane"])
+ADMISSION_QUEUED = Gauge("clustaura_admission_queued", "Requests waiting per lane", ["lane"])
+ADMISSION_DEGRADED = Gauge("clustaura_admission_degraded", "1 while a lane is degraded", ["lane"])
+
+PRESSURE_ALPHA = 0.05
+DEGRADE_AT = 0.5
+RECOVER_AT = 0.2
+
+
+class Rejected(Exception):
+    def __init__(self, lane: str, reason: str, retry_after: int):
+        super().__init__(f"{lane}: {reason}")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Lane:
+    def __init__(self, name: str, limit: int, max_queue: int, priority: int):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        # Lower runs first when several lanes have waiters
+        self.priority = priority
+        self.active = 0
+        self.waiting: Deque[asyncio.Future] = deque()
+        self.pressure = 0.0
+        self.degraded = False
+        # EWMA of seconds per request, for Retry-After
+        self.service_time = 0.0
+
+    def sample_pressure(self):
+        fill = len(self.waiting) / self.max_queue if self.max_queue else float(self.active >= self.limit)
+        self.pressure += PRESSURE_ALPHA * (fill - self.pressure)
+        if not self.degraded and self.pressure > DEGRADE_AT:
+            self.degraded = True
+        elif self.degraded and self.pressure < RECOVER_AT:
+            self.degraded = False
+        ADMISSION_ACTIVE.set(self.active, lane=self.name)
+        ADMISSION_QUEUED.set(len(self.waiting), lane=self.name)
+        ADMISSION_DEGRADED.set(float(self.degraded), lane=self.name)
+
+    def retry_after(self) -> int:
+        # Time for the queue ahead to drain through `limit` slots
+        drain = (len(self.waiting) + 1) * (self.service_time or 1.0) / max(1, self.limit)
+        return max(1, math.ceil(drain))
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit, "max_queue": self.max_queue, "priority": self.priority,
+            "active": self.active, "queued": len(self.waiting), "pressure": round(self.pressure, 4),
+            "degraded": self.degraded, "service_time_ms": round(self.service_time * 1000, 3),
+        }
+
+
+class AdmissionController:
+    def __init__(self, capacity: int, queue_timeout: float):
+        self.capacity = capacity
+        self.queue_timeout = queue_timeout
+        self.lanes: Dict[str, Lane] = {}
+        self.active = 0
+
+    def add_lane(self, name: str, limit: int, max_queue: int, priority: int) -> Lane:
+        self.lanes[name] = Lane(name, limit, max_queue, priority)
+        return self.lanes[name]
+
+    def degraded(self, lane: str) -> bool:
+        return self.lanes[lane].degraded
+
+    def _can_run(self, lane: Lane) -> bool:
+        return lane.active < lane.limit and self.active < self.capacity
+
+    def _outranked(self, lane: Lane) -> bool:
+        # Someone of equal or higher priority is already waiting for a slot
+        return any(other.waiting and other.priority <= lane.priority and self._can_run(other)
+                   for other in self.lanes.values())
+
+    def _start(self, lane: Lane):
+        lane.active += 1
+        self.active += 1
+
+    async def acquire(self, name: str) -> float:
+        """Wait for a slot in lane `name`; returns seconds queued. Raises Rejected when shed."""
+        lane = self.lanes[name]
+        if self._can_run(lane) and not self._outranked(lane):
+            self._start(lane)
+            lane.sample_pressure()
+            ADMISSION.inc(lane=name, outcome="admitted")
+            return 0.0
+
+        if len(lane.waiting) >= lane.max_queue:
+            lane.sample_pressure()
+            ADMISSION.inc(lane=name, outcome="rejected")
+            raise Rejected(name, "queue full", lane.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        lane.waiting.append(waiter)
+        lane.sample_pressure()
+        queued = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # Admitted just as the timeout fired; take the slot
+                pass
+            else:
+                waiter.cancel()
+                lane.waiting.remove(waiter)
+                lane.sample_pressure()
+                ADMISSION.inc(lane=name, outcome="timeout")
+                raise Rejected(name, "queue timeout", lane.retry_after())
+        except asyncio.CancelledError:
+            # Client went away; hand the slot on if we were given one
+            if waiter.done() and not waiter.cancelled():
+                self.release(name, 0.0)
+            elif waiter in lane.waiting:
+                lane.waiting.remove(waiter)
+            raise
+
+        waited = time.perf_counter() - queued
+        ADMISSION_WAIT.observe(waited, lane=name)
+        ADMISSION.inc(lane=name, outcome="queued")
+        return waited
+
+    def release(self, name: str, seconds: float):
+        lane = self.lanes[name]
+        lane.active -= 1
+        self.active -= 1
+        if seconds:
+            lane.service_time += 0.1 * (seconds - lane.service_time) if lane.service_time else seconds
+        self._dispatch()
+        lane.sample_pressure()
+
+    def _dispatch(self):
+        """Hand free slots to waiters, highest priority lane first."""
+        for lane in sorted(self.lanes.values(), key=lambda l: l.priority):
+            while lane.waiting and self._can_run(lane):
+                waiter = lane.waiting.popleft()
+                if waiter.cancelled():
+                    continue
+                self._start(lane)
+                waiter.set_result(None)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity, "active": self.active, "queue_timeout": self.queue_timeout,
+            "lanes": {name: lane.describe() for name, lane in self.lanes.items()},
+        }
+
+
+class ResponseCache:
+    """
+    Small LRU of recent responses, keyed by request body. Filled on every
+    normal response and read only in degraded mode, where a slightly stale
+    answer beats a timeout.
+    """
+    def __init__(self, size: int):
+        self.size = size
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(payload: Dict[str, Any]) -> str:
+        return json.dumps(payload, sort_keys=True, default=str)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
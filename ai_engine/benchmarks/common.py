@@ -0,0 +1,61 @@
+"""Helpers shared by the benchmark scripts."""
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import subprocess
+from typing import Dict, List, Optional
+
+AI_ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentiles(latencies: List[float], scale: float = 1000.0) -> Dict[str, Optional[float]]:
+    """count / mean / p50 / p95 / p99 / max of latencies in seconds, reported in ms."""
+    if not latencies:
+        return {"count": 0, "mean_ms": None, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    ordered = sorted(latencies)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * scale, 4)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * scale, 4),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1] * scale, 4),
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux (bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0), 1)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=AI_ENGINE_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_metadata(**extra) -> Dict:
+    """Where and on what a result was produced, so runs can be compared fairly."""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        **extra,
+    }
+
+
+def write_report(report: Dict, out: Optional[str]):
+    text = json.dumps(report, indent=2, sort_keys=False)
+    print(text)
+    if out:
+        with open(out, "w") as f:
+            f.write(text + "\n")
@@ -0,0 +1,164 @@
+"""
+End-to-end benchmark of the AI Engine on a synthetic population.
+
+Runs the app in-process (FastAPI TestClient, so the full HTTP stack minus the
+socket) and measures:
+  - ingest: /ingest/user latency and throughput for the first --http-ingest
+    users, bulk index writes for the rest
+  - index_build: re-embedding every user into a fresh index version
+  - recommend: /recommend latency percentiles over generated problems
+  - guide: /guide/query latency percentiles
+  - memory: peak RSS of the process
+
+Run from the ai_engine directory:
+    python -m benchmarks.e2e --scale 10k --out e2e-10k.json
+
+The JSON report is stable in shape, so runs can be diffed against each other;
+benchmarks.regression runs a small fixed configuration of it as a CI gate.
+"""
+import os
+import sys
+import time
+import argparse
+from typing import Dict
+
+from benchmarks.common import AI_ENGINE_DIR, percentiles, peak_rss_mb, run_metadata, write_report
+from benchmarks.synthetic import (SCALES, generate_guide_queries, generate_problems, generate_taxonomy,
+                                  generate_users, taxonomy_size_for)
+
+BULK_BATCH = 10_000
+
+
+def _ingest(client, server, http_count: int, total: int, taxonomy, seed: int) -> Dict:
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    for user in generate_users(http_count, taxonomy, seed):
+        t = time.perf_counter()
+        response = client.post("/ingest/user", json=user)
+        latencies.append(time.perf_counter() - t)
+        errors += response.status_code != 200
+    http_seconds = time.perf_counter() - start
+
+    bulk_count = total - http_count
+    start = time.perf_counter()
+    batch, seq = [], 0
+    for user in generate_users(bulk_count, taxonomy, seed, start=http_count):
+        batch.append(user)
+        if len(batch) >= BULK_BATCH:
+            seq = server.index_handle.write_many(batch)
+            batch = []
+    if batch:
+        seq = server.index_handle.write_many(batch)
+    if seq:
+        server.index_handle.wait_for(seq)
+    bulk_seconds = time.perf_counter() - start
+
+    return {
+        "http": {
+            **percentiles(latencies),
+            "errors": errors,
+            "users_per_s": round(http_count / http_seconds, 2) if http_seconds else None,
+        },
+        "bulk": {
+            "count": bulk_count,
+            "seconds": round(bulk_seconds, 3),
+            "users_per_s": round(bulk_count / bulk_seconds, 2) if bulk_count and bulk_seconds else None,
+        },
+    }
+
+
+def _time_requests(client, path: str, payloads) -> Dict:
+    latencies, sizes = [], []
+    errors = 0
+    start = time.perf_counter()
+    for payload in payloads:
+        t = time.perf_counter()
+        response = client.post(path, json=payload)
+        latencies.append(time.perf_counter() - t)
+        if response.status_code != 200:
+            errors += 1
+        elif isinstance(response.json(), list):
+            sizes.append(len(response.json()))
+    elapsed = time.perf_counter() - start
+    result = {**percentiles(latencies), "errors": errors,
+              "requests_per_s": round(len(latencies) / elapsed, 2) if elapsed else None}
+    if sizes:
+        result["mean_results"] = round(sum(sizes) / len(sizes), 2)
+    return result
+
+
+def run(args) -> Dict:
+    os.chdir(AI_ENGINE_DIR)
+    sys.path.insert(0, AI_ENGINE_DIR)
+    # Per-request log lines would dominate the timings
+    os.environ.setdefault("CLUSTAURA_LOG_LEVEL", "WARNING")
+
+    from fastapi.testclient import TestClient
+    import server
+    from ontology import OntologyManager
+    from index_store import IndexSnapshot
+
+    n_users = SCALES.get(args.scale.lower()) or int(args.scale)
+    taxonomy = generate_taxonomy(args.skills or taxonomy_size_for(n_users), args.depth, args.fanout,
+                                 args.multi_parent, seed=args.seed)
+    report = {
+        "benchmark": "e2e",
+        "meta": run_metadata(scale=args.scale, users=n_users, skills=len(taxonomy), seed=args.seed,
+                             depth=args.depth, fanout=args.fanout, multi_parent=args.multi_parent),
+    }
+
+    started = time.perf_counter()
+    with TestClient(server.app) as client:
+        if not server.readiness.wait(args.timeout):
+            raise TimeoutError(f"engine not ready after {args.timeout}s")
+        report["startup"] = {"ready_s": round(time.perf_counter() - started, 3)}
+
+        # Fresh index on the synthetic taxonomy
+        t = time.perf_counter()
+        ontology = OntologyManager()
+        ontology.add_taxonomy(taxonomy)
+        server.index_handle.swap(IndexSnapshot(f"bench-{args.scale}", ontology, {}), carry_over=False)
+        report["taxonomy_load_s"] = round(time.perf_counter() - t, 3)
+
+        report["ingest"] = _ingest(client, server, min(n_users, args.http_ingest), n_users,
+                                   taxonomy, args.seed)
+
+        if not args.skip_index_build:
+            t = time.perf_counter()
+            server._rebuild_index(None)
+            seconds = time.perf_counter() - t
+            report["index_build"] = {"seconds": round(seconds, 3), "users_per_s": round(n_users / seconds, 2)}
+
+        report["recommend"] = _time_requests(client, "/recommend",
+                                             generate_problems(args.problems, taxonomy, args.seed))
+        report["guide"] = _time_requests(client, "/guide/query",
+                                         generate_guide_queries(args.guide_queries, args.seed))
+        report["index"] = server.index_handle.current.describe()
+
+    report["memory"] = {"peak_rss_mb": peak_rss_mb()}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", default="1k", help=f"one of {list(SCALES)} or a user count")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skills", type=int, default=None, help="taxonomy size (default grows with --scale)")
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--multi-parent", type=float, default=0.3)
+    parser.add_argument("--http-ingest", type=int, default=1000,
+                        help="users ingested through /ingest/user; the rest are bulk-written")
+    parser.add_argument("--skip-index-build", action="store_true",
+                        help="do not pre-embed users (recommend then embeds candidates lazily)")
+    parser.add_argument("--problems", type=int, default=200)
+    parser.add_argument("--guide-queries", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--out", default=None, help="write the JSON report here as well as stdout")
+    args = parser.parse_args(argv)
+    write_report(run(args), args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Compare the pre-forking launcher with the current uvicorn launcher.
+
+For each mode the engine is started as a subprocess and measured for:
+  - startup: seconds until the first response and until every worker answered
+  - memory: RSS and PSS (proportional set size, which credits shared
+    copy-on-write pages fractionally) per worker
+  - throughput: requests/second and latency percentiles under concurrent load
+
+Run from the ai_engine directory:
+    python -m benchmarks.launcher_bench --workers 4 --duration 20 --out launcher.json
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import subprocess
+import threading
+import statistics
+from typing import Dict, List
+
+import requests
+
+AI_ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    # The existing single-process dev launcher (with its reloader)
+    "dev": lambda port, workers, prefix: [sys.executable, "-c",
+                                          f"import uvicorn; uvicorn.run('server:app', host='127.0.0.1', port={port}, reload=True)"],
+    "uvicorn": lambda port, workers, prefix: [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1",
+                                              "--port", str(port), "--workers", str(workers)],
+    "prefork": lambda port, workers, prefix: [sys.executable, "launcher.py", "--host", "127.0.0.1", "--port", str(port),
+                                              "--workers", str(workers), "--shared-index", prefix],
+}
+# Modes run with a shared index; the others are baselines as deployed today
+SHARED_INDEX_MODES = {"prefork"}
+
+
+def memory_of(pid: int) -> Dict[str, float]:
+    """RSS and PSS of a process in MiB, from /proc/<pid>/smaps_rollup."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0][:-1].lower() + "_mb"] = int(parts[1]) / 1024.0
+    return values
+
+
+def wait_for_workers(base_url: str, workers: int, timeout: float, started: float):
+    """Returns (time to first response, time until all workers answered, worker pids)."""
+    first, pids = None, set()
+    while time.time() - started < timeout:
+        try:
+            status = requests.get(f"{base_url}/admin/index", timeout=1).json()
+            if first is None:
+                first = time.time() - started
+            pids.add(status.get("pid"))
+            pids.discard(None)
+            if len(pids) >= workers or (workers == 1 and first is not None):
+                return first, time.time() - started, pids
+        except requests.RequestException:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"engine did not become ready within {timeout}s")
+
+
+def seed_users(base_url: str, count: int):
+    skills = ["Python", "Machine Learning", "React", "Node.js", "Deep Learning"]
+    for i in range(count):
+        requests.post(f"{base_url}/ingest/user", json={
+            "user_id": f"bench_{i}",
+            "bio": f"Engineer {i} building {skills[i % len(skills)]} systems",
+            "skills": [skills[i % len(skills)], skills[(i * 7) % len(skills)]],
+        }, timeout=30)
+
+
+def drive_load(base_url: str, duration: float, concurrency: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def client(n):
+        session = requests.Session()
+        i = 0
+        while time.time() < deadline:
+            i += 1
+            start = time.perf_counter()
+            try:
+                if i % 2:
+                    r = session.post(f"{base_url}/guide/query", json={"query": "How do I post a problem?"}, timeout=30)
+                else:
+                    r = session.post(f"{base_url}/recommend", json={
+                        "problem_id": f"bench_{n}_{i}", "title": "Model drift",
+                        "description": "Our anomaly detector degrades in production",
+                        "required_skills": ["Machine Learning"],
+                    }, timeout=30)
+                ok = r.status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else None
+    return {
+        "requests_per_second": len(latencies) / duration,
+        "p50_ms": pick(0.50),
+        "p99_ms": pick(0.99),
+        "errors": errors[0],
+    }
+
+
+def bench_mode(mode: str, args) -> Dict:
+    port = args.port
+    prefix = f"bench_{mode}_{os.getpid()}" if mode in SHARED_INDEX_MODES else None
+    env = dict(os.environ)
+    env.pop("CLUSTAURA_SHARED_INDEX", None)
+    started = time.time()
+    proc = subprocess.Popen(MODES[mode](port, args.workers, prefix), cwd=AI_ENGINE_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        workers = 1 if mode == "dev" else args.workers
+        first, all_ready, pids = wait_for_workers(base_url, workers, args.timeout, started)
+        seed_users(base_url, args.users)
+        load = drive_load(base_url, args.duration, args.concurrency)
+        memory = [memory_of(pid) for pid in pids if os.path.exists(f"/proc/{pid}")]
+        return {
+            "mode": mode,
+            "workers": workers,
+            "startup_first_response_s": first,
+            "startup_all_workers_s": all_ready,
+            "rss_mb_per_worker": statistics.mean(m["rss_mb"] for m in memory) if memory else None,
+            "pss_mb_per_worker": statistics.mean(m["pss_mb"] for m in memory) if memory else None,
+            **load,
+        }
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+        if prefix:
+            subprocess.run([sys.executable, "shared_index.py", "cleanup", prefix],
+                           cwd=AI_ENGINE_DIR, stdout=subprocess.DEVNULL)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="uvicorn,prefork", help=f"comma separated subset of {list(MODES)}")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=180.0)
+    parser.add_argument("--out", default=None, help="write results JSON here as well as stdout")
+    args = parser.parse_args(argv)
+
+    results = [bench_mode(mode, args) for mode in args.modes.split(",")]
+    report = json.dumps({"benchmark": "launcher", "results": results}, indent=2)
+    print(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Open-loop load test of the AI Engine under a mixed workload.
+
+Drives the app in-process through httpx's ASGI transport (no sockets; the
+app shares this process's event loop), or a running server with --url.
+Requests arrive at --rate per second (Poisson or evenly spaced) whatever the
+server does, in a --mix of:
+  - recommend: /recommend with generated problems
+  - ingest: /ingest/user with new users (index writes under reads)
+  - guide: /guide/query
+
+Latency is measured from when a request was due, not when it was sent, so a
+stalled server shows up as queueing rather than as fewer slow samples
+(coordinated omission). "service" latency is from send to response. An
+event-loop lag probe sleeps for 10 ms in a loop and records the overshoot:
+in-process that is the server's loop, so blocking work in async endpoints
+(head-of-line blocking) shows up there directly.
+
+Run from the ai_engine directory:
+    python -m benchmarks.loadtest --rate 50 --duration 30 --mix recommend=6,ingest=2,guide=2
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --rate 200 --duration 60
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from contextlib import asynccontextmanager
+from typing import Dict, List, Tuple
+
+import httpx
+
+from benchmarks.common import AI_ENGINE_DIR, percentiles, run_metadata, write_report
+from benchmarks.synthetic import (generate_guide_queries, generate_problems, generate_taxonomy, generate_user,
+                                  generate_users, skill_levels)
+
+ENDPOINTS = {"recommend": "/recommend", "ingest": "/ingest/user", "guide": "/guide/query"}
+LAG_PROBE_INTERVAL = 0.01
+
+# (seconds after start the request is due, endpoint name, JSON payload)
+Request = Tuple[float, str, Dict]
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"unknown endpoint {name!r}; expected one of {list(ENDPOINTS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def build_schedule(args, taxonomy) -> List[Request]:
+    """Arrival times and payloads for the whole run, generated up front so generation is not timed."""
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    total = int(args.rate * args.duration)
+
+    problems = generate_problems(total, taxonomy, args.seed)
+    guide_queries = generate_guide_queries(total, args.seed)
+    levels = skill_levels(taxonomy)
+    new_user = args.users
+
+    schedule, at = [], 0.0
+    for i in range(total):
+        at = rng.expovariate(args.rate) + at if args.arrivals == "poisson" else i / args.rate
+        name = rng.choices(names, weights)[0]
+        if name == "recommend":
+            payload = next(problems)
+        elif name == "guide":
+            payload = next(guide_queries)
+        else:
+            # Users past the seeded population, so every ingest is a write
+            payload = generate_user(new_user, levels, args.seed)
+            new_user += 1
+        schedule.append((at, name, payload))
+    return schedule
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {name: [] for name in ENDPOINTS}
+        self.service: Dict[str, List[float]] = {name: [] for name in ENDPOINTS}
+        self.statuses: Dict[str, Dict[str, int]] = {name: {} for name in ENDPOINTS}
+        self.loop_lag: List[float] = []
+
+    def record(self, name: str, status: str, latency: float, service: float):
+        self.statuses[name][status] = self.statuses[name].get(status, 0) + 1
+        if status == "200":
+            self.latencies[name].append(latency)
+            self.service[name].append(service)
+
+    def report(self, elapsed: float) -> Dict:
+        endpoints, sent, errors = {}, 0, 0
+        for name in ENDPOINTS:
+            count = sum(self.statuses[name].values())
+            if not count:
+                continue
+            failed = count - self.statuses[name].get("200", 0)
+            sent += count
+            errors += failed
+            endpoints[name] = {
+                "latency": percentiles(self.latencies[name]),
+                "service": percentiles(self.service[name]),
+                "statuses": self.statuses[name],
+                "error_rate": round(failed / count, 4),
+                "requests_per_s": round(count / elapsed, 2),
+            }
+        return {
+            "endpoints": endpoints,
+            "total": {"requests": sent, "errors": errors, "error_rate": round(errors / sent, 4) if sent else None,
+                      "requests_per_s": round(sent / elapsed, 2), "seconds": round(elapsed, 3)},
+            "loop_lag": percentiles(self.loop_lag),
+        }
+
+
+async def _lag_probe(recorder: Recorder, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        due = loop.time() + LAG_PROBE_INTERVAL
+        await asyncio.sleep(LAG_PROBE_INTERVAL)
+        recorder.loop_lag.append(max(0.0, loop.time() - due))
+
+
+async def _send(client: httpx.AsyncClient, request: Request, due: float, limit: asyncio.Semaphore,
+                recorder: Recorder, timeout: float):
+    _, name, payload = request
+    async with limit:
+        sent = time.perf_counter()
+        try:
+            response = await client.post(ENDPOINTS[name], json=payload, timeout=timeout)
+            status = str(response.status_code)
+        except httpx.TimeoutException:
+            status = "timeout"
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        done = time.perf_counter()
+    recorder.record(name, status, done - due, done - sent)
+
+
+async def drive(client: httpx.AsyncClient, schedule: List[Request], args) -> Dict:
+    """Fire every request at its due time; --max-in-flight bounds concurrency (the rest queue)."""
+    recorder = Recorder()
+    limit = asyncio.Semaphore(args.max_in_flight)
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_lag_probe(recorder, stop))
+
+    start = time.perf_counter()
+    tasks = []
+    for request in schedule:
+        due = start + request[0]
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(_send(client, request, due, limit, recorder, args.request_timeout)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe
+    return recorder.report(elapsed)
+
+
+async def _wait_ready(client: httpx.AsyncClient, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if (await client.get("/health/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.25)
+    raise TimeoutError(f"engine not ready after {timeout}s")
+
+
+async def _seed_over_http(client: httpx.AsyncClient, taxonomy, args):
+    limit = asyncio.Semaphore(args.max_in_flight)
+
+    async def post(user):
+        async with limit:
+            await client.post("/ingest/user", json=user, timeout=args.request_timeout)
+
+    await asyncio.gather(*(post(user) for user in generate_users(args.users, taxonomy, args.seed)))
+
+
+@asynccontextmanager
+async def engine_client(args):
+    """
+    (client, server module) for --url, or for the app started in this process
+    (server is None for --url). Waits until the engine is ready.
+    """
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url) as client:
+            await _wait_ready(client, args.timeout)
+            yield client, None
+        return
+
+    os.chdir(AI_ENGINE_DIR)
+    sys.path.insert(0, AI_ENGINE_DIR)
+    # Per-request log lines would dominate the timings
+    os.environ.setdefault("CLUSTAURA_LOG_LEVEL", "WARNING")
+    import server
+
+    # ASGITransport does not run lifespan events, so drive startup/shutdown here
+    async with server.app.router.lifespan_context(server.app):
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, server.readiness.wait, args.timeout):
+            raise TimeoutError(f"engine not ready after {args.timeout}s")
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://in-process") as client:
+            yield client, server
+
+
+async def run(args, taxonomy, schedule) -> Dict:
+    async with engine_client(args) as (client, server):
+        if server is None:
+            await _seed_over_http(client, taxonomy, args)
+            return {"target": args.url, **await drive(client, schedule, args)}
+
+        from ontology import OntologyManager
+        from index_store import IndexSnapshot
+
+        ontology = OntologyManager()
+        ontology.add_taxonomy(taxonomy)
+        server.index_handle.swap(IndexSnapshot("loadtest", ontology, {}), carry_over=False)
+        seq = server.index_handle.write_many(list(generate_users(args.users, taxonomy, args.seed)))
+        server.index_handle.wait_for(seq)
+        if not args.skip_index_build:
+            await asyncio.get_running_loop().run_in_executor(None, server._rebuild_index, None)
+
+        result = await drive(client, schedule, args)
+        return {"target": "in-process", **result, "index": server.index_handle.status()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="load a running server instead of the in-process app")
+    parser.add_argument("--mix", default="recommend=6,ingest=2,guide=2",
+                        help=f"comma separated name=weight over {list(ENDPOINTS)}")
+    parser.add_argument("--rate", type=float, default=20.0, help="target requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--arrivals", choices=("poisson", "uniform"), default="poisson")
+    parser.add_argument("--max-in-flight", type=int, default=256,
+                        help="client-side concurrency cap; requests past it queue (and their latency counts)")
+    parser.add_argument("--users", type=int, default=1000, help="users seeded before the run")
+    parser.add_argument("--skills", type=int, default=500)
+    parser.add_argument("--skip-index-build", action="store_true",
+                        help="in-process: do not pre-embed the seeded users")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--request-timeout", type=float, default=30.0)
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds to wait for the engine to be ready")
+    parser.add_argument("--out", default=None, help="write the JSON report here as well as stdout")
+    args = parser.parse_args(argv)
+
+    taxonomy = generate_taxonomy(args.skills, seed=args.seed)
+    schedule = build_schedule(args, taxonomy)
+    result = asyncio.run(run(args, taxonomy, schedule))
+    write_report({
+        "benchmark": "loadtest",
+        "meta": run_metadata(mix=parse_mix(args.mix), rate=args.rate, duration=args.duration,
+                             arrivals=args.arrivals, users=args.users, skills=args.skills, seed=args.seed),
+        **result,
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Micro-benchmarks for OntologyManager on large synthetic skill DAGs.
+
+The seeded taxonomy has nine skills, which hides how the traversals scale:
+_is_subskill_of and _get_distance walk every path to the roots (exponential in
+depth once skills have several parents) and _calculate_levels_and_weights
+uses list.pop(0) as a queue. Each configuration below builds a generated DAG
+and times:
+  - taxonomy_load: add_taxonomy (graph writes + level calculation)
+  - levels: _calculate_levels_and_weights on the loaded graph
+  - skill_similarity / calculate_user_similarity / find_capable_users on the
+    frozen snapshot requests are served from
+
+Single calls are cut off after --call-timeout seconds (counted as timeouts)
+so the exponential cases finish; each benchmark also has a time budget.
+
+Run from the ai_engine directory:
+    python -m benchmarks.ontology_bench --out benchmarks/baselines/ontology.json
+    python -m benchmarks.ontology_bench --configs deep-10k --budget 2
+"""
+import sys
+import time
+import random
+import signal
+import argparse
+from typing import Callable, Dict, List
+
+from benchmarks.common import AI_ENGINE_DIR, percentiles, run_metadata, write_report
+from benchmarks.synthetic import generate_taxonomy, skill_levels
+
+sys.path.insert(0, AI_ENGINE_DIR)
+from ontology import OntologyManager  # noqa: E402
+
+CONFIGS = {
+    # Broad and shallow: many skills, moderate multiple inheritance
+    "wide-10k": dict(skills=10_000, depth=6, fanout=6, multi_parent=0.5, max_parents=3, parent_span=0),
+    # Narrow and deep: every skill has 2-4 parents on the level above, so the
+    # number of root paths grows exponentially with depth
+    "deep-10k": dict(skills=10_000, depth=12, fanout=2, multi_parent=1.0, max_parents=4, parent_span=1),
+    "wide-100k": dict(skills=100_000, depth=7, fanout=6, multi_parent=0.5, max_parents=3, parent_span=0),
+    "deep-100k": dict(skills=100_000, depth=14, fanout=2, multi_parent=1.0, max_parents=4, parent_span=1),
+}
+USERS = 1000
+
+
+class CallTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise CallTimeout()
+
+
+def _timed_calls(fn: Callable[[int], object], iterations: int, budget: float, call_timeout: float) -> Dict:
+    """Call fn(i) up to `iterations` times within `budget` seconds; each call is cut off at call_timeout."""
+    latencies: List[float] = []
+    timeouts = 0
+    deadline = time.perf_counter() + budget
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    try:
+        for i in range(iterations):
+            if time.perf_counter() > deadline:
+                break
+            start = time.perf_counter()
+            signal.setitimer(signal.ITIMER_REAL, call_timeout)
+            try:
+                fn(i)
+                latencies.append(time.perf_counter() - start)
+            except CallTimeout:
+                timeouts += 1
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    finally:
+        signal.signal(signal.SIGALRM, previous)
+    return {**percentiles(latencies), "timeouts": timeouts}
+
+
+def bench_config(name: str, config: Dict, args) -> Dict:
+    rng = random.Random(args.seed)
+    taxonomy = generate_taxonomy(config["skills"], config["depth"], config["fanout"], config["multi_parent"],
+                                 config["max_parents"], seed=args.seed, parent_span=config["parent_span"])
+    levels = skill_levels(taxonomy)
+    deepest = [skill for level in levels[len(levels) // 2:] for skill in level]
+    shallow = [skill for level in levels[1:3] for skill in level] or levels[0]
+    result = {"config": config, "edges": sum(len(p) for p in taxonomy.values())}
+
+    start = time.perf_counter()
+    ontology = OntologyManager()
+    ontology.add_taxonomy(taxonomy)
+    result["taxonomy_load_s"] = round(time.perf_counter() - start, 4)
+
+    result["levels"] = _timed_calls(lambda i: ontology._calculate_levels_and_weights(),
+                                    args.level_runs, args.budget, max(args.call_timeout, 60.0))
+
+    for i in range(USERS):
+        ontology.add_user({"user_id": f"user_{i}", "skills": rng.sample(deepest, 3)})
+    snapshot = ontology.freeze()
+
+    pairs = [(rng.choice(deepest), rng.choice(deepest)) for _ in range(args.iterations)]
+    result["skill_similarity"] = _timed_calls(
+        lambda i: snapshot.skill_similarity(*pairs[i]), args.iterations, args.budget, args.call_timeout)
+
+    profiles = [(rng.sample(deepest, 5), rng.sample(deepest, 3)) for _ in range(args.iterations)]
+    result["calculate_user_similarity"] = _timed_calls(
+        lambda i: snapshot.calculate_user_similarity(*profiles[i]), args.iterations, args.budget, args.call_timeout)
+
+    # Shallow requirements force the inheritance walk for every owned skill
+    queries = [rng.sample(shallow, min(2, len(shallow))) for _ in range(args.iterations)]
+    result["find_capable_users"] = _timed_calls(
+        lambda i: snapshot.find_capable_users(queries[i]), args.iterations, args.budget, args.call_timeout)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", default=",".join(CONFIGS), help=f"comma separated subset of {list(CONFIGS)}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=200, help="calls per benchmark (at most)")
+    parser.add_argument("--level-runs", type=int, default=3)
+    parser.add_argument("--budget", type=float, default=10.0, help="seconds per benchmark")
+    parser.add_argument("--call-timeout", type=float, default=2.0, help="seconds before a single call is abandoned")
+    parser.add_argument("--out", default=None, help="write the JSON report here as well as stdout")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.configs.split(","):
+        print(f"Benchmarking {name}...", file=sys.stderr)
+        results[name] = bench_config(name, CONFIGS[name], args)
+    write_report({
+        "benchmark": "ontology",
+        "meta": run_metadata(seed=args.seed, iterations=args.iterations, budget=args.budget,
+                             call_timeout=args.call_timeout, users=USERS),
+        "results": results,
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
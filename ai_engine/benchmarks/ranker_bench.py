@@ -0,0 +1,125 @@
+"""
+Benchmark for HybridRanker.rank_top_k: the threshold algorithm against the
+full scan.
+
+Builds a synthetic population and taxonomy (sized as benchmarks.synthetic
+does) with random unit vectors as embeddings. For each problem, ontology
+and semantic scores of the candidate pool are computed up front (outside
+the timings), as /recommend would have them. Times, for each --k value:
+  - scan: rank() over every candidate, first k kept
+  - threshold: sorting the ontology and semantic scores into
+    SortedFeatures, then threshold_top_k and rank() for its k users
+    (experience and activity features are built once, as per epoch)
+and reports how many candidates the threshold algorithm scored, and checks
+that both strategies return the same match scores.
+
+--pool all ranks every user (as with candidate_ids or a broad problem);
+--pool capable ranks the ontology's capable users only.
+
+Run from the ai_engine directory:
+    python -m benchmarks.ranker_bench --users 50000 --out benchmarks/baselines/ranker.json
+"""
+import sys
+import time
+import argparse
+from types import SimpleNamespace
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.common import AI_ENGINE_DIR, peak_rss_mb, percentiles, run_metadata, write_report
+from benchmarks.synthetic import generate_problems, generate_taxonomy, generate_users, taxonomy_size_for
+
+sys.path.insert(0, AI_ENGINE_DIR)
+from ontology import OntologyManager, SkillClosure  # noqa: E402
+from ranker import HybridRanker, SortedFeature, threshold_top_k  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--problems", type=int, default=10)
+    parser.add_argument("--k", default="10,50,100")
+    parser.add_argument("--pool", choices=["all", "capable"], default="all")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="write the JSON report here as well as stdout")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    taxonomy = generate_taxonomy(taxonomy_size_for(args.users), seed=args.seed)
+    ontology = OntologyManager()
+    ontology.add_taxonomy(taxonomy)
+    users = {user["user_id"]: user for user in generate_users(args.users, taxonomy, seed=args.seed)}
+    for user in users.values():
+        ontology.add_user(user)
+    closure = SkillClosure(ontology.freeze())
+    user_ids = list(users)
+    rng = np.random.default_rng(args.seed)
+    embeddings = rng.standard_normal((len(users), args.dim)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    row_of = {uid: row for row, uid in enumerate(user_ids)}
+    print(f"Built {args.users} users in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    ranker = HybridRanker()
+    start = time.perf_counter()
+    profile = ranker.profile_features(users)
+    profile_s = time.perf_counter() - start
+
+    queries = []
+    for problem in generate_problems(args.problems, taxonomy, seed=args.seed):
+        candidates = user_ids if args.pool == "all" else closure.find_capable_users(problem["required_skills"])
+        if not candidates:
+            continue
+        # The problem's embedding sits near one user's, so some candidates score high
+        query = embeddings[rng.integers(len(user_ids))] + 0.5 * rng.standard_normal(args.dim).astype(np.float32)
+        query /= np.linalg.norm(query)
+        rows = np.asarray([row_of[uid] for uid in candidates])
+        cosines = (embeddings[rows] @ query).tolist()
+        semantic = dict(zip(candidates, cosines))
+        onto = {uid: closure.calculate_user_similarity(users[uid]["skills"], problem["required_skills"])
+                for uid in candidates}
+        queries.append((SimpleNamespace(**problem), candidates, semantic, onto))
+    print(f"Scored {len(queries)} problems in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    results: Dict[str, Dict] = {}
+    for k in [int(value) for value in args.k.split(",")]:
+        scan: List[float] = []
+        threshold: List[float] = []
+        touched: List[float] = []
+        mismatches = 0
+        for problem, candidates, semantic, onto in queries:
+            start = time.perf_counter()
+            expected = ranker.rank(candidates, problem, users, semantic, onto)[:k]
+            scan.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            got = ranker.rank_top_k(k, candidates, problem, users, SortedFeature.from_scores(semantic),
+                                    SortedFeature.from_scores(onto), profile)
+            threshold.append(time.perf_counter() - start)
+
+            mismatches += [r["match_score"] for r in got] != [r["match_score"] for r in expected]
+            features = [(ranker.w_ontology, SortedFeature.from_scores(onto)),
+                        (ranker.w_semantic, SortedFeature.from_scores(semantic)),
+                        (ranker.w_experience, profile[0]), (ranker.w_activity, profile[1])]
+            _, scored = threshold_top_k(features, k, set(candidates))
+            touched.append(scored / len(candidates))
+        results[f"k={k}"] = {
+            "scan": percentiles(scan),
+            "threshold": percentiles(threshold),
+            "scored_fraction_mean": round(float(np.mean(touched)), 4) if touched else None,
+            "score_mismatches": mismatches,
+        }
+
+    write_report({
+        "benchmark": "ranker",
+        "meta": run_metadata(users=args.users, dim=args.dim, problems=len(queries), pool=args.pool, seed=args.seed),
+        "profile_features_s": round(profile_s, 4),
+        "candidates_mean": round(float(np.mean([len(q[1]) for q in queries])), 1) if queries else 0,
+        "results": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Performance regression gate.
+
+Runs a fast subset of the benchmarks (a few seconds of work after model
+load) on one pinned CPU with CPU-only torch and one thread everywhere, then
+compares each metric with benchmarks/baselines/regression.json:
+
+    allowed = baseline * (1 + tolerance) + slack_ms
+
+Exit status is 1 if any metric is above its allowance or has no recorded
+baseline, with a table of every metric, its baseline and the change.
+
+Baselines are machine-specific: record them on the machine that runs the
+gate (e.g. the CI runner) with --update, which keeps existing tolerances.
+
+Run from the ai_engine directory:
+    python -m benchmarks.regression
+    python -m benchmarks.regression --update
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+from typing import Dict, List, Optional
+
+from benchmarks.common import AI_ENGINE_DIR, run_metadata
+
+BASELINE_PATH = os.path.join(AI_ENGINE_DIR, "benchmarks", "baselines", "regression.json")
+
+FAST_E2E = dict(scale="400", skills=300, depth=5, fanout=4, multi_parent=0.3,
+                http_ingest=150, problems=60, guide_queries=60)
+# Deep enough for multiple inheritance to matter, small enough to finish quickly
+FAST_ONTOLOGY = dict(skills=3000, depth=8, fanout=2, multi_parent=1.0, max_parents=3, parent_span=1)
+
+# metric -> (relative tolerance, absolute slack in ms)
+DEFAULT_TOLERANCES = {
+    "ingest.p50_ms": (0.25, 0.5),
+    "ingest.p95_ms": (0.35, 1.0),
+    "recommend.p50_ms": (0.25, 0.5),
+    "recommend.p95_ms": (0.35, 1.0),
+    "recommend.p99_ms": (0.50, 2.0),
+    "guide.p50_ms": (0.25, 0.5),
+    "guide.p95_ms": (0.35, 1.0),
+    "ontology.levels.p50_ms": (0.30, 1.0),
+    "ontology.skill_similarity.p50_ms": (0.30, 0.05),
+    "ontology.calculate_user_similarity.p50_ms": (0.30, 0.1),
+    "ontology.find_capable_users.p50_ms": (0.30, 0.5),
+}
+
+
+def pin_environment(cpu: Optional[int]):
+    """One thread, CPU-only, optionally one core; must run before torch is imported."""
+    sys.path.insert(0, AI_ENGINE_DIR)
+    from launcher import limit_threads
+    limit_threads(1)
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {cpu})
+
+
+def collect(seed: int) -> Dict[str, Optional[float]]:
+    """One run of the fast subset, flattened to metric -> value."""
+    from benchmarks import e2e, ontology_bench
+
+    report = e2e.run(argparse.Namespace(seed=seed, timeout=300.0, skip_index_build=False, **FAST_E2E))
+    onto = ontology_bench.bench_config("regression", FAST_ONTOLOGY, argparse.Namespace(
+        seed=seed, iterations=100, level_runs=3, budget=3.0, call_timeout=1.0))
+
+    metrics = {
+        "ingest.p50_ms": report["ingest"]["http"]["p50_ms"],
+        "ingest.p95_ms": report["ingest"]["http"]["p95_ms"],
+        "recommend.p50_ms": report["recommend"]["p50_ms"],
+        "recommend.p95_ms": report["recommend"]["p95_ms"],
+        "recommend.p99_ms": report["recommend"]["p99_ms"],
+        "guide.p50_ms": report["guide"]["p50_ms"],
+        "guide.p95_ms": report["guide"]["p95_ms"],
+    }
+    for name in ("levels", "skill_similarity", "calculate_user_similarity", "find_capable_users"):
+        # A timed-out call is a regression however fast the others were
+        metrics[f"ontology.{name}.p50_ms"] = None if onto[name]["timeouts"] else onto[name]["p50_ms"]
+    errors = report["recommend"]["errors"] + report["guide"]["errors"] + report["ingest"]["http"]["errors"]
+    if errors:
+        raise RuntimeError(f"{errors} requests failed during the regression run")
+    return metrics
+
+
+def median_of(runs: List[Dict[str, Optional[float]]]) -> Dict[str, Optional[float]]:
+    merged = {}
+    for metric in runs[0]:
+        values = [run[metric] for run in runs]
+        merged[metric] = None if any(v is None for v in values) else round(statistics.median(values), 4)
+    return merged
+
+
+def compare(current: Dict[str, Optional[float]], baseline: Dict) -> List[Dict]:
+    rows = []
+    for metric, value in current.items():
+        entry = baseline.get("metrics", {}).get(metric, {})
+        tolerance, slack = DEFAULT_TOLERANCES.get(metric, (0.25, 0.5))
+        tolerance = entry.get("tolerance", tolerance)
+        slack = entry.get("slack_ms", slack)
+        base = entry.get("baseline")
+
+        if base is None:
+            # An unrecorded baseline would pass everything; record one with --update
+            status, allowed = "MISSING BASELINE", None
+        elif value is None:
+            status, allowed = "REGRESSION (timed out)", base * (1 + tolerance) + slack
+        else:
+            allowed = base * (1 + tolerance) + slack
+            if value > allowed:
+                status = "REGRESSION"
+            elif value < base * (1 - tolerance) - slack:
+                status = "improved"
+            else:
+                status = "ok"
+        rows.append({"metric": metric, "baseline": base, "current": value, "allowed": allowed, "status": status})
+    return rows
+
+
+def format_table(rows: List[Dict]) -> str:
+    fmt = lambda v: "-" if v is None else f"{v:.3f}"
+    lines = [f"{'metric':<44}{'baseline':>12}{'current':>12}{'change':>10}{'allowed':>12}  status"]
+    for row in rows:
+        change = "-"
+        if row["baseline"] and row["current"] is not None:
+            change = f"{(row['current'] - row['baseline']) / row['baseline'] * 100:+.1f}%"
+        lines.append(f"{row['metric']:<44}{fmt(row['baseline']):>12}{fmt(row['current']):>12}{change:>10}"
+                     f"{fmt(row['allowed']):>12}  {row['status']}")
+    return "\n".join(lines)
+
+
+def load_baseline(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {"metrics": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_baseline(path: str, current: Dict[str, Optional[float]], previous: Dict, runs: int):
+    metrics = {}
+    for metric, value in current.items():
+        old = previous.get("metrics", {}).get(metric, {})
+        tolerance, slack = DEFAULT_TOLERANCES.get(metric, (0.25, 0.5))
+        metrics[metric] = {
+            "baseline": value,
+            "tolerance": old.get("tolerance", tolerance),
+            "slack_ms": old.get("slack_ms", slack),
+        }
+    baseline = {
+        "meta": run_metadata(runs=runs, e2e=FAST_E2E, ontology=FAST_ONTOLOGY),
+        "metrics": metrics,
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2)
+        f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--runs", type=int, default=3, help="take the median of this many runs")
+    parser.add_argument("--cpu", type=int, default=0, help="CPU to pin to (-1 = do not pin)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--update", action="store_true", help="record this run as the new baseline")
+    args = parser.parse_args(argv)
+
+    pin_environment(None if args.cpu < 0 else args.cpu)
+    runs = []
+    for i in range(args.runs):
+        print(f"Regression run {i + 1}/{args.runs}...", file=sys.stderr)
+        runs.append(collect(args.seed))
+    current = median_of(runs)
+    baseline = load_baseline(args.baseline)
+
+    if args.update:
+        write_baseline(args.baseline, current, baseline, args.runs)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    rows = compare(current, baseline)
+    print(format_table(rows))
+    regressions = [row for row in rows if row["status"].startswith("REGRESSION")]
+    missing = [row for row in rows if row["status"] == "MISSING BASELINE"]
+    if regressions:
+        print(f"\nFAILED: {len(regressions)} metric(s) regressed: {', '.join(r['metric'] for r in regressions)}")
+    if missing:
+        print(f"\nFAILED: no baseline for {', '.join(r['metric'] for r in missing)}; "
+              f"record one with --update on this machine")
+    if regressions or missing:
+        return 1
+    print("\nPASSED: no metric above its allowance.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
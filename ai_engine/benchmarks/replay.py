@@ -0,0 +1,102 @@
+"""
+Replay captured traffic (see capture.py) against a build of the AI Engine.
+
+Captured requests are sent in their original order and at their original
+offsets, divided by --speed (2 = twice as fast), through the same open-loop
+driver as benchmarks.loadtest, so queueing under a real arrival pattern is
+measured. Captures from several workers are merged on their start times.
+The report puts the latency recorded at capture time next to the replayed
+latency for each endpoint.
+
+A capture starts against whatever index the server had, so for comparable
+runs load the same index artifact first with --index (resolved like
+/admin/index/load: a name under CLUSTAURA_INDEX_DIR).
+
+Run from the ai_engine directory:
+    python -m benchmarks.replay captures/traffic-*.jsonl.gz --index baseline --speed 1
+    python -m benchmarks.replay capture.jsonl.gz --url http://127.0.0.1:8000 --speed 4
+"""
+import sys
+import asyncio
+import argparse
+from typing import Dict, List
+
+from benchmarks.common import AI_ENGINE_DIR, percentiles, run_metadata, write_report
+from benchmarks.loadtest import ENDPOINTS, Request, drive, engine_client
+
+sys.path.insert(0, AI_ENGINE_DIR)
+from capture import read_capture  # noqa: E402
+
+
+def load_schedule(paths: List[str], speed: float, endpoints: List[str], limit: int = 0):
+    """Merged (schedule, capture summary) of the given capture files."""
+    captures = [read_capture(path) for path in paths]
+    origin = min(header["started_at"] for header, _ in captures)
+
+    entries = []
+    for header, stream in captures:
+        shift = header["started_at"] - origin
+        entries.extend((entry["t"] + shift, entry) for entry in stream if entry["endpoint"] in endpoints)
+    entries.sort(key=lambda item: item[0])
+    if limit:
+        entries = entries[:limit]
+
+    schedule: List[Request] = []
+    captured: Dict[str, List[float]] = {}
+    statuses: Dict[str, Dict[str, int]] = {}
+    for offset, entry in entries:
+        name = entry["endpoint"]
+        schedule.append((offset / speed, name, entry["body"]))
+        captured.setdefault(name, []).append(entry["duration_ms"] / 1000.0)
+        counts = statuses.setdefault(name, {})
+        counts[str(entry["status"])] = counts.get(str(entry["status"]), 0) + 1
+
+    summary = {
+        "files": len(paths),
+        "requests": len(schedule),
+        "seconds": round(entries[-1][0], 3) if entries else 0.0,
+        "endpoints": {name: {"latency": percentiles(captured[name]), "statuses": statuses[name]} for name in captured},
+    }
+    return schedule, summary
+
+
+async def replay(args, schedule: List[Request]) -> Dict:
+    async with engine_client(args) as (client, server):
+        if args.index:
+            response = await client.post("/admin/index/load", json={"path": args.index, "carry_over": False})
+            if response.status_code != 200:
+                raise RuntimeError(f"could not load index {args.index!r}: {response.text}")
+        result = await drive(client, schedule, args)
+        if server is not None:
+            result["index"] = server.index_handle.status()
+        return {"target": args.url or "in-process", **result}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("captures", nargs="+", help="capture files (merged on their start times)")
+    parser.add_argument("--url", default=None, help="replay against a running server instead of the in-process app")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help=f"comma separated subset of {list(ENDPOINTS)}")
+    parser.add_argument("--limit", type=int, default=0, help="replay only the first N requests")
+    parser.add_argument("--index", default=None, help="index artifact to load before replaying")
+    parser.add_argument("--max-in-flight", type=int, default=256)
+    parser.add_argument("--request-timeout", type=float, default=30.0)
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds to wait for the engine to be ready")
+    parser.add_argument("--out", default=None, help="write the JSON report here as well as stdout")
+    args = parser.parse_args(argv)
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+
+    schedule, summary = load_schedule(args.captures, args.speed, args.endpoints.split(","), args.limit)
+    result = asyncio.run(replay(args, schedule))
+    write_report({
+        "benchmark": "replay",
+        "meta": run_metadata(captures=args.captures, speed=args.speed, index=args.index),
+        "capture": summary,
+        **result,
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Deterministic synthetic population for benchmarks.
+
+Everything is derived from a seed, and each user / problem from (seed, index),
+so a 1M-user population can be streamed without holding it in memory and any
+slice of it is reproducible on its own.
+
+Run from the ai_engine directory:
+    python -m benchmarks.synthetic --scale 10k --out-users users-10k.jsonl --out-taxonomy taxonomy-10k.json
+
+The users file can be fed to `python index_store.py build`.
+"""
+import sys
+import json
+import random
+import argparse
+from typing import Dict, Iterator, List
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+WORDS = (
+    "pipeline latency model data service cluster query cache stream batch dashboard api schema "
+    "deployment monitoring inference training feature graph search ranking security migration "
+    "scaling testing refactor frontend backend mobile analytics forecasting anomaly drift"
+).split()
+GUIDE_QUERIES = [
+    "How do I post a problem?", "How does the AI matching work?", "Where are my posts?",
+    "How can I improve my profile?", "How do I find an expert?", "What can I do here?",
+    "How do I change my password?", "How do I collaborate on a project?", "Edit my skills",
+    "Delete my post", "Who can help me with machine learning?", "Getting started",
+]
+
+
+def _rng(seed: int, index: int) -> random.Random:
+    return random.Random(seed * 1_000_003 + index)
+
+
+def _sentence(rng: random.Random, words: int, extra: List[str] = ()) -> str:
+    vocab = list(WORDS) + list(extra)
+    return " ".join(rng.choice(vocab) for _ in range(words)).capitalize() + "."
+
+
+def generate_taxonomy(n_skills: int, depth: int = 6, fanout: int = 4, multi_parent: float = 0.3,
+                      max_parents: int = 3, seed: int = 0, parent_span: int = 0) -> Dict[str, List[str]]:
+    """
+    A skill DAG as {skill: [parent skills]}, in the format OntologyManager.add_taxonomy takes.
+
+    Level sizes grow by `fanout` per level down to `depth` levels. Every
+    non-root skill has a parent on the level above; with probability
+    `multi_parent` it gets up to max_parents - 1 extra parents from any
+    shallower level (or only the `parent_span` levels above it, if set),
+    which gives the multiple inheritance real taxonomies have. A small
+    parent_span makes the number of root paths grow exponentially with depth.
+    """
+    rng = random.Random(seed)
+    weights = [fanout ** level for level in range(depth)]
+    sizes = [max(1, round(n_skills * w / sum(weights))) for w in weights]
+    sizes[-1] = max(1, n_skills - sum(sizes[:-1]))
+
+    levels: List[List[str]] = []
+    taxonomy: Dict[str, List[str]] = {}
+    for level, size in enumerate(sizes):
+        names = [f"Skill {level}-{i}" for i in range(size)]
+        for name in names:
+            parents = []
+            if level > 0:
+                parents.append(rng.choice(levels[level - 1]))
+                if rng.random() < multi_parent:
+                    for _ in range(rng.randint(1, max_parents - 1)):
+                        lowest = max(0, level - parent_span) if parent_span else 0
+                        candidate = rng.choice(levels[rng.randrange(lowest, level)])
+                        if candidate not in parents:
+                            parents.append(candidate)
+            taxonomy[name] = parents
+        levels.append(names)
+    return taxonomy
+
+
+def skill_levels(taxonomy: Dict[str, List[str]]) -> List[List[str]]:
+    """Skills grouped by level (the generator's naming encodes it)."""
+    levels: Dict[int, List[str]] = {}
+    for name in taxonomy:
+        levels.setdefault(int(name.split()[1].split("-")[0]), []).append(name)
+    return [levels[level] for level in sorted(levels)]
+
+
+def _pick_skills(rng: random.Random, levels: List[List[str]], count: int) -> List[str]:
+    # Bias towards deeper (more specific) skills, like real profiles
+    picked = []
+    for _ in range(count):
+        level = min(len(levels) - 1, int(rng.triangular(0, len(levels), len(levels))))
+        skill = rng.choice(levels[level])
+        if skill not in picked:
+            picked.append(skill)
+    return picked
+
+
+def generate_user(index: int, levels: List[List[str]], seed: int = 0) -> Dict:
+    rng = _rng(seed, index)
+    skills = _pick_skills(rng, levels, rng.randint(1, 5))
+    return {
+        "user_id": f"user_{index}",
+        "bio": _sentence(rng, rng.randint(8, 30), skills),
+        "skills": skills,
+        "projects": [
+            {
+                "description": _sentence(rng, rng.randint(6, 20)),
+                "skills_demonstrated": rng.sample(skills, min(len(skills), rng.randint(1, 2))),
+            }
+            for _ in range(rng.randint(0, 3))
+        ],
+        "posts": [
+            {"title": _sentence(rng, rng.randint(3, 8)), "content": _sentence(rng, rng.randint(10, 40))}
+            for _ in range(rng.randint(0, 5))
+        ],
+    }
+
+
+def generate_users(n: int, taxonomy: Dict[str, List[str]], seed: int = 0, start: int = 0) -> Iterator[Dict]:
+    levels = skill_levels(taxonomy)
+    for index in range(start, start + n):
+        yield generate_user(index, levels, seed)
+
+
+def generate_problems(n: int, taxonomy: Dict[str, List[str]], seed: int = 0) -> Iterator[Dict]:
+    levels = skill_levels(taxonomy)
+    for index in range(n):
+        # Offset so problems never share a stream with users
+        rng = _rng(seed + 7919, index)
+        skills = _pick_skills(rng, levels, rng.randint(1, 3))
+        yield {
+            "problem_id": f"problem_{index}",
+            "title": _sentence(rng, rng.randint(3, 8), skills),
+            "description": _sentence(rng, rng.randint(15, 60), skills),
+            "required_skills": skills,
+        }
+
+
+def generate_guide_queries(n: int, seed: int = 0) -> Iterator[Dict]:
+    rng = random.Random(seed + 104729)
+    pages = [None, "/", "/community", "/profile", "/problems/new"]
+    for _ in range(n):
+        yield {"query": rng.choice(GUIDE_QUERIES), "current_page": rng.choice(pages)}
+
+
+def taxonomy_size_for(n_users: int) -> int:
+    """Default taxonomy size for a population: grows with it, 200 to 20k skills."""
+    return min(20_000, max(200, n_users // 50))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", default="1k", help=f"one of {list(SCALES)} or a user count")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skills", type=int, default=None, help="taxonomy size (default grows with --scale)")
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--multi-parent", type=float, default=0.3)
+    parser.add_argument("--out-users", default="-", help="users JSONL (default stdout)")
+    parser.add_argument("--out-taxonomy", default=None, help="taxonomy JSON")
+    args = parser.parse_args(argv)
+
+    n_users = SCALES.get(args.scale.lower()) or int(args.scale)
+    taxonomy = generate_taxonomy(args.skills or taxonomy_size_for(n_users), args.depth, args.fanout,
+                                 args.multi_parent, seed=args.seed)
+    if args.out_taxonomy:
+        with open(args.out_taxonomy, "w") as f:
+            json.dump(taxonomy, f)
+
+    out = sys.stdout if args.out_users == "-" else open(args.out_users, "w")
+    try:
+        for user in generate_users(n_users, taxonomy, args.seed):
+            out.write(json.dumps(user) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
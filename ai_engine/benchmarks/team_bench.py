@@ -0,0 +1,132 @@
+"""
+Benchmark for team formation (/recommend/team, team.py) on large pools.
+
+Builds a synthetic population and taxonomy (sized as benchmarks.synthetic
+does for that many users) with random unit vectors as embeddings, since the
+optimiser's cost does not depend on the model. Team formation reads only
+the taxonomy from the ontology, so users are not added to it. Times:
+  - team_index: building the per-epoch TeamIndex (once per ingest epoch)
+  - cold: the first request for a set of required skills (computes their
+    SF columns)
+  - warm: repeated requests, for each --team-sizes value
+and checks every lazy greedy team against plain greedy, which re-evaluates
+every candidate's gain at every step. Teams may differ where gains tie;
+their objective values must not.
+
+Run from the ai_engine directory:
+    python -m benchmarks.team_bench --users 100000 --out benchmarks/baselines/team.json
+"""
+import sys
+import time
+import random
+import argparse
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.common import AI_ENGINE_DIR, peak_rss_mb, percentiles, run_metadata, write_report
+from benchmarks.synthetic import generate_taxonomy, generate_users, skill_levels, taxonomy_size_for
+
+sys.path.insert(0, AI_ENGINE_DIR)
+import team  # noqa: E402
+from index_store import IndexSnapshot  # noqa: E402
+from ontology import OntologyManager  # noqa: E402
+
+
+def plain_greedy(coverage: np.ndarray, fit: np.ndarray, team_size: int) -> List[int]:
+    """Reference greedy: every candidate's marginal gain recomputed at every step."""
+    n_required = coverage.shape[1]
+    scale = team.W_COVERAGE / n_required if n_required else 0.0
+    covered = np.zeros(n_required)
+    picked: List[int] = []
+    for _ in range(team_size):
+        gains = scale * np.maximum(coverage - covered, 0.0).sum(axis=1) + team.W_SEMANTIC * fit / team_size
+        gains[picked] = -np.inf
+        best = int(np.argmax(gains))
+        picked.append(best)
+        covered = np.maximum(covered, coverage[best])
+    return picked
+
+
+def build_index(args):
+    """(index, taxonomy levels) for a synthetic population."""
+    taxonomy = generate_taxonomy(taxonomy_size_for(args.users), seed=args.seed)
+    ontology = OntologyManager()
+    ontology.add_taxonomy(taxonomy)
+    users = {user["user_id"]: user for user in generate_users(args.users, taxonomy, seed=args.seed)}
+    rng = np.random.default_rng(args.seed)
+    embeddings = rng.standard_normal((len(users), args.dim)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return IndexSnapshot("bench", ontology.freeze(), users, list(users), embeddings), skill_levels(taxonomy)
+
+
+def objective(coverage: np.ndarray, fit: np.ndarray, members: List[int], team_size: int) -> float:
+    return (team.W_COVERAGE * float(coverage[members].max(axis=0).mean())
+            + team.W_SEMANTIC * float(fit[members].sum()) / team_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--team-sizes", default="3,5,10")
+    parser.add_argument("--required", type=int, default=6, help="required skills per request")
+    parser.add_argument("--requests", type=int, default=30, help="requests per team size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="write the JSON report here as well as stdout")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    index, levels = build_index(args)
+    print(f"Built {args.users} users in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    rng = random.Random(args.seed)
+    skills = [skill for level in levels[1:] for skill in level]
+    queries = [(rng.sample(skills, args.required), index.embeddings[rng.randrange(args.users)])
+               for _ in range(args.requests)]
+
+    start = time.perf_counter()
+    team.team_index_for(index)
+    team_index_s = time.perf_counter() - start
+
+    cold: List[float] = []
+    for required, query in queries:
+        start = time.perf_counter()
+        team.form_team(index, required, 5, query)
+        cold.append(time.perf_counter() - start)
+
+    results: Dict[str, Dict] = {}
+    for size in [int(s) for s in args.team_sizes.split(",")]:
+        warm: List[float] = []
+        different = 0
+        worst_gap = 0.0
+        for required, query in queries:
+            start = time.perf_counter()
+            result = team.form_team(index, required, size, query)
+            warm.append(time.perf_counter() - start)
+
+            team_index = team.team_index_for(index)
+            coverage = team_index.coverage_matrix(required)
+            fit = team.semantic_fit(index, team_index, query, None)
+            reference = plain_greedy(coverage, fit, size)
+            picked = [team_index.position_of[m["user_id"]] for m in result["members"]]
+            different += picked != reference
+            worst_gap = max(worst_gap, objective(coverage, fit, reference, size) - objective(coverage, fit, picked, size))
+        results[f"team_size={size}"] = {
+            "warm": percentiles(warm),
+            "teams_differing_from_plain_greedy": different,
+            "max_objective_gap": round(worst_gap, 9),
+        }
+
+    write_report({
+        "benchmark": "team",
+        "meta": run_metadata(users=args.users, dim=args.dim, required=args.required,
+                             requests=args.requests, seed=args.seed),
+        "team_index_s": round(team_index_s, 4),
+        "cold": percentiles(cold),
+        "results": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
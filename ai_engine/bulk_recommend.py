@@ -0,0 +1,272 @@
+"""
+Offline bulk recommendations, e.g. top experts for every open challenge for
+the nightly e-mail digest.
+
+The parent loads an index artifact, has every pending problem embedded in
+a spawned child (torch using all cores; the parent never imports torch, so
+the pool forks from a process without its threads), then fans the scoring
+out over a ProcessPoolExecutor. The
+user embedding matrix and the problem vectors are written to .npy files in a
+work directory and opened with np.load(mmap_mode="r") in every worker, so all
+workers share one copy through the page cache. Profiles and the frozen
+ontology are inherited copy-on-write from the parent (fork). Workers need no
+model and run single-threaded, one per core. Candidates are selected as the
+server does (candidates.py), including BM25 matches when
+CLUSTAURA_LEXICAL_CANDIDATES is set; CLUSTAURA_LEXICAL_WEIGHT weights the
+lexical feature, as in the server.
+
+Output is JSONL, one {"problem_id", "results", "index_version"} line per
+problem, appended and fsynced chunk by chunk, with a <out>.progress.json
+checkpoint. Re-running the same command resumes: problems already in the
+output are skipped, and a partial last line left by a crash is cut off.
+
+Usage:
+    python bulk_recommend.py --index indexes/nightly.joblib --problems open_problems.jsonl \\
+        --out digest.jsonl --workers 16 --top-k 10
+"""
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import argparse
+from types import SimpleNamespace
+from typing import Any, Dict, List, Set
+
+# Filled in by the parent before the pool forks; workers read it copy-on-write
+_JOB: Dict[str, Any] = {}
+EMBED_BLOCK = 10_000
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline bulk recommendations for many problems")
+    parser.add_argument("--index", required=True, help="index artifact written by index_store.py / the server")
+    parser.add_argument("--problems", required=True, help="JSONL of ProblemStatement objects")
+    parser.add_argument("--out", required=True, help="JSONL output; resumed if it already exists")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--chunk-size", type=int, default=32, help="problems per task sent to a worker")
+    parser.add_argument("--keep-work", action="store_true", help="keep the .npy work directory afterwards")
+    parser.add_argument("--lexical-candidates", type=int,
+                        default=int(os.getenv("CLUSTAURA_LEXICAL_CANDIDATES", "0")),
+                        help="BM25 matches added to each ontology pool (default: as the server)")
+    parser.add_argument("--lexical-weight", type=float,
+                        default=float(os.getenv("CLUSTAURA_LEXICAL_WEIGHT", "0")),
+                        help="weight of the lexical feature (default: as the server)")
+    args = parser.parse_args(argv)
+    if args.lexical_candidates < 0:
+        parser.error("--lexical-candidates must be 0 or more")
+    return args
+
+
+def read_problems(path: str) -> List[Dict[str, Any]]:
+    problems = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                problems.append(json.loads(line))
+    return problems
+
+
+def completed_ids(out_path: str) -> Set[str]:
+    """problem_ids already written; truncates a partial last line from an interrupted run."""
+    done: Set[str] = set()
+    if not os.path.exists(out_path):
+        return done
+    good = 0
+    with open(out_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                done.add(json.loads(line)["problem_id"])
+            except (ValueError, KeyError):
+                break
+            good += len(line)
+    if good != os.path.getsize(out_path):
+        with open(out_path, "r+b") as f:
+            f.truncate(good)
+        print(f"Dropped a partial record at the end of {out_path}")
+    return done
+
+
+def embed_problems(problems: List[Dict[str, Any]], path: str):
+    """Embed in blocks straight into a .npy file, so memory stays bounded. Runs in a spawned child."""
+    import numpy as np
+    from nlp_engine import NLPEngine
+
+    nlp_engine = NLPEngine()
+    try:
+        import torch
+        # Workers are capped at one thread; the parent's encode may use every core
+        torch.set_num_threads(os.cpu_count() or 1)
+    except ImportError:
+        pass
+
+    vectors = None
+    for start in range(0, len(problems), EMBED_BLOCK):
+        block = problems[start:start + EMBED_BLOCK]
+        embedded = nlp_engine.embed_batch([f"{p.get('title', '')} {p.get('description', '')}" for p in block])
+        if vectors is None:
+            vectors = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32,
+                                                 shape=(len(problems), embedded.shape[1]))
+        vectors[start:start + len(block)] = embedded
+        print(f"Embedded {start + len(block)}/{len(problems)} problems")
+    vectors.flush()
+
+
+def embed_problems_in_child(problems: List[Dict[str, Any]], path: str):
+    """Run embed_problems in a spawned process, keeping torch (and its thread pools) out of the parent."""
+    import multiprocessing
+    child = multiprocessing.get_context("spawn").Process(target=embed_problems, args=(problems, path))
+    child.start()
+    child.join()
+    if child.exitcode != 0:
+        raise RuntimeError(f"embedding the problems failed (exit code {child.exitcode})")
+
+
+def _init_worker(embeddings_path: str, problems_path: str):
+    import numpy as np
+    _JOB["embeddings"] = np.load(embeddings_path, mmap_mode="r")
+    _JOB["problem_vecs"] = np.load(problems_path, mmap_mode="r")
+
+
+def score_chunk(positions: List[int]) -> List[str]:
+    """Worker: rank the problems at these positions; returns their output lines."""
+    import numpy as np
+    from index_store import get_field
+    from candidates import candidate_pool
+    from lexical_index import normalise
+
+    users, row_of, closure, ranker = _JOB["users"], _JOB["row_of"], _JOB["closure"], _JOB["ranker"]
+    lexical = _JOB["lexical"]
+    embeddings, problem_vecs = _JOB["embeddings"], _JOB["problem_vecs"]
+    lines = []
+    for position in positions:
+        raw = _JOB["problems"][position]
+        problem = SimpleNamespace(**{"title": "", "description": "", "candidate_ids": None,
+                                     "required_skills": [], **raw})
+        pool = candidate_pool(closure, users, problem, lexical, _JOB["lexical_k"])
+
+        semantic_scores = {}
+        embedded = [uid for uid in pool if uid in row_of]
+        if embedded:
+            scores = embeddings[[row_of[uid] for uid in embedded]] @ problem_vecs[position]
+            semantic_scores = {uid: float(score) for uid, score in zip(embedded, np.asarray(scores))}
+        ontology_scores = {
+            uid: closure.calculate_user_similarity(get_field(users[uid], "skills", []), problem.required_skills)
+            for uid in pool
+        }
+        lexical_scores = None
+        if ranker.w_lexical:
+            lexical_scores = {uid: normalise(score) for uid, score in
+                              lexical.scores(f"{problem.title} {problem.description}", pool).items()}
+        ranked = ranker.rank(candidates=pool, problem_data=problem, user_db=users,
+                             semantic_score_map=semantic_scores, ontology_score_map=ontology_scores,
+                             lexical_score_map=lexical_scores)
+        results = [
+            {key: r[key] for key in ("user_id", "rank", "match_score", "explanation", "key_skills")}
+            for r in ranked[:_JOB["top_k"]]
+        ]
+        lines.append(json.dumps({"problem_id": problem.problem_id, "results": results,
+                                 "index_version": _JOB["version"]}))
+    return lines
+
+
+def _write_progress(path: str, done: int, total: int, started: float):
+    elapsed = time.time() - started
+    rate = done / elapsed if elapsed else 0.0
+    progress = {"done": done, "total": total, "elapsed_s": round(elapsed, 1),
+                "problems_per_s": round(rate, 2),
+                "eta_s": round((total - done) / rate, 1) if rate else None, "updated_at": time.time()}
+    with open(path + ".tmp", "w") as f:
+        json.dump(progress, f)
+    os.replace(path + ".tmp", path)
+    return progress
+
+
+def run(args):
+    # Before numpy / torch load: one BLAS thread per worker process
+    from launcher import limit_threads
+    limit_threads(1)
+
+    import numpy as np
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+    from index_store import IndexSnapshot
+    from ontology import SkillClosure
+    from ranker import HybridRanker
+    from lexical_index import LexicalIndex
+
+    done_ids = completed_ids(args.out)
+    problems = [p for p in read_problems(args.problems) if p["problem_id"] not in done_ids]
+    total = len(problems) + len(done_ids)
+    if not problems:
+        print(f"Nothing to do: all {total} problems are already in {args.out}")
+        return
+    print(f"{len(problems)} problems to score ({len(done_ids)} already done)")
+
+    started = time.time()
+    snapshot = IndexSnapshot.load(args.index)
+    print(f"Loaded index {snapshot.version} ({len(snapshot.users)} users) in {time.time() - started:.1f}s")
+
+    work_dir = args.out + ".work"
+    os.makedirs(work_dir, exist_ok=True)
+    embeddings_path = os.path.join(work_dir, "embeddings.npy")
+    problems_path = os.path.join(work_dir, "problems.npy")
+    np.save(embeddings_path, np.ascontiguousarray(snapshot.embeddings, dtype=np.float32))
+    embed_problems_in_child(problems, problems_path)
+
+    lexical = None
+    if args.lexical_candidates or args.lexical_weight:
+        lexical = LexicalIndex()
+        lexical.rebuild(snapshot.users)
+        print(f"Built the lexical index ({len(lexical)} users)")
+    _JOB.update({
+        "users": snapshot.users, "row_of": snapshot.row_of, "problems": problems, "top_k": args.top_k,
+        "version": snapshot.version, "closure": SkillClosure(snapshot.ontology.freeze()),
+        "ranker": HybridRanker(w_lexical=args.lexical_weight), "lexical": lexical,
+        "lexical_k": args.lexical_candidates,
+    })
+    # The matrix is read through the mmap from here on
+    snapshot.embeddings = None
+    # Keep the workers' collectors from writing to (and un-sharing) inherited pages
+    gc.collect()
+    gc.freeze()
+
+    chunks = [list(range(i, min(i + args.chunk_size, len(problems))))
+              for i in range(0, len(problems), args.chunk_size)]
+    progress_path = args.out + ".progress.json"
+    done = len(done_ids)
+    last_report = 0.0
+    scoring_started = time.time()
+    with open(args.out, "a") as out, ProcessPoolExecutor(
+            max_workers=args.workers, mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker, initargs=(embeddings_path, problems_path)) as pool:
+        pending = set()
+        next_chunk = 0
+        while next_chunk < len(chunks) or pending:
+            # Bounded in-flight work, so results are written (and checkpointed) as they come
+            while next_chunk < len(chunks) and len(pending) < args.workers * 2:
+                pending.add(pool.submit(score_chunk, chunks[next_chunk]))
+                next_chunk += 1
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                lines = future.result()
+                out.write("".join(line + "\n" for line in lines))
+                out.flush()
+                os.fsync(out.fileno())
+                done += len(lines)
+            if time.time() - last_report >= 5.0 or not pending:
+                progress = _write_progress(progress_path, done, total, scoring_started)
+                print(f"{done}/{total} problems, {progress['problems_per_s']}/s, eta {progress['eta_s']}s")
+                last_report = time.time()
+
+    if not args.keep_work:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"Wrote {done} problems to {args.out} in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,26 @@
+"""
+Candidate selection shared by /recommend, /recommend/batch and
+bulk_recommend.py, so the online and offline rankings score the same pool.
+
+The pool is the requested candidate_ids when given (those that exist), and
+otherwise everyone the ontology finds capable, followed by the top BM25
+matches for the problem text that the ontology missed.
+"""
+from typing import Any, Dict, List, Optional
+
+
+def lexical_candidates(lexical, problem_text: str, pool: List[str], users: Dict[str, Any], k: int) -> List[str]:
+    """Top k BM25 matches for the problem text that are not in pool yet, best first."""
+    seen = set(pool)
+    return [uid for uid, _ in lexical.search(problem_text, k) if uid not in seen and uid in users]
+
+
+def candidate_pool(closure, users: Dict[str, Any], problem, lexical: Optional[Any] = None,
+                   lexical_k: int = 0) -> List[str]:
+    """The candidates _recommend would score for problem, in the same order."""
+    if problem.candidate_ids is not None:
+        return [uid for uid in problem.candidate_ids if uid in users]
+    pool = [uid for uid in closure.find_capable_users(problem.required_skills) if uid in users]
+    if lexical is not None and lexical_k:
+        pool += lexical_candidates(lexical, f"{problem.title} {problem.description}", pool, users, lexical_k)
+    return pool
@@ -0,0 +1,223 @@
+"""
+Opt-in traffic capture for offline replay (benchmarks/replay.py).
+
+When CLUSTAURA_CAPTURE_PATH is set, a sampled fraction of /recommend,
+/ingest/user and /guide/query requests is written to a gzipped JSONL file:
+a header line, then one line per request with its offset from the start of
+the capture, the endpoint, the anonymised body, the status and the duration.
+
+The request path only enqueues the raw body; parsing, anonymisation and
+compression happen on a background writer thread, and a full queue drops the
+request (counted in `dropped`) rather than blocking.
+
+Anonymisation is an allow-list, applied at every depth of the body:
+  - identifiers (id, _id and any *_id / *_ids key, e.g. user_id, problem_id,
+    candidate_ids, posts[].id) are replaced by keyed hashes, so one user
+    keeps one pseudonym across a capture
+  - skills, required skills, domain and page names are kept as they are
+  - the free text the engine scores (bio, title, description, content,
+    query) is kept with e-mail addresses, URLs, phone numbers and @handles
+    masked
+  - numbers, booleans and nulls are kept
+  - every other string (project names and links, author names, e-mails in
+    their own fields, ...) is dropped.
+
+Environment:
+    CLUSTAURA_CAPTURE_PATH         capture file, e.g. captures/traffic-{pid}.jsonl.gz
+                                   ({pid} gives each worker its own file)
+    CLUSTAURA_CAPTURE_SAMPLE_RATE  fraction of requests captured (default 1.0)
+    CLUSTAURA_CAPTURE_SALT         key for the identifier hashes; set it to get the same
+                                   pseudonyms across workers and captures (default random)
+"""
+import os
+import re
+import gzip
+import hmac
+import json
+import time
+import queue
+import random
+import hashlib
+import threading
+from typing import Any, Optional
+
+CAPTURE_FORMAT = 1
+CAPTURE_QUEUE_SIZE = 10000
+FLUSH_INTERVAL = 5.0
+
+# Request path -> endpoint name used in capture files and by the replayer
+CAPTURED_PATHS = {"/recommend": "recommend", "/ingest/user": "ingest", "/guide/query": "guide"}
+
+_KEEP_FIELDS = ("skills", "required_skills", "skills_demonstrated", "domain", "current_page")
+_TEXT_FIELDS = ("bio", "title", "description", "content", "query")
+_DROP = object()
+_PII = [
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "<email>"),
+    (re.compile(r"(?:https?://|www\.)[^\s,;)\]]+"), "<url>"),
+    (re.compile(r"\+?\d[\d\s().-]{7,}\d"), "<phone>"),
+    (re.compile(r"(?<!\w)@\w{2,}"), "<handle>"),
+]
+
+
+def _is_id_field(key: Optional[str]) -> bool:
+    return key is not None and (key in ("id", "_id", "ids") or key.endswith("_id") or key.endswith("_ids"))
+
+
+def scrub_text(text: str) -> str:
+    for pattern, replacement in _PII:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class TrafficCapture:
+    def __init__(self, path: str, sample_rate: float = 1.0, salt: Optional[str] = None):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._key = (salt or os.urandom(16).hex()).encode()
+        self._queue: queue.Queue = queue.Queue(maxsize=CAPTURE_QUEUE_SIZE)
+        self._started = time.perf_counter()
+        self._thread: Optional[threading.Thread] = None
+        self.captured = 0
+        self.dropped = 0
+
+    # --- request path ---
+
+    def sampled(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def record(self, endpoint: str, body: bytes, status: int, seconds: float):
+        """Enqueue one request; never blocks."""
+        try:
+            self._queue.put_nowait((time.perf_counter() - self._started, endpoint, body, status, seconds))
+        except queue.Full:
+            self.dropped += 1
+
+    # --- writer thread ---
+
+    def pseudonym(self, value: str) -> str:
+        return "anon_" + hmac.new(self._key, value.encode(), hashlib.sha256).hexdigest()[:16]
+
+    def anonymise(self, value: Any, key: Optional[str] = None) -> Any:
+        """The allow-listed part of a request body (see the module docstring); list items inherit the list's key."""
+        if isinstance(value, dict):
+            if _is_id_field(key):
+                # e.g. a Mongo {"$oid": ...}
+                return self.pseudonym(json.dumps(value, sort_keys=True))
+            kept = {}
+            for k, v in value.items():
+                v = self.anonymise(v, k)
+                if v is not _DROP:
+                    kept[k] = v
+            return kept
+        if isinstance(value, list):
+            items = [self.anonymise(v, key) for v in value]
+            return [v for v in items if v is not _DROP]
+        if value is None or isinstance(value, bool):
+            return value
+        if _is_id_field(key):
+            return self.pseudonym(str(value))
+        if isinstance(value, str):
+            if key in _KEEP_FIELDS:
+                return value
+            if key in _TEXT_FIELDS:
+                return scrub_text(value)
+            return _DROP
+        return value
+
+    def start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._write, name="traffic-capture", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _write(self):
+        with gzip.open(self.path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "capture": CAPTURE_FORMAT, "started_at": time.time(), "pid": os.getpid(),
+                "sample_rate": self.sample_rate,
+            }) + "\n")
+            last_flush = time.monotonic()
+            while True:
+                try:
+                    item = self._queue.get(timeout=FLUSH_INTERVAL)
+                except queue.Empty:
+                    item = ()
+                if item is None:
+                    break
+                if item:
+                    self._write_entry(f, *item)
+                if time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                    f.flush()
+                    last_flush = time.monotonic()
+
+    def _write_entry(self, f, offset: float, endpoint: str, body: bytes, status: int, seconds: float):
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            # Malformed bodies were rejected with 422; nothing to replay
+            return
+        f.write(json.dumps({
+            "t": round(offset, 6), "endpoint": endpoint, "body": self.anonymise(payload),
+            "status": status, "duration_ms": round(seconds * 1000, 3),
+        }) + "\n")
+        self.captured += 1
+
+
+_capture: Optional[TrafficCapture] = None
+_capture_pid: Optional[int] = None
+
+
+def configure_capture(path: Optional[str] = None) -> Optional[TrafficCapture]:
+    """Start capturing if CLUSTAURA_CAPTURE_PATH (or `path`) is set; once per process, like configure_logging."""
+    global _capture, _capture_pid
+    if _capture_pid == os.getpid():
+        return _capture
+    path = path or os.getenv("CLUSTAURA_CAPTURE_PATH")
+    _capture, _capture_pid = None, os.getpid()
+    if path:
+        _capture = TrafficCapture(path.replace("{pid}", str(os.getpid())),
+                                  float(os.getenv("CLUSTAURA_CAPTURE_SAMPLE_RATE", "1.0")),
+                                  os.getenv("CLUSTAURA_CAPTURE_SALT"))
+        _capture.start()
+        print(f"Capturing traffic to {_capture.path} (sample rate {_capture.sample_rate})")
+    return _capture
+
+
+def active() -> Optional[TrafficCapture]:
+    return _capture if _capture_pid == os.getpid() else None
+
+
+def shutdown_capture():
+    """Write out queued requests and close the file."""
+    global _capture, _capture_pid
+    if _capture is not None and _capture_pid == os.getpid():
+        _capture.stop()
+    _capture = None
+    _capture_pid = None
+
+
+def read_capture(path: str):
+    """(header, iterator over entries) of a capture file."""
+    f = gzip.open(path, "rt", encoding="utf-8")
+    header = json.loads(f.readline())
+    if header.get("capture") != CAPTURE_FORMAT:
+        f.close()
+        raise ValueError(f"{path} is not a capture file (format {header.get('capture')!r})")
+
+    def entries():
+        with f:
+            try:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            except (ValueError, EOFError):
+                # Truncated tail of a capture that was not shut down cleanly
+                return
+    return header, entries()
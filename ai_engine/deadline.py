@@ -0,0 +1,53 @@
+"""
+Latency budgets for anytime ranking.
+
+A Deadline is fixed when the request starts (so time queued for admission
+counts against it). The /recommend pipeline scores candidates in chunks, best
+candidates first, checks the deadline between chunks, and when it has passed
+ranks what it has scored so far and flags the response as partial.
+"""
+import time
+from typing import Any, Dict, Optional
+
+import tracing
+
+
+class Deadline:
+    def __init__(self, at: float):
+        # Absolute time.perf_counter() value
+        self.at = at
+        self.candidates = 0
+        self.scored = 0
+        # Stage that was running when the deadline passed
+        self.expired_in: Optional[str] = None
+
+    @classmethod
+    def from_budget(cls, budget_ms: Optional[float]) -> Optional["Deadline"]:
+        """Deadline budget_ms after the current request started, or None for no budget."""
+        if budget_ms is None:
+            return None
+        trace = tracing.current_trace()
+        started = trace.started if trace else time.perf_counter()
+        return cls(started + budget_ms / 1000.0)
+
+    def remaining_ms(self) -> float:
+        return (self.at - time.perf_counter()) * 1000.0
+
+    def expired(self, stage: str) -> bool:
+        """True once the deadline has passed; remembers the first stage that saw it."""
+        if time.perf_counter() < self.at:
+            return False
+        if self.expired_in is None:
+            self.expired_in = stage
+        return True
+
+    @property
+    def partial(self) -> bool:
+        return self.expired_in is not None
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "partial": self.partial, "expired_in": self.expired_in,
+            "candidates": self.candidates, "scored": self.scored,
+            "remaining_ms": round(self.remaining_ms(), 3),
+        }
@@ -0,0 +1,476 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Optional
+
+import numpy as np
+
+from ontology import OntologyManager
+
+ARTIFACT_FORMAT = 1
+
+log = logging.getLogger("clustaura.index")
+
+
+def get_field(obj, field, default):
+    """Read a field from either a dict or a Pydantic model."""
+    if isinstance(obj, dict):
+        return obj.get(field, default)
+    return getattr(obj, field, default)
+
+
+def as_user_dict(user) -> Dict[str, Any]:
+    """Convert a UserProfile (or plain dict) to a plain dict."""
+    if isinstance(user, dict):
+        return dict(user)
+    return user.dict()
+
+
+def user_text(user) -> str:
+    """
+    Combine all textual evidence of expertise (Bio + Projects + Posts)
+    into the string that gets embedded for semantic scoring.
+    """
+    project_text = " ".join([p.get('description', '') for p in get_field(user, 'projects', [])])
+    post_text = " ".join([f"{p.get('title', '')} {p.get('content', '')}" for p in get_field(user, 'posts', [])])
+    return f"{get_field(user, 'bio', '')} {project_text} {post_text}"
+
+
+class IndexSnapshot:
+    """
+    One immutable version (epoch) of everything /recommend reads: the user
+    profiles, a frozen ontology view built from them and the pre-computed user
+    embedding matrix (L2-normalised rows, aligned with user_ids).
+
+    Snapshots are never modified after they are published. Ingests produce
+    the next epoch via next_epoch(), which copies the small dict indexes and
+    shares the (large) embedding matrix.
+    """
+
+    def __init__(self, version: str, ontology: OntologyManager, users: Dict[str, Any],
+                 user_ids: Optional[List[str]] = None, embeddings: Optional[np.ndarray] = None,
+                 epoch: int = 0):
+        self.version = version
+        self.epoch = epoch
+        self.ontology = ontology
+        self.users = users
+        self.user_ids = list(user_ids or [])
+        self.row_of = {uid: i for i, uid in enumerate(self.user_ids)}
+        self.embeddings = embeddings if embeddings is not None else np.zeros((0, 0), dtype=np.float32)
+        # Users whose matrix row is outdated because they were re-ingested
+        self.stale: FrozenSet[str] = frozenset()
+        # Vectors embedded on the fly for users missing from (or stale in) the matrix.
+        # The only mutable part: a per-epoch cache that readers may fill concurrently.
+        self.overlay: Dict[str, np.ndarray] = {}
+        # Objects that must outlive the arrays above (e.g. a shared memory mapping)
+        self.resources: List[Any] = []
+        self.created_at = time.time()
+
+    def vector_for(self, user_id: str) -> Optional[np.ndarray]:
+        vec = self.overlay.get(user_id)
+        if vec is not None:
+            return vec
+        if user_id in self.stale:
+            return None
+        row = self.row_of.get(user_id)
+        if row is None:
+            return None
+        return self.embeddings[row]
+
+    def next_epoch(self, batch: Dict[str, Any], ontology: OntologyManager, epoch: int) -> "IndexSnapshot":
+        """
+        Copy-on-write: a new snapshot with the batch of users applied.
+        The embedding matrix and row map are shared, not copied.
+        """
+        snapshot = IndexSnapshot.__new__(IndexSnapshot)
+        snapshot.version = self.version
+        snapshot.epoch = epoch
+        snapshot.ontology = ontology
+        snapshot.users = dict(self.users)
+        snapshot.users.update(batch)
+        snapshot.user_ids = self.user_ids
+        snapshot.row_of = self.row_of
+        snapshot.embeddings = self.embeddings
+        snapshot.stale = self.stale.union(uid for uid in batch if uid in self.row_of)
+        # dict() copies atomically even while readers insert into the old overlay
+        snapshot.overlay = dict(self.overlay)
+        for uid in batch:
+            snapshot.overlay.pop(uid, None)
+        snapshot.resources = self.resources
+        snapshot.created_at = time.time()
+        return snapshot
+
+    def release(self):
+        """Drop references to the heavy structures so they can be reclaimed."""
+        self.users = {}
+        self.overlay = {}
+        self.row_of = {}
+        self.embeddings = None
+        self.ontology = None
+        self.resources = []
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "epoch": self.epoch,
+            "users": len(self.users),
+            "embedded_users": len(self.row_of) - len(self.stale) + len(self.overlay),
+            "created_at": self.created_at,
+        }
+
+    def save(self, path: str):
+        """Persist the snapshot as a joblib artifact (fresh rows + on-the-fly vectors)."""
+        user_ids = [uid for uid in self.user_ids if uid not in self.stale and uid not in self.overlay]
+        rows = [self.embeddings[self.row_of[uid]] for uid in user_ids]
+        overlay = dict(self.overlay)
+        user_ids += list(overlay.keys())
+        rows += list(overlay.values())
+        embeddings = np.stack(rows).astype(np.float32) if rows else np.zeros((0, 0), dtype=np.float32)
+
+        import joblib
+        joblib.dump({
+            "format": ARTIFACT_FORMAT,
+            "version": self.version,
+            "users": {uid: as_user_dict(u) for uid, u in self.users.items()},
+            "user_ids": user_ids,
+            "embeddings": embeddings,
+        }, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IndexSnapshot":
+        """
+        Load an artifact written by save()/build() and rebuild its ontology.
+        All the expensive work happens here, off the serving path.
+        """
+        import joblib
+        data = joblib.load(path)
+        if data.get("format") != ARTIFACT_FORMAT:
+            raise ValueError(f"Unsupported index artifact format: {data.get('format')}")
+
+        ontology = OntologyManager()
+        for user in data["users"].values():
+            ontology.add_user(user)
+
+        embeddings = np.asarray(data["embeddings"], dtype=np.float32)
+        if embeddings.shape[0] != len(data["user_ids"]):
+            raise ValueError("Index artifact is corrupt: embedding rows do not match user_ids")
+
+        return cls(data["version"], ontology, data["users"], data["user_ids"], embeddings)
+
+    @classmethod
+    def build(cls, users: Dict[str, Any], nlp_engine, version: Optional[str] = None) -> "IndexSnapshot":
+        """Embed every user in one batched pass and return a fresh snapshot."""
+        ontology = OntologyManager()
+        for user in users.values():
+            ontology.add_user(as_user_dict(user))
+
+        user_ids = list(users.keys())
+        embeddings = nlp_engine.embed_batch([user_text(users[uid]) for uid in user_ids])
+        version = version or time.strftime("%Y%m%d-%H%M%S")
+        return cls(version, ontology, dict(users), user_ids, embeddings)
+
+
+class IndexHandle:
+    """
+    Holder for the live IndexSnapshot, with epoch-based writes and
+    blue/green swaps.
+
+    Readers capture the current snapshot once with acquire() and read it
+    without further locking. Writers only append to a pending batch;
+    publish() folds the batch into the writer-side OntologyManager and
+    installs the next epoch. swap() flips to a whole new snapshot (e.g. a
+    re-embedded artifact). A replaced snapshot is released only once every
+    request holding it has finished.
+
+    Listeners are called after each change goes live, with the ids of the
+    users it touched, or None after a swap (everything may have changed)
+    unless the swap says which users differ.
+    They run before wait_for() releases the writers, so indexes kept by
+    listeners are up to date by the time an ingest returns.
+    """
+
+    def __init__(self, snapshot: IndexSnapshot):
+        # Guards the current pointer and the in-flight counts (held for O(1) work only)
+        self._lock = threading.Lock()
+        # Guards the pending batch; writers never wait for a publish
+        self._pending_lock = threading.Lock()
+        # Serialises publish() and swap() against each other
+        self.write_lock = threading.RLock()
+        self._published = threading.Condition()
+
+        self._in_flight: Dict[IndexSnapshot, int] = {}
+        self._retired: List[IndexSnapshot] = []
+        self._pending: Dict[str, Any] = {}
+        # user_id -> seq of its latest write since the current base was installed
+        self._written: Dict[str, int] = {}
+        self.write_seq = 0
+        self.published_seq = 0
+        self.epoch = 0
+
+        self._wake = threading.Event()
+        self._publisher: Optional[threading.Thread] = None
+        self._stopping = False
+        self.listeners: List[Callable[[Optional[List[str]]], None]] = []
+
+        self._ontology = snapshot.ontology
+        snapshot.ontology = self._ontology.freeze()
+        self._current = snapshot
+        self._in_flight[snapshot] = 0
+
+    @property
+    def current(self) -> IndexSnapshot:
+        return self._current
+
+    @contextmanager
+    def acquire(self) -> Iterator[IndexSnapshot]:
+        snapshot = self.pin()
+        try:
+            yield snapshot
+        finally:
+            self.unpin(snapshot)
+
+    def pin(self, snapshot: Optional[IndexSnapshot] = None) -> IndexSnapshot:
+        """
+        Keep a snapshot from being reclaimed until unpin(): the current one,
+        or one the caller already has pinned (a cache outliving a request).
+        """
+        with self._lock:
+            snapshot = snapshot if snapshot is not None else self._current
+            self._in_flight[snapshot] = self._in_flight.get(snapshot, 0) + 1
+        return snapshot
+
+    def unpin(self, snapshot: IndexSnapshot):
+        reclaim = False
+        with self._lock:
+            self._in_flight[snapshot] -= 1
+            if self._in_flight[snapshot] == 0 and snapshot in self._retired:
+                self._retired.remove(snapshot)
+                del self._in_flight[snapshot]
+                reclaim = True
+        if reclaim:
+            snapshot.release()
+
+    def _install(self, snapshot: IndexSnapshot) -> IndexSnapshot:
+        reclaim = False
+        with self._lock:
+            old = self._current
+            self._current = snapshot
+            self._in_flight.setdefault(snapshot, 0)
+            if self._in_flight.get(old, 0) == 0:
+                self._in_flight.pop(old, None)
+                reclaim = True
+            else:
+                self._retired.append(old)
+        if reclaim:
+            old.release()
+        return old
+
+    def write(self, user) -> int:
+        """
+        Queue an ingested user for the next epoch and return its write seq.
+        Without a background publisher the epoch is published immediately.
+        """
+        return self.write_many([user])
+
+    def write_many(self, users: List[Any]) -> int:
+        """Queue several users so they land in the same epoch; returns the last write seq."""
+        with self._pending_lock:
+            for user in users:
+                self.write_seq += 1
+                uid = get_field(user, 'user_id', None)
+                self._pending[uid] = user
+                self._written[uid] = self.write_seq
+            seq = self.write_seq
+
+        if self._publisher is None:
+            self.publish()
+        else:
+            self._wake.set()
+        return seq
+
+    def wait_for(self, seq: int, timeout: Optional[float] = None) -> bool:
+        """Block until the epoch containing write `seq` is visible to readers."""
+        with self._published:
+            return self._published.wait_for(lambda: self.published_seq >= seq, timeout)
+
+    def publish(self) -> IndexSnapshot:
+        """Fold all pending writes into a new epoch and make it current."""
+        with self.write_lock:
+            with self._pending_lock:
+                batch = self._pending
+                self._pending = {}
+                seq = self.write_seq
+            if batch:
+                for user in batch.values():
+                    self._ontology.add_user(as_user_dict(user))
+                self.epoch += 1
+                self._install(self._current.next_epoch(batch, self._ontology.freeze(), self.epoch))
+        if batch:
+            self._notify(list(batch))
+        self._mark_published(seq)
+        return self._current
+
+    def _mark_published(self, seq: int):
+        with self._published:
+            if seq > self.published_seq:
+                self.published_seq = seq
+            self._published.notify_all()
+
+    def advance(self, snapshot: IndexSnapshot, changed: List[str]) -> IndexSnapshot:
+        """
+        Install the next epoch when it was derived from the current snapshot
+        elsewhere (a shared index delta), and notify listeners with the users
+        it changed, as publish() does.
+        """
+        with self.write_lock:
+            self.epoch += 1
+            snapshot.epoch = self.epoch
+            self._ontology = snapshot.ontology
+            self._install(snapshot)
+        self._notify(changed)
+        return snapshot
+
+    def swap(self, snapshot: IndexSnapshot, carry_over: bool = True, since: int = 0,
+             changed: Optional[List[str]] = None) -> IndexSnapshot:
+        """
+        Install a new base snapshot and return the one it replaced.
+        The handle takes ownership of the snapshot's OntologyManager as its
+        writer-side ontology.
+
+        With carry_over, users written after write seq `since` (e.g. while an
+        offline rebuild was embedding) are applied to the new snapshot before
+        it goes live, so those writes are not lost. Writes still pending
+        (queued, not yet published) are applied either way: their wait_for()
+        callers are told they are visible once the swap is installed.
+
+        changed lists the users that differ from the current snapshot when
+        that is known (e.g. a shared index checkpoint), so listeners can
+        update incrementally; None means anything may have changed.
+        """
+        with self.write_lock:
+            with self._pending_lock:
+                seq = self.write_seq
+                pending = self._pending
+                self._pending = {}
+                carried = {}
+                if carry_over:
+                    for uid, write_seq in self._written.items():
+                        if write_seq > since:
+                            user = pending.get(uid, self._current.users.get(uid))
+                            if user is not None:
+                                carried[uid] = user
+                for uid, user in pending.items():
+                    carried.setdefault(uid, user)
+                self._written = {uid: self._written[uid] for uid in carried}
+
+            ontology = snapshot.ontology
+            for user in carried.values():
+                ontology.add_user(as_user_dict(user))
+            self.epoch += 1
+            if carried:
+                snapshot = snapshot.next_epoch(carried, ontology.freeze(), self.epoch)
+            else:
+                snapshot.ontology = ontology.freeze()
+                snapshot.epoch = self.epoch
+            self._ontology = ontology
+            old = self._install(snapshot)
+
+        self._notify(None if changed is None else list(changed) + [uid for uid in carried if uid not in changed])
+        self._mark_published(seq)
+        log.info("index.swapped", extra={"fields": {"from": old.version, "to": snapshot.version,
+                                                    "epoch": snapshot.epoch}})
+        return old
+
+    def _notify(self, changed: Optional[List[str]]):
+        for listener in self.listeners:
+            try:
+                listener(changed)
+            except Exception:
+                name = getattr(listener, "__qualname__", repr(listener))
+                log.exception("index.listener_failed", extra={"fields": {"listener": name}})
+
+    def capture(self):
+        """Publish pending writes and return (users, write seq) for an offline rebuild."""
+        with self.write_lock:
+            self.publish()
+            return dict(self._current.users), self.published_seq
+
+    def start_publisher(self, batch_window: float = 0.005):
+        """
+        Publish epochs from a background thread. Writes arriving within
+        batch_window of each other share one epoch.
+        """
+        if self._publisher is not None:
+            return
+
+        def run():
+            while not self._stopping:
+                self._wake.wait()
+                self._wake.clear()
+                if batch_window:
+                    time.sleep(batch_window)
+                self.publish()
+
+        self._stopping = False
+        self._publisher = threading.Thread(target=run, name="index-publisher", daemon=True)
+        self._publisher.start()
+
+    def stop_publisher(self):
+        if self._publisher is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        self._publisher.join(timeout=1.0)
+        self._publisher = None
+        self.publish()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "current": self._current.describe(),
+                "in_flight": self._in_flight.get(self._current, 0),
+                "pending_writes": len(self._pending),
+                "draining": [
+                    {"version": s.version, "epoch": s.epoch, "in_flight": self._in_flight.get(s, 0)}
+                    for s in self._retired
+                ],
+            }
+
+
+def resolve_artifact_path(name: str, index_dir: str) -> str:
+    """
+    Resolve an artifact name inside index_dir.
+    Artifacts are pickles, so refuse anything that escapes the directory.
+    """
+    base = os.path.realpath(index_dir)
+    path = os.path.realpath(os.path.join(base, name))
+    if os.path.commonpath([base, path]) != base:
+        raise ValueError(f"Artifact path must be inside {index_dir}")
+    return path
+
+
+def build_artifact(users_path: str, out_path: str):
+    """Offline build: read users from a JSONL file and write an index artifact."""
+    from nlp_engine import NLPEngine
+
+    users = {}
+    with open(users_path) as f:
+        for line in f:
+            if line.strip():
+                user = json.loads(line)
+                users[user['user_id']] = user
+
+    snapshot = IndexSnapshot.build(users, NLPEngine())
+    snapshot.save(out_path)
+    print(f"Wrote index {snapshot.version} with {len(users)} users to {out_path}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "build":
+        print("Usage: python index_store.py build <users.jsonl> <artifact.joblib>")
+        sys.exit(1)
+    build_artifact(sys.argv[2], sys.argv[3])
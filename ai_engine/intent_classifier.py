@@ -1,11 +1,12 @@
 import os
 import numpy as np
-import joblib
-from typing import Tuple, Dict, List
+from typing import Tuple, Dict, List, Optional
 from nlp_engine import NLPEngine
 
 class IntentClassifier:
-    def __init__(self, nlp_engine: NLPEngine):
+    def __init__(self, nlp_engine: Optional[NLPEngine] = None):
+        # May be attached after construction, so the classifier can load
+        # while the transformer is still loading; classify() needs it.
         self.nlp_engine = nlp_engine
         self.model_path = "models/intent_model.joblib"
         self.le_path = "models/label_encoder.joblib"
@@ -29,6 +30,8 @@ class IntentClassifier:
     def load_model(self):
         """Loads the trained classifier and label encoder."""
         if os.path.exists(self.model_path) and os.path.exists(self.le_path):
+            # joblib (and sklearn, via unpickling) only load when there is a model
+            import joblib
             try:
                 self.model = joblib.load(self.model_path)
                 self.label_encoder = joblib.load(self.le_path)
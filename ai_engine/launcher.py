@@ -0,0 +1,200 @@
+"""
+Pre-forking production launcher for the ClustAura AI Engine.
+
+The parent process imports torch / sentence-transformers and loads the
+NLP model, intent classifier and ontology exactly once, freezes the heap
+and forks the workers, which share those pages copy-on-write. Workers serve
+from a socket bound by the parent, are pinned to their own CPUs and are
+recycled after a number of requests.
+
+Usage:
+    python launcher.py --workers 4 --port 8000 --max-requests 5000
+
+The dev reloader (python server.py) is unchanged.
+"""
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import uuid
+import random
+import argparse
+from typing import Dict, List, Optional
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-forking launcher for the ClustAura AI Engine")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="torch/BLAS threads per worker (default: CPUs / workers)")
+    parser.add_argument("--max-requests", type=int, default=0,
+                        help="Recycle a worker after this many requests (0 = never)")
+    parser.add_argument("--max-requests-jitter", type=int, default=0,
+                        help="Random extra requests per worker so recycles do not line up")
+    parser.add_argument("--no-pin", action="store_true", help="Do not pin workers to CPUs")
+    parser.add_argument("--shared-index", default=None, metavar="PREFIX",
+                        help="Share one index between the workers through shared memory under this prefix "
+                             "(or set CLUSTAURA_SHARED_INDEX); recommended with more than one worker or "
+                             "with --max-requests")
+    return parser.parse_args(argv)
+
+
+def cpu_slots(workers: int) -> List[List[int]]:
+    """Split the CPUs this process may use into one disjoint slice per worker."""
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    if workers >= len(cpus):
+        return [[cpus[i % len(cpus)]] for i in range(workers)]
+    per_worker = len(cpus) // workers
+    return [cpus[i * per_worker:(i + 1) * per_worker] for i in range(workers)]
+
+
+def limit_threads(threads: int):
+    """Cap the math libraries' thread pools; must run before they spin up."""
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+
+class PreforkLauncher:
+    def __init__(self, args):
+        self.args = args
+        self.workers: Dict[int, int] = {}  # pid -> slot
+        self.slots = cpu_slots(args.workers)
+        self.stopping = False
+        self.sock: Optional[socket.socket] = None
+        self.started_at = time.time()
+
+    def preload(self):
+        """Import and load everything heavy once, in the parent."""
+        # Keep the collector from touching (and so copying) objects while we load
+        gc.disable()
+
+        threads = self.args.threads_per_worker or max(1, len(self.slots[0]))
+        limit_threads(threads)
+
+        # Lets the server refuse the endpoints that only work in one process
+        os.environ["CLUSTAURA_WORKERS"] = str(self.args.workers)
+        if self.args.shared_index:
+            os.environ["CLUSTAURA_SHARED_INDEX"] = self.args.shared_index
+        elif (self.args.workers > 1 or self.args.max_requests) and not os.getenv("CLUSTAURA_SHARED_INDEX"):
+            # Opt-in only: the shared index changes how ingests are applied
+            print("Warning: running without --shared-index. Each worker keeps its own index: an "
+                  "ingest only reaches the worker that served it, and a recycled worker is re-forked "
+                  "from the startup index, losing every user ingested since.", file=sys.stderr)
+        if os.getenv("CLUSTAURA_SHARED_INDEX"):
+            # Every worker of this launcher, replacements included, is one run:
+            # shared state left by an earlier run is discarded, not adopted
+            os.environ["CLUSTAURA_SHARED_INDEX_RUN"] = uuid.uuid4().hex
+
+        from startup_timeline import timeline
+        with timeline.phase("torch"):
+            import torch
+            import sentence_transformers  # noqa: F401
+        torch.set_num_threads(threads)
+
+        import server
+        server.load_components()
+        self.server_module = server
+
+        # Move everything loaded so far into the permanent generation: later
+        # collections in the workers will not write to (and un-share) these pages.
+        gc.collect()
+        gc.freeze()
+        print(f"Preloaded AI Engine in {time.time() - self.started_at:.2f}s "
+              f"({gc.get_freeze_count()} objects frozen).")
+
+    def bind(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.args.host, self.args.port))
+        self.sock.listen(2048)
+        self.sock.set_inheritable(True)
+
+    def spawn(self, slot: int):
+        # Flush first so the child does not inherit (and re-print) buffered output
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = slot
+            return
+        # --- child ---
+        try:
+            self.run_worker(slot)
+            code = 0
+        except Exception as e:
+            print(f"Worker {os.getpid()} crashed: {e}")
+            code = 1
+        os._exit(code)
+
+    def run_worker(self, slot: int):
+        import torch
+        import uvicorn
+
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        random.seed()
+
+        cpus = self.slots[slot]
+        if not self.args.no_pin and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cpus)
+        torch.set_num_threads(self.args.threads_per_worker or len(cpus))
+        gc.enable()
+
+        max_requests = None
+        if self.args.max_requests:
+            max_requests = self.args.max_requests + random.randint(0, self.args.max_requests_jitter)
+
+        config = uvicorn.Config(
+            self.server_module.app,
+            limit_max_requests=max_requests,
+            log_level="info",
+        )
+        uvicorn.Server(config).run(sockets=[self.sock])
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        self.preload()
+        self.bind()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for slot in range(self.args.workers):
+            self.spawn(slot)
+        print(f"Serving on {self.args.host}:{self.args.port} with {self.args.workers} workers.")
+
+        while self.workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            slot = self.workers.pop(pid, None)
+            if slot is None or self.stopping:
+                continue
+            # Recycled (hit max requests) or crashed: fork a fresh worker into the same slot
+            print(f"Worker {pid} exited with status {status}; starting a replacement.")
+            self.spawn(slot)
+
+        print("All workers stopped.")
+        prefix = os.getenv("CLUSTAURA_SHARED_INDEX")
+        if prefix:
+            from shared_index import cleanup
+            cleanup(prefix)
+
+
+if __name__ == "__main__":
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    PreforkLauncher(parse_args()).run()
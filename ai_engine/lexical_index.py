@@ -0,0 +1,305 @@
+"""
+BM25 over the same profile text that is embedded (bio, project descriptions,
+post titles and content; index_store.user_text), as a cheap lexical channel
+next to the transformer. It catches exact evidence MiniLM blurs, such as
+library names and error strings.
+
+The index is in-process and incremental. Each user's text is one document;
+re-ingesting a user tombstones their old document and appends a new one,
+and tombstoned documents are compacted away once they pass
+COMPACT_FRACTION of the total. Postings are compact arrays of document ids
+(ascending, since documents are only appended) and term frequencies.
+
+search() returns the top k documents with WAND: each term keeps an upper
+bound on its BM25 contribution (from its largest term frequency and the
+shortest document containing it), and documents whose bounds cannot reach
+the current k-th score are skipped by binary search along the postings,
+without being scored.
+
+Following an IndexHandle (attach()), each published epoch upserts the
+users it changed. Swapping in a whole new index rebuilds the documents on a
+background thread while searches keep using the previous ones; upserts that
+arrive meanwhile are replayed onto the new documents before they go live.
+
+Scores are raw BM25. normalise() maps them to [0, 1) independently of the
+other candidates, for HybridRanker's lexical feature.
+"""
+import re
+import math
+import heapq
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from index_store import user_text
+
+log = logging.getLogger("clustaura.lexical")
+
+K1 = 1.2
+B = 0.75
+COMPACT_FRACTION = 0.25
+# BM25 score that normalise() maps to 0.5
+HALF_SCORE = 8.0
+MAX_TF = 65535
+
+# Keeps tokens like c++, node.js, scikit-learn, std::vector and ERR_SSL
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9_+#.:/-]*[a-z0-9_+#]|[a-z0-9]")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def normalise(score: float) -> float:
+    return score / (score + HALF_SCORE)
+
+
+class _Postings:
+    __slots__ = ("docs", "tfs", "max_tf", "min_length")
+
+    def __init__(self):
+        self.docs = array("I")
+        self.tfs = array("H")
+        self.max_tf = 0
+        self.min_length = 1 << 31
+
+
+class LexicalIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        # Background rebuild state: users upserted since it started, and
+        # whether another swap asked for a fresh start
+        self._rebuilding = False
+        self._rerun = False
+        self._replay: Dict[str, Any] = {}
+
+    def _reset(self):
+        self.postings: Dict[str, _Postings] = {}
+        # doc id -> user id (None once tombstoned), and document lengths
+        self.doc_user: List[Optional[str]] = []
+        self.lengths = array("I")
+        self.doc_of: Dict[str, int] = {}
+        self.live_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_of)
+
+    # --- writes ---
+
+    def rebuild(self, users: Dict[str, Any]):
+        fresh = self._build(users)
+        with self._lock:
+            self._adopt(fresh)
+
+    @staticmethod
+    def _build(users: Dict[str, Any]) -> "LexicalIndex":
+        """A new index of users, built without holding this one's lock."""
+        fresh = LexicalIndex()
+        for user_id, user in list(users.items()):
+            fresh._add(user_id, user_text(user))
+        return fresh
+
+    def _adopt(self, fresh: "LexicalIndex"):
+        self.postings = fresh.postings
+        self.doc_user = fresh.doc_user
+        self.lengths = fresh.lengths
+        self.doc_of = fresh.doc_of
+        self.live_length = fresh.live_length
+
+    def upsert_many(self, users: Iterable[Tuple[str, Any]]):
+        with self._lock:
+            for user_id, user in users:
+                if self._rebuilding:
+                    self._replay[user_id] = user
+                self._remove(user_id)
+                self._add(user_id, user_text(user))
+            if len(self.doc_user) - len(self.doc_of) > COMPACT_FRACTION * max(1, len(self.doc_user)):
+                self._compact()
+
+    def _add(self, user_id: str, text: str):
+        doc = len(self.doc_user)
+        terms = Counter(tokenize(text))
+        length = sum(terms.values())
+        self.doc_user.append(user_id)
+        self.lengths.append(length)
+        self.doc_of[user_id] = doc
+        self.live_length += length
+        for term, tf in terms.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = _Postings()
+            tf = min(tf, MAX_TF)
+            postings.docs.append(doc)
+            postings.tfs.append(tf)
+            postings.max_tf = max(postings.max_tf, tf)
+            postings.min_length = min(postings.min_length, length)
+
+    def _remove(self, user_id: str):
+        doc = self.doc_of.pop(user_id, None)
+        if doc is not None:
+            self.doc_user[doc] = None
+            self.live_length -= self.lengths[doc]
+
+    def _compact(self):
+        """Renumber live documents, dropping tombstoned postings."""
+        renumber = {}
+        for doc, user_id in enumerate(self.doc_user):
+            if user_id is not None:
+                renumber[doc] = len(renumber)
+        postings = {}
+        for term, old in self.postings.items():
+            new = _Postings()
+            for doc, tf in zip(old.docs, old.tfs):
+                if doc in renumber:
+                    new.docs.append(renumber[doc])
+                    new.tfs.append(tf)
+                    new.max_tf = max(new.max_tf, tf)
+                    new.min_length = min(new.min_length, self.lengths[doc])
+            if new.docs:
+                postings[term] = new
+        self.lengths = array("I", (self.lengths[doc] for doc in renumber))
+        self.doc_user = [self.doc_user[doc] for doc in renumber]
+        self.doc_of = {user_id: doc for doc, user_id in enumerate(self.doc_user)}
+        self.postings = postings
+
+    # --- reads ---
+
+    def _idf(self, postings: _Postings) -> float:
+        # Tombstoned documents still count until compaction, as in their postings
+        n = len(self.doc_user)
+        df = len(postings.docs)
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def _term_score(self, idf: float, tf: int, length: int, avg_length: float) -> float:
+        return idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_length))
+
+    def _query(self, text: str):
+        avg_length = self.live_length / len(self.doc_of) if self.doc_of else 1.0
+        terms = []
+        for term, qtf in Counter(tokenize(text)).items():
+            postings = self.postings.get(term)
+            if postings is not None:
+                idf = qtf * self._idf(postings)
+                bound = self._term_score(idf, postings.max_tf, postings.min_length, avg_length)
+                terms.append((postings, idf, bound))
+        return terms, max(avg_length, 1e-9)
+
+    def search(self, text: str, k: int) -> List[Tuple[str, float]]:
+        """Top k (user_id, BM25 score) for the query text, best first (WAND)."""
+        if k <= 0:
+            return []
+        with self._lock:
+            terms, avg_length = self._query(text)
+            # Cursor: [position, postings, idf, upper bound]
+            cursors = [[0, postings, idf, bound] for postings, idf, bound in terms]
+            top: List[Tuple[float, int]] = []
+            threshold = 0.0
+            while True:
+                cursors = [c for c in cursors if c[0] < len(c[1].docs)]
+                if not cursors:
+                    break
+                cursors.sort(key=lambda c: c[1].docs[c[0]])
+                # Pivot: the first cursor at which the bounds so far could beat the threshold
+                reach = 0.0
+                pivot = None
+                for i, cursor in enumerate(cursors):
+                    reach += cursor[3]
+                    if reach > threshold:
+                        pivot = i
+                        break
+                if pivot is None:
+                    break
+                pivot_doc = cursors[pivot][1].docs[cursors[pivot][0]]
+                if cursors[0][1].docs[cursors[0][0]] == pivot_doc:
+                    score = 0.0
+                    length = self.lengths[pivot_doc]
+                    for cursor in cursors:
+                        position, postings = cursor[0], cursor[1]
+                        if postings.docs[position] != pivot_doc:
+                            break
+                        score += self._term_score(cursor[2], postings.tfs[position], length, avg_length)
+                        cursor[0] += 1
+                    if self.doc_user[pivot_doc] is not None:
+                        if len(top) < k:
+                            heapq.heappush(top, (score, pivot_doc))
+                        elif score > top[0][0]:
+                            heapq.heapreplace(top, (score, pivot_doc))
+                        if len(top) == k:
+                            threshold = top[0][0]
+                else:
+                    # No document before pivot_doc can reach the threshold
+                    for cursor in cursors[:pivot]:
+                        cursor[0] = bisect_left(cursor[1].docs, pivot_doc, cursor[0])
+            return [(self.doc_user[doc], score) for score, doc in sorted(top, key=lambda item: (-item[0], item[1]))]
+
+    def scores(self, text: str, user_ids: Iterable[str]) -> Dict[str, float]:
+        """BM25 of the query text for each given user (0.0 if not indexed)."""
+        with self._lock:
+            terms, avg_length = self._query(text)
+            result = {}
+            for user_id in user_ids:
+                doc = self.doc_of.get(user_id)
+                score = 0.0
+                if doc is not None:
+                    for postings, idf, _ in terms:
+                        position = bisect_left(postings.docs, doc)
+                        if position < len(postings.docs) and postings.docs[position] == doc:
+                            score += self._term_score(idf, postings.tfs[position], self.lengths[doc], avg_length)
+                result[user_id] = score
+            return result
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "documents": len(self.doc_of),
+                "tombstoned": len(self.doc_user) - len(self.doc_of),
+                "terms": len(self.postings),
+                "postings": sum(len(p.docs) for p in self.postings.values()),
+            }
+
+    # --- keeping up with an IndexHandle ---
+
+    def attach(self, handle):
+        """Index handle.current and follow its epochs (rebuilding in the background after swaps)."""
+        def on_publish(changed: Optional[List[str]]):
+            if changed is None:
+                self._rebuild_in_background(handle)
+            else:
+                users = handle.current.users
+                self.upsert_many((uid, users[uid]) for uid in changed if uid in users)
+
+        # Registered first, so nothing published during the initial build is missed
+        handle.listeners.append(on_publish)
+        self._rebuild_in_background(handle)
+
+    def _rebuild_in_background(self, handle):
+        with self._lock:
+            if self._rebuilding:
+                self._rerun = True
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild_from, args=(handle,), name="lexical-rebuild", daemon=True).start()
+
+    def _rebuild_from(self, handle):
+        try:
+            while True:
+                with self._lock:
+                    self._rerun = False
+                    self._replay = {}
+                fresh = self._build(handle.current.users)
+                with self._lock:
+                    if self._rerun:
+                        continue
+                    fresh.upsert_many(self._replay.items())
+                    self._adopt(fresh)
+                    return
+        except Exception:
+            log.exception("lexical.rebuild_failed")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+                self._replay = {}
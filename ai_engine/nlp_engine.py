@@ -1,10 +1,19 @@
-from sentence_transformers import SentenceTransformer, util
 import numpy as np
+from typing import List
+
+from metrics import Histogram, SIZE_BUCKETS
+
+EMBED_BATCH_SIZE = Histogram("clustaura_embed_batch_size", "Texts per encode call", ["method"], buckets=SIZE_BUCKETS)
+EMBED_SECONDS = Histogram("clustaura_embed_seconds", "Encode call latency", ["method"])
 
 class NLPEngine:
     def __init__(self, model_name='all-MiniLM-L6-v2'):
+        # Imported here rather than at module level: sentence-transformers pulls
+        # in torch, which dominates start-up and can then load in parallel.
+        from sentence_transformers import SentenceTransformer
         print(f"Loading NLP Model: {model_name}...")
         self.model = SentenceTransformer(model_name)
+        self.dimension = self.model.get_sentence_embedding_dimension() or 384
         print("NLP Model Loaded.")
 
     def embed(self, text: str):
@@ -13,13 +22,34 @@ class NLPEngine:
         """
         if not text:
             return np.zeros(384) # Default dimension for MiniLM
-        return self.model.encode(text, convert_to_tensor=True)
+        EMBED_BATCH_SIZE.observe(1, method="embed")
+        with EMBED_SECONDS.time(method="embed"):
+            return self.model.encode(text, convert_to_tensor=True)
+
+    def embed_batch(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """
+        Embed many texts in one encode call.
+        Returns an L2-normalised float32 matrix (one row per text) so cosine
+        similarity becomes a plain dot product.
+        """
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        EMBED_BATCH_SIZE.observe(len(texts), method="embed_batch")
+        with EMBED_SECONDS.time(method="embed_batch"):
+            vectors = self.model.encode(
+                texts,
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+            )
+        return np.asarray(vectors, dtype=np.float32)
 
     def compute_similarity(self, vec1, vec2) -> float:
         """
         Compute cosine similarity between two vectors.
         Returns a float between 0.0 and 1.0
         """
+        from sentence_transformers import util
         # util.cos_sim returns a tensor, we assume 1D vectors here usually
         # but encode returns tensor by default given my flag above.
         score = util.cos_sim(vec1, vec2)
@@ -1,6 +1,6 @@
 from rdflib import Graph, Namespace, Literal, URIRef, RDF, RDFS
 from rdflib.namespace import FOAF, XSD
-from typing import List, Dict, Set
+from typing import List, Dict, Set, Tuple, FrozenSet, Optional
 
 # Define our Custom Namespace
 CLUST = Namespace("http://clustaura.org/ontology/")
@@ -8,6 +8,11 @@ CLUST = Namespace("http://clustaura.org/ontology/")
 class OntologyManager:
     def __init__(self):
         self.g = Graph()
+        # Plain-dict mirrors of the graph used by every read path:
+        # skill -> direct parents, and user_id -> skills (declared + project).
+        # They are cheap to copy, which is what freeze() relies on.
+        self._parents: Dict[URIRef, Tuple[URIRef, ...]] = {}
+        self._user_skills: Dict[str, FrozenSet[URIRef]] = {}
         self.bind_namespaces()
         self.define_schema()
         # Seed some basic skill hierarchy for demo purposes
@@ -53,7 +58,13 @@ class OntologyManager:
             "Node.js": ["JavaScript", "Backend Development"],
             "Web Development": ["Programming"]
         }
-        
+        self.add_taxonomy(taxonomy)
+
+    def add_taxonomy(self, taxonomy: Dict[str, List[str]]):
+        """
+        Add skills and their parent skills ({skill: [parents]}) to the hierarchy,
+        then re-calculate levels/weights for the whole graph.
+        """
         for skill, parents in taxonomy.items():
             s_uri = self._skill_uri(skill)
             self.g.add((s_uri, RDF.type, CLUST.Skill))
@@ -61,6 +72,7 @@ class OntologyManager:
                 p_uri = self._skill_uri(parent)
                 self.g.add((p_uri, RDF.type, CLUST.Skill))
                 self.g.add((s_uri, CLUST.isSubSkillOf, p_uri))
+                self._parents[s_uri] = self._parents.get(s_uri, ()) + (p_uri,)
 
         # After seeding, pre-calculate levels and weights
         self._calculate_levels_and_weights()
@@ -110,7 +122,7 @@ class OntologyManager:
             queue = [(start_node, 0.0)]
             while queue:
                 curr, dist = queue.pop(0)
-                parents = list(self.g.objects(curr, CLUST.isSubSkillOf))
+                parents = self._parents.get(curr, ())
                 if not parents:
                     paths.append((curr, dist))
                 for p in parents:
@@ -155,7 +167,7 @@ class OntologyManager:
             curr, dist = queue.pop(0)
             if curr == parent_uri:
                 return dist
-            for p in self.g.objects(curr, CLUST.isSubSkillOf):
+            for p in self._parents.get(curr, ()):
                 weight = self.edge_weights.get((curr, p), 1.0)
                 queue.append((p, dist + weight))
         return float('inf')
@@ -166,7 +178,7 @@ class OntologyManager:
         queue = [(start_uri, 0.0)]
         while queue:
             curr, dist = queue.pop(0)
-            for p in self.g.objects(curr, CLUST.isSubSkillOf):
+            for p in self._parents.get(curr, ()):
                 w = self.edge_weights.get((curr, p), 1.0)
                 new_dist = dist + w
                 if p not in ancestors or new_dist < ancestors[p]:
@@ -216,13 +228,16 @@ class OntologyManager:
         """
         Add a user and their explicitly declared skills to the graph.
         """
-        user_uri = self._user_uri(user_data['user_id'])
+        user_id = user_data['user_id']
+        user_uri = self._user_uri(user_id)
         self.g.add((user_uri, RDF.type, CLUST.User))
+        owned = set(self._user_skills.get(user_id, ()))
         
         # Add declared skills
         for skill_name in user_data.get('skills', []):
             skill_uri = self._skill_uri(skill_name)
             self.g.add((user_uri, CLUST.hasSkill, skill_uri))
+            owned.add(skill_uri)
             # Also ensure skill exists in graph
             if (skill_uri, RDF.type, CLUST.Skill) not in self.g:
                 self.g.add((skill_uri, RDF.type, CLUST.Skill))
@@ -232,31 +247,36 @@ class OntologyManager:
             for skill_name in project.get('skills_demonstrated', []):
                 skill_uri = self._skill_uri(skill_name)
                 self.g.add((user_uri, CLUST.hasSkill, skill_uri))
+                owned.add(skill_uri)
                 if (skill_uri, RDF.type, CLUST.Skill) not in self.g:
                     self.g.add((skill_uri, RDF.type, CLUST.Skill))
 
+        self._user_skills[user_id] = frozenset(owned)
+
+    def freeze(self) -> "OntologySnapshot":
+        """
+        Return a read-only copy of the skill hierarchy and user skill index.
+        The copy shares no mutable state with this manager, so readers can use
+        it without locks while add_user() keeps writing here.
+        """
+        return OntologySnapshot(
+            dict(self._parents), dict(self._user_skills), dict(self.levels), dict(self.edge_weights)
+        )
+
     def find_capable_users(self, required_skills: List[str]) -> List[str]:
         """
         Find users who satisfy ALL required skills, considering inheritance.
         Returns a list of User IDs.
         """
-        capable_users = set()
+        capable_users = []
         
-        # Get all users first
-        all_users = list(self.g.subjects(RDF.type, CLUST.User))
-        
-        for user_uri in all_users:
-            if self._check_user_capability(user_uri, required_skills):
-                # Extract ID from URI (user_XYZ -> XYZ)
-                # Robust extraction: remove the namespace and the prefix
-                full_uri_str = str(user_uri)
-                if full_uri_str.startswith(str(CLUST) + "user_"):
-                    uid = full_uri_str.replace(str(CLUST) + "user_", "")
-                    capable_users.add(uid)
+        for uid, owned_skills in self._user_skills.items():
+            if self._check_user_capability(owned_skills, required_skills):
+                capable_users.append(uid)
                 
-        return list(capable_users)
+        return capable_users
 
-    def _check_user_capability(self, user_uri: URIRef, required_skills: List[str]) -> bool:
+    def _check_user_capability(self, owned_skills: FrozenSet[URIRef], required_skills: List[str]) -> bool:
         """
         Check if a specific user satisfies all requirements.
         """
@@ -267,25 +287,22 @@ class OntologyManager:
         # This prevents "zero results" when a user is a good match but misses one specific tag.
         for req_skill in required_skills:
             req_uri = self._skill_uri(req_skill)
-            if self._user_has_skill(user_uri, req_uri):
+            if self._user_has_skill(owned_skills, req_uri):
                 return True
                 
         return False
 
-    def _user_has_skill(self, user_uri: URIRef, req_skill_uri: URIRef) -> bool:
+    def _user_has_skill(self, owned_skills: FrozenSet[URIRef], req_skill_uri: URIRef) -> bool:
         """
         Check if user has a skill OR a sub-skill of the required skill.
         Rule: User has S' AND S' isSubSkillOf S => User has S.
         """
         # 1. Direct Match
-        if (user_uri, CLUST.hasSkill, req_skill_uri) in self.g:
+        if req_skill_uri in owned_skills:
             return True
             
         # 2. Inheritance Match (User has a skill X, where X is a child of ReqSkill)
-        # Get all skills owned by user
-        user_skills = list(self.g.objects(user_uri, CLUST.hasSkill))
-        
-        for owned_skill in user_skills:
+        for owned_skill in owned_skills:
             if self._is_subskill_of(owned_skill, req_skill_uri):
                 return True
                 
@@ -299,9 +316,108 @@ class OntologyManager:
             return True
             
         # Get immediate parents of child
-        parents = list(self.g.objects(child_uri, CLUST.isSubSkillOf))
+        parents = self._parents.get(child_uri, ())
         for p in parents:
             if self._is_subskill_of(p, parent_uri):
                 return True
         return False
 
+
+class OntologySnapshot(OntologyManager):
+    """
+    Immutable view produced by OntologyManager.freeze().
+    Supports every read method; it has no graph and cannot be written to.
+    """
+
+    def __init__(self, parents: Dict[URIRef, Tuple[URIRef, ...]], user_skills: Dict[str, FrozenSet[URIRef]],
+                 levels: Dict[URIRef, int], edge_weights: Dict[Tuple[URIRef, URIRef], float]):
+        self.g = None
+        self._parents = parents
+        self._user_skills = user_skills
+        self.levels = levels
+        self.edge_weights = edge_weights
+
+    def add_user(self, user_data: Dict):
+        raise TypeError("OntologySnapshot is read-only; write through the OntologyManager")
+
+
+class SkillClosure:
+    """
+    Memoised reads over one frozen ontology, for scoring many problems
+    against the same index epoch (/recommend/batch, standing queries).
+
+    Each skill's ancestor set and each skill pair's similarity is computed
+    once per batch instead of once per problem and candidate, and
+    find_capable_users reads an inverted index (skill -> users holding it or
+    a sub-skill of it) instead of rescanning every user per problem. Results
+    match the OntologyManager methods of the same name, in the same order.
+    """
+
+    def __init__(self, ontology: OntologyManager):
+        self.ontology = ontology
+        self._ancestors: Dict[URIRef, FrozenSet[URIRef]] = {}
+        self._similarity: Dict[Tuple[str, str], float] = {}
+        self._user_ids: Optional[List[str]] = None
+        self._holders: Optional[Dict[URIRef, List[int]]] = None
+
+    def ancestors(self, skill_uri: URIRef) -> FrozenSet[URIRef]:
+        """The skill and every skill it is (transitively) a sub-skill of."""
+        closure = self._ancestors.get(skill_uri)
+        if closure is None:
+            closure = frozenset(self.ontology._get_all_ancestors(skill_uri))
+            self._ancestors[skill_uri] = closure
+        return closure
+
+    def _build_holders(self):
+        self._user_ids = list(self.ontology._user_skills)
+        self._holders = {}
+        for position, user_id in enumerate(self._user_ids):
+            for skill_uri in self.covered(user_id):
+                self._holders.setdefault(skill_uri, []).append(position)
+
+    def covered(self, user_id: str) -> FrozenSet[URIRef]:
+        """Every skill a user has, directly or through a sub-skill."""
+        covered = set()
+        for skill_uri in self.ontology._user_skills.get(user_id, ()):
+            covered |= self.ancestors(skill_uri)
+        return frozenset(covered)
+
+    def is_capable(self, user_id: str, required_skills: List[str]) -> bool:
+        """find_capable_users' test for a single user, without building the inverted index."""
+        if not required_skills:
+            return user_id in self.ontology._user_skills
+        covered = self.covered(user_id)
+        return any(self.ontology._skill_uri(req_skill) in covered for req_skill in required_skills)
+
+    def holders(self) -> Tuple[List[str], Dict[URIRef, List[int]]]:
+        """(user ids, skill -> positions in that list of the users covering it), built on first use."""
+        if self._holders is None:
+            self._build_holders()
+        return self._user_ids, self._holders
+
+    def find_capable_users(self, required_skills: List[str]) -> List[str]:
+        self.holders()
+        if not required_skills:
+            return list(self._user_ids)
+        positions = set()
+        for req_skill in required_skills:
+            positions.update(self._holders.get(self.ontology._skill_uri(req_skill), ()))
+        return [self._user_ids[i] for i in sorted(positions)]
+
+    def skill_similarity(self, skill_a: str, skill_b: str) -> float:
+        key = (skill_a, skill_b)
+        similarity = self._similarity.get(key)
+        if similarity is None:
+            similarity = self.ontology.skill_similarity(skill_a, skill_b)
+            self._similarity[key] = similarity
+        return similarity
+
+    def calculate_user_similarity(self, user_skills: List[str], required_skills: List[str]) -> float:
+        if not required_skills:
+            return 1.0
+        if not user_skills:
+            return 0.0
+        total_sim = 0.0
+        for req in required_skills:
+            total_sim += max(self.skill_similarity(req, user_skill) for user_skill in user_skills)
+        return total_sim / len(required_skills)
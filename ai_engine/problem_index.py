@@ -0,0 +1,149 @@
+"""
+Reverse matching: which open problems suit a user.
+
+ProblemIndex holds the vectors of the open problems (registered through
+/problems/open) in one growing matrix, plus posting lists from each required
+skill to the problems that require it. A user can be matched to a problem
+exactly when /recommend would list them as a candidate for it:
+  - a problem with candidate_ids lists its candidates in `targeted`
+  - a problem with no required skills is open to everyone in the ontology
+  - any other problem is reached through the posting list of a required
+    skill the user covers (directly or through a sub-skill)
+so the candidate problems for a user are the union of a few posting lists,
+and their semantic scores are one (problems x dim) @ (dim,) product.
+"""
+import threading
+from typing import Any, Callable, Dict, List, Set
+
+import numpy as np
+
+import lexical_index
+from index_store import get_field
+from ontology import SkillClosure
+
+INITIAL_CAPACITY = 64
+
+
+class ProblemIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.problems: List[Any] = []
+        self.slot_of: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._vectors = None
+        # skill URI -> slots of problems requiring it
+        self._postings: Dict[Any, Set[int]] = {}
+        # Problems without required skills: any user in the ontology qualifies
+        self._open: Set[int] = set()
+        # user_id -> slots of problems restricted to candidate_ids containing it
+        self._targeted: Dict[str, Set[int]] = {}
+        # slot -> posting list keys, so _remove can find them again
+        self._keys: Dict[int, List[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self.slot_of)
+
+    def add(self, problem, vector: np.ndarray, skill_uri: Callable[[str], Any]):
+        """Index problem (replacing one with the same problem_id); skill_uri maps names to ontology URIs."""
+        with self._lock:
+            self._remove(problem.problem_id)
+            if self._free:
+                slot = self._free.pop()
+                self.problems[slot] = problem
+            else:
+                slot = len(self.problems)
+                self.problems.append(problem)
+            if self._vectors is None:
+                self._vectors = np.zeros((INITIAL_CAPACITY, vector.shape[0]), dtype=np.float32)
+            elif slot >= self._vectors.shape[0]:
+                grown = np.zeros((self._vectors.shape[0] * 2, self._vectors.shape[1]), dtype=np.float32)
+                grown[:self._vectors.shape[0]] = self._vectors
+                self._vectors = grown
+            self._vectors[slot] = vector
+            self.slot_of[problem.problem_id] = slot
+
+            if problem.candidate_ids is not None:
+                for user_id in problem.candidate_ids:
+                    self._targeted.setdefault(user_id, set()).add(slot)
+            elif not problem.required_skills:
+                self._open.add(slot)
+            else:
+                self._keys[slot] = [skill_uri(skill) for skill in problem.required_skills]
+                for uri in self._keys[slot]:
+                    self._postings.setdefault(uri, set()).add(slot)
+
+    def remove(self, problem_id: str) -> bool:
+        with self._lock:
+            return self._remove(problem_id)
+
+    def _remove(self, problem_id: str) -> bool:
+        slot = self.slot_of.pop(problem_id, None)
+        if slot is None:
+            return False
+        problem = self.problems[slot]
+        self._open.discard(slot)
+        for user_id in problem.candidate_ids or ():
+            self._targeted.get(user_id, set()).discard(slot)
+        for uri in self._keys.pop(slot, ()):
+            self._postings.get(uri, set()).discard(slot)
+        self.problems[slot] = None
+        self._free.append(slot)
+        return True
+
+    def candidates(self, closure: SkillClosure, user_id: str) -> List[int]:
+        """Slots of the problems /recommend would consider user_id for."""
+        slots = set(self._targeted.get(user_id, ()))
+        if user_id in closure.ontology._user_skills:
+            slots |= self._open
+            for uri in closure.covered(user_id):
+                slots |= self._postings.get(uri, set())
+        return sorted(slots)
+
+    def match(self, closure: SkillClosure, ranker, user_db: Dict[str, Any], user_id: str,
+              user_vector: np.ndarray, top_k: int, lexical=None) -> List[Dict[str, Any]]:
+        """
+        The top_k open problems for a user, scored with the /recommend formula
+        from the problem's side, so a problem's match_score here equals this
+        user's match_score in that problem's recommendations.
+        """
+        with self._lock:
+            slots = self.candidates(closure, user_id)
+            if not slots:
+                return []
+            problems = [self.problems[slot] for slot in slots]
+            semantic = self._vectors[slots] @ user_vector
+
+        user = user_db[user_id]
+        skills = get_field(user, 'skills', [])
+        ontology = np.array([closure.calculate_user_similarity(skills, p.required_skills) for p in problems])
+        # Experience and activity depend on the user only, so the ordering
+        # follows from ontology and semantic scores; the full ranker output is
+        # built for the returned problems only.
+        experience = min(1.0, (len(get_field(user, 'projects', [])) + len(get_field(user, 'posts', []))) / 10.0)
+        activity = 1.0 if experience > 0 else 0.5
+        scores = (ranker.w_ontology * ontology + ranker.w_semantic * semantic.astype(np.float64)
+                  + ranker.w_experience * experience + ranker.w_activity * activity)
+        lexical_scores = np.zeros(len(problems))
+        if lexical is not None and ranker.w_lexical:
+            lexical_scores = np.array([
+                lexical_index.normalise(lexical.scores(f"{p.title} {p.description}", [user_id])[user_id])
+                for p in problems
+            ])
+            scores = (1 - ranker.w_lexical) * scores + ranker.w_lexical * lexical_scores
+        top = np.argsort(-scores, kind="stable")[:top_k]
+
+        results = []
+        for position in top:
+            problem = problems[position]
+            result = ranker.rank(
+                candidates=[user_id], problem_data=problem, user_db=user_db,
+                semantic_score_map={user_id: float(semantic[position])},
+                ontology_score_map={user_id: float(ontology[position])},
+                lexical_score_map={user_id: float(lexical_scores[position])},
+            )[0]
+            result.update(problem_id=problem.problem_id, title=problem.title)
+            results.append(result)
+        results.sort(key=lambda r: r["match_score"], reverse=True)
+        for rank, result in enumerate(results, start=1):
+            result["rank"] = rank
+        return results
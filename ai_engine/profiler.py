@@ -0,0 +1,137 @@
+"""
+On-demand statistical profiler.
+
+A background thread samples every thread's Python stack via
+sys._current_frames() at a fixed interval and counts identical stacks. The
+result is in the collapsed ("folded") format read by flamegraph.pl and
+speedscope: one "frame;frame;frame count" line per distinct stack.
+
+A thread sampler is used rather than a SIGPROF handler because signals are
+only delivered to the main thread, which under uvicorn is the event loop;
+/recommend runs on threadpool threads that a signal sampler would never see.
+"""
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from typing import Iterable, Optional
+
+ENGINE_DIR = os.path.dirname(os.path.abspath(__file__))
+MAX_STACK_DEPTH = 128
+# Innermost frames of a thread parked on a lock, queue or selector
+IDLE_FRAMES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"), ("selectors.py", "select"),
+}
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005, max_requests: Optional[int] = None,
+                 focus_dirs: Optional[Iterable[str]] = (ENGINE_DIR,)):
+        """
+        interval: seconds between samples.
+        max_requests: stop after this many requests have completed (see request_done()).
+        focus_dirs: keep only busy stacks with at least one frame from these
+            directories (the engine's own modules by default); None keeps
+            every stack, idle threads included.
+        """
+        self.interval = interval
+        self.max_requests = max_requests
+        self.focus_dirs = tuple(focus_dirs) if focus_dirs else None
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.requests = 0
+        self.started_at = None
+        self.duration = 0.0
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._done.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.time() - self.started_at
+
+    def wait(self, timeout: float) -> bool:
+        """Block until max_requests have completed or timeout expires."""
+        return self._done.wait(timeout)
+
+    def request_done(self):
+        with self._lock:
+            self.requests += 1
+            if self.max_requests and self.requests >= self.max_requests:
+                self._done.set()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._done.wait(self.interval):
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack = self._fold(frame)
+                if stack is None:
+                    continue
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                # Thread name first, so each thread pool gets its own tower
+                self.stacks[f"{names.get(ident, ident)};{stack}"] += 1
+            self.samples += 1
+            del frames
+
+    def _fold(self, frame) -> Optional[str]:
+        if self.focus_dirs is not None and (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+            return None
+        parts = []
+        focused = self.focus_dirs is None
+        while frame is not None and len(parts) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            if not focused and code.co_filename.startswith(self.focus_dirs):
+                focused = True
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        if not focused:
+            return None
+        # Semicolons separate frames in the folded format
+        return ";".join(p.replace(";", ":") for p in reversed(parts))
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+_active: Optional[SamplingProfiler] = None
+_active_lock = threading.Lock()
+
+
+def active() -> Optional[SamplingProfiler]:
+    return _active
+
+
+def run(seconds: float, max_requests: Optional[int] = None, interval: float = 0.005,
+        all_threads: bool = False) -> SamplingProfiler:
+    """
+    Profile for up to `seconds`, or until max_requests requests complete.
+    Blocks the calling thread; only one session may run at a time.
+    """
+    global _active
+    with _active_lock:
+        if _active is not None:
+            raise RuntimeError("A profiling session is already running")
+        profiler = SamplingProfiler(interval, max_requests, None if all_threads else (ENGINE_DIR,))
+        _active = profiler
+    try:
+        profiler.start()
+        profiler.wait(seconds)
+        profiler.stop()
+    finally:
+        with _active_lock:
+            _active = None
+    return profiler
@@ -1,15 +1,116 @@
-from typing import List, Dict, Any
+import heapq
+from typing import List, Dict, Any, Optional, Sequence, Set, Tuple
 from pydantic import BaseModel
 
+from index_store import get_field
+
+
+class SortedFeature:
+    """
+    One ranker feature for the threshold algorithm: user ids in descending
+    score order (sorted access) and a user -> score map (random access).
+    Users missing from the map score `default`.
+    """
+
+    def __init__(self, user_ids: Sequence[str], scores: Sequence[float],
+                 lookup: Optional[Dict[str, float]] = None, default: float = 0.0):
+        self.user_ids = user_ids
+        self.scores = scores
+        self.lookup = lookup if lookup is not None else dict(zip(user_ids, scores))
+        self.default = default
+
+    @classmethod
+    def from_scores(cls, scores: Dict[str, float], default: float = 0.0) -> "SortedFeature":
+        ordered = sorted(scores, key=scores.__getitem__, reverse=True)
+        return cls(ordered, [scores[uid] for uid in ordered], scores, default)
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def score(self, uid: str) -> float:
+        return self.lookup.get(uid, self.default)
+
+    def covers(self, user_ids: Set[str]) -> bool:
+        return user_ids.issubset(self.lookup)
+
+    def bound(self, depth: int, partial: bool = True) -> float:
+        """
+        Upper bound on the score of any user not seen in the first depth + 1
+        entries. With partial, some competing users are missing from the
+        list and score `default`, whatever the depth.
+        """
+        if depth >= len(self.scores):
+            # Everyone left is missing from the list
+            return self.default
+        return max(self.scores[depth], self.default) if partial else self.scores[depth]
+
+
+def threshold_top_k(features: List[Tuple[float, SortedFeature]], k: int,
+                    allowed: Optional[Set[str]] = None) -> Tuple[List[Tuple[float, str]], int]:
+    """
+    Fagin's threshold algorithm: the k users with the highest weighted sum of
+    features (weights must be non-negative), best first, and how many
+    distinct users were scored.
+
+    The lists are read in parallel, one depth at a time; each newly seen user
+    is scored in full by random access. The weighted sum of the scores at
+    the current depth bounds every user not seen yet, so reading stops once
+    the k-th best score reaches it. A list that lacks some competing users
+    (any list, without `allowed`) bounds them by its default as well.
+    Users outside `allowed` are skipped.
+
+    Not wired into /recommend, which ranks with rank(); used by
+    HybridRanker.rank_top_k, the ranking benchmark and verify_ranker.py.
+    """
+    top: List[Tuple[float, str]] = []
+    seen: Set[str] = set()
+    if k < 1:
+        return top, 0
+    partial = [allowed is None or not feature.covers(allowed) for _, feature in features]
+
+    def offer(uid: str):
+        total = sum(weight * f.score(uid) for weight, f in features)
+        if len(top) < k:
+            heapq.heappush(top, (total, uid))
+        elif total > top[0][0]:
+            heapq.heapreplace(top, (total, uid))
+
+    longest = max((len(feature) for _, feature in features), default=0)
+    for depth in range(longest):
+        for _, feature in features:
+            if depth >= len(feature):
+                continue
+            uid = feature.user_ids[depth]
+            if uid in seen:
+                continue
+            seen.add(uid)
+            if allowed is None or uid in allowed:
+                offer(uid)
+        if len(top) == k and top[0][0] >= sum(weight * f.bound(depth, missing)
+                                              for (weight, f), missing in zip(features, partial)):
+            break
+    else:
+        # Every list was exhausted: allowed users missing from all of them
+        # score the defaults and still compete
+        for uid in (allowed or set()) - seen:
+            seen.add(uid)
+            offer(uid)
+    return sorted(top, reverse=True), len(seen)
+
+
 class HybridRanker:
-    def __init__(self):
+    def __init__(self, w_lexical: float = 0.0):
         # Weights
         self.w_ontology = 0.4
         self.w_semantic = 0.3
         self.w_experience = 0.2
         self.w_activity = 0.1
+        # Share of the final score given to BM25 keyword evidence; the four
+        # weights above are scaled by (1 - w_lexical) so the total stays 1
+        self.w_lexical = w_lexical
 
-    def rank(self, candidates: List[str], problem_data: Any, user_db: Dict[str, Any], semantic_score_map: Dict[str, float], ontology_score_map: Dict[str, float]) -> List[Dict]:
+    def rank(self, candidates: List[str], problem_data: Any, user_db: Dict[str, Any], semantic_score_map: Dict[str, float], ontology_score_map: Dict[str, float],
+             lexical_score_map: Optional[Dict[str, float]] = None) -> List[Dict]:
         """
         Rank a list of candidate user IDs based on the hybrid formula.
         
@@ -18,6 +119,7 @@ class HybridRanker:
         user_db: internal dictionary mapping user_id -> UserProfile object/dict.
         semantic_score_map: Pre-computed semantic similarity for these users.
         ontology_score_map: Pre-computed ontology similarity (SF scores).
+        lexical_score_map: Optional normalised BM25 scores (lexical_index.normalise).
         """
         ranked_results = []
         
@@ -32,23 +134,12 @@ class HybridRanker:
             # 2. Semantic Score
             score_sem = semantic_score_map.get(uid, 0.0)
             
-            # 3. Experience Score
-            # Formula: min(1.0, count(projects + posts) / 10)
-            
-            # Helper to safely get field from dict or object
-            def get_field(obj, field, default):
-                if isinstance(obj, dict):
-                    return obj.get(field, default)
-                return getattr(obj, field, default)
-
-            proj_count = len(get_field(user, 'projects', []))
-            post_count = len(get_field(user, 'posts', []))
-            raw_exp = proj_count + post_count
-            score_exp = min(1.0, raw_exp / 10.0)
-            
-            # 4. Activity Score
-            score_act = 1.0 if raw_exp > 0 else 0.5
+            # 3. Experience Score and 4. Activity Score
+            score_exp, score_act = self.profile_scores(user)
             
+            # 5. Lexical Score (BM25 keyword match)
+            score_lex = lexical_score_map.get(uid, 0.0) if lexical_score_map else 0.0
+
             # Final Score Calculation
             final_score = (
                 (self.w_ontology * score_onto) +
@@ -56,9 +147,12 @@ class HybridRanker:
                 (self.w_experience * score_exp) +
                 (self.w_activity * score_act)
             )
+            if self.w_lexical:
+                final_score = (1 - self.w_lexical) * final_score + self.w_lexical * score_lex
             
             # Generate Explanation
-            explanation = self._generate_explanation(user, score_onto, score_sem, score_exp)
+            explanation = self._generate_explanation(user, score_onto, score_sem, score_exp,
+                                                     score_lex if self.w_lexical else 0.0)
             
             # Key matched skills (simple intersection for display)
             req_skills = set(p.lower() for p in problem_data.required_skills)
@@ -70,6 +164,10 @@ class HybridRanker:
                 "rank": 0, # to be assigned after sort
                 "match_score": round(final_score * 100, 2),
                 "ontology_score": round(score_onto, 4),
+                "semantic_score": round(score_sem, 4),
+                "experience_score": round(score_exp, 4),
+                "activity_score": round(score_act, 4),
+                "lexical_score": round(score_lex, 4),
                 "explanation": explanation,
                 "key_skills": matched
             })
@@ -83,7 +181,55 @@ class HybridRanker:
             
         return ranked_results
 
-    def _generate_explanation(self, user, onto_score, sem_score, exp_score):
+    def profile_scores(self, user) -> Tuple[float, float]:
+        """(experience, activity) of a user; they depend on the profile only."""
+        # Experience formula: min(1.0, count(projects + posts) / 10)
+        raw_exp = len(get_field(user, 'projects', [])) + len(get_field(user, 'posts', []))
+        score_exp = min(1.0, raw_exp / 10.0)
+        score_act = 1.0 if raw_exp > 0 else 0.5
+        return score_exp, score_act
+
+    def profile_features(self, user_db: Dict[str, Any]) -> Tuple[SortedFeature, SortedFeature]:
+        """Experience and activity of every user as SortedFeatures; build once per index epoch."""
+        experience, activity = {}, {}
+        for uid, user in user_db.items():
+            experience[uid], activity[uid] = self.profile_scores(user)
+        return SortedFeature.from_scores(experience), SortedFeature.from_scores(activity, default=0.5)
+
+    def rank_top_k(self, k: int, candidates: List[str], problem_data: Any, user_db: Dict[str, Any],
+                   semantic: SortedFeature, ontology: SortedFeature,
+                   profile: Optional[Tuple[SortedFeature, SortedFeature]] = None,
+                   lexical: Optional[SortedFeature] = None, strategy: str = "threshold") -> List[Dict]:
+        """
+        The first k results of rank() for these candidates, with the features
+        given in sorted order. strategy="scan" scores every candidate;
+        strategy="threshold" runs threshold_top_k over the features and only
+        builds results for its k users (same scores; ties may order
+        differently). The feature lists may cover more users than
+        candidates, e.g. profile features built once per epoch.
+
+        Not wired into /recommend, which calls rank(); only the ranking
+        benchmark (benchmarks/ranker_bench.py) uses it.
+        """
+        lexical_map = lexical.lookup if lexical is not None else None
+        if strategy == "scan":
+            return self.rank(candidates, problem_data, user_db, semantic.lookup, ontology.lookup, lexical_map)[:k]
+        if strategy != "threshold":
+            raise ValueError(f"Unknown ranking strategy: {strategy}")
+
+        if profile is None:
+            profile = self.profile_features({uid: user_db[uid] for uid in candidates if uid in user_db})
+        experience, activity = profile
+        scale = 1 - self.w_lexical
+        features = [(scale * self.w_ontology, ontology), (scale * self.w_semantic, semantic),
+                    (scale * self.w_experience, experience), (scale * self.w_activity, activity)]
+        if self.w_lexical and lexical is not None:
+            features.append((self.w_lexical, lexical))
+        allowed = {uid for uid in candidates if uid in user_db}
+        top, _ = threshold_top_k([(weight, feature) for weight, feature in features if weight], k, allowed)
+        return self.rank([uid for _, uid in top], problem_data, user_db, semantic.lookup, ontology.lookup, lexical_map)
+
+    def _generate_explanation(self, user, onto_score, sem_score, exp_score, lex_score=0.0):
         reasons = []
         if onto_score > 0.8:
             reasons.append("Strong skill alignment via ontology matching.")
@@ -92,6 +238,8 @@ class HybridRanker:
 
         if sem_score > 0.7:
             reasons.append("High semantic relevance to the problem context.")
+        if lex_score > 0.5:
+            reasons.append("Profile mentions key terms from the problem.")
         if exp_score > 0.5:
             reasons.append("Significant track record in this domain.")
             
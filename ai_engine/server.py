@@ -1,16 +1,65 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+import time
+from startup_timeline import timeline as startup_timeline
+_imports_started_at = time.time()
+
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.routing import Match
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
 import uvicorn
 import os
+import json
+import logging
+import threading
+import numpy as np
 
-from ontology import OntologyManager
+# torch / sentence-transformers and sklearn are imported lazily by the
+# components that need them, on the loader threads in load_components().
+from ontology import OntologyManager, SkillClosure
 from nlp_engine import NLPEngine
 from ranker import HybridRanker
 from intent_classifier import IntentClassifier
 from guide_logic import GuideLogic
+from index_store import IndexSnapshot, IndexHandle, get_field, user_text, resolve_artifact_path
+from shared_index import SharedIndexCoordinator
+from warmup import Readiness, run_warmup
+import metrics
+import tracing
+import profiler
+import capture
+from admission import AdmissionController, Rejected, ResponseCache
+from deadline import Deadline
+from standing_queries import StandingQueries
+from similar_users import SimilarIndex
+from team import form_team
+from candidates import candidate_pool, lexical_candidates
+import lexical_index
+from lexical_index import LexicalIndex
+from tracing import span
+from metrics import Counter, Gauge, Histogram, SIZE_BUCKETS
+
+startup_timeline.record("imports", _imports_started_at, time.time())
 
 app = FastAPI(title="ClustAura AI Engine", version="1.0.0")
+log = logging.getLogger("clustaura.server")
+
+# --- Metrics (per process, served at /metrics) ---
+HTTP_REQUESTS = Counter("clustaura_http_requests_total", "HTTP requests", ["method", "route", "status"])
+HTTP_SECONDS = Histogram("clustaura_http_request_seconds", "HTTP request latency", ["method", "route"])
+RECOMMEND_STAGE_SECONDS = Histogram("clustaura_recommend_stage_seconds", "Latency of each /recommend stage", ["stage"])
+RECOMMEND_CANDIDATES = Histogram("clustaura_recommend_candidates", "Candidates scored per /recommend",
+                                 ["source"], buckets=SIZE_BUCKETS)
+VECTOR_CACHE = Counter("clustaura_vector_cache_total", "Candidate vector lookups (hit = stored or cached vector)", ["result"])
+RECOMMEND_TIER = Counter("clustaura_recommend_tier_total", "/recommend responses by service tier", ["tier"])
+RECOMMEND_PARTIAL = Counter("clustaura_recommend_partial_total",
+                            "/recommend responses cut short by deadline_ms, by the stage that ran out", ["stage"])
+GUIDE_SECONDS = Histogram("clustaura_guide_seconds", "/guide/query latency by classified intent", ["intent"])
+INDEX_USERS = Gauge("clustaura_index_users", "Users in the current index epoch")
+INDEX_EPOCH = Gauge("clustaura_index_epoch", "Current index epoch")
+INDEX_IN_FLIGHT = Gauge("clustaura_index_in_flight_requests", "Requests holding an index epoch")
 
 # --- Data Models ---
 
@@ -32,6 +81,9 @@ class ProblemStatement(BaseModel):
     required_skills: List[str]
     candidate_ids: Optional[List[str]] = None
     domain: Optional[str] = None
+    # Latency budget from the start of the request; past it the best results
+    # scored so far are returned, flagged with X-Partial-Results
+    deadline_ms: Optional[float] = None
 
 class ExpertRecommendation(BaseModel):
     user_id: str
@@ -40,48 +92,504 @@ class ExpertRecommendation(BaseModel):
     explanation: str
     key_skills: List[str]
 
+class ProblemRecommendation(BaseModel):
+    problem_id: str
+    title: str
+    rank: int
+    match_score: float
+    explanation: str
+    key_skills: List[str]
+
+class SimilarUser(BaseModel):
+    user_id: str
+    rank: int
+    similarity: float
+    semantic_score: float
+    skill_score: float
+    shared_skills: List[str]
+
+class TeamRequest(BaseModel):
+    required_skills: List[str]
+    team_size: int
+    title: str = ""
+    description: str = ""
+    candidate_ids: Optional[List[str]] = None
+
+class TeamMember(BaseModel):
+    user_id: str
+    order: int
+    marginal_gain: float
+    ontology_score: float
+    semantic_score: float
+    covers: List[str]
+
+class TeamRecommendation(BaseModel):
+    members: List[TeamMember]
+    coverage: Dict[str, Dict[str, Any]]
+    coverage_score: float
+    objective: float
+    candidates: int
+
+class ProblemBatch(BaseModel):
+    problems: List[ProblemStatement]
+
+class IndexArtifactRequest(BaseModel):
+    path: str
+    carry_over: bool = True
+
+class IndexRebuildRequest(BaseModel):
+    save_as: Optional[str] = None
+
+class ProfileRequest(BaseModel):
+    seconds: float = 10.0
+    requests: Optional[int] = None
+    interval_ms: float = 5.0
+    all_threads: bool = False
+
 # --- Global Instances ---
-ontology_manager = None
 nlp_engine = None
 ranker = None
 intent_classifier = None
 guide_logic = None
-user_db = {} # In-memory cache for demo performance
+# Versioned users + ontology + embeddings; swapped atomically via /admin/index/*
+index_handle = None
+# Set when running several uvicorn workers over one shared memory index
+shared_index = None
+# BM25 over profile text, kept in step with index_handle
+lexical = LexicalIndex()
+# Open problems whose recommendations are kept up to date (/problems/open)
+standing_queries = None
+# Similar-user finder of the latest index epoch (/users/{user_id}/similar)
+similar_index = None
+# Loaded and warmed up; /recommend and /guide/query wait for it
+readiness = Readiness()
+
+INDEX_DIR = os.getenv("CLUSTAURA_INDEX_DIR", "indexes")
+INGEST_VISIBILITY_TIMEOUT = 5.0
+# e.g. CLUSTAURA_SHARED_INDEX=clustaura uvicorn server:app --workers 4
+SHARED_INDEX_PREFIX = os.getenv("CLUSTAURA_SHARED_INDEX")
+# Open problems (/problems/open) live in one process's memory, so they are
+# refused when requests may reach other workers: with a shared index, or
+# with CLUSTAURA_WORKERS > 1 (set by launcher.py; set it for uvicorn --workers)
+SINGLE_PROCESS = not SHARED_INDEX_PREFIX and int(os.getenv("CLUSTAURA_WORKERS", "1")) <= 1
+# How long a request that arrives during warm-up waits before getting a 503
+READY_WAIT_TIMEOUT = 30.0
+
+# Admission control: per-endpoint concurrency limits and wait queues within
+# one shared capacity (below the 40-thread default threadpool). Lower
+# priority values are admitted first. The queue timeout is kept under the
+# client's 10s axios timeout so a shed request gets a 429 it can act on.
+# Keyed on (method, route template), so routes with path parameters match.
+ADMISSION_LANES = {
+    ("POST", "/guide/query"): "guide",
+    ("POST", "/ingest/user"): "ingest",
+    ("POST", "/recommend"): "recommend",
+    ("POST", "/recommend/batch"): "recommend",
+    ("POST", "/recommend/team"): "recommend",
+    ("POST", "/problems/open"): "recommend",
+    ("GET", "/recommend/problems/{user_id}"): "recommend",
+    ("GET", "/users/{user_id}/similar"): "recommend",
+}
+admission = AdmissionController(capacity=int(os.getenv("CLUSTAURA_MAX_CONCURRENCY", "32")),
+                                queue_timeout=float(os.getenv("CLUSTAURA_QUEUE_TIMEOUT", "5.0")))
+admission.add_lane("guide", limit=16, max_queue=128, priority=0)
+admission.add_lane("ingest", limit=8, max_queue=64, priority=1)
+admission.add_lane("recommend", limit=int(os.getenv("CLUSTAURA_MAX_RECOMMEND", str(max(2, os.cpu_count() or 2)))),
+                   max_queue=64, priority=2)
+# Served from while /recommend is degraded
+recommend_cache = ResponseCache(1024)
+# Candidates scored between deadline checks
+DEADLINE_CHUNK = 64
+# /recommend/batch: problems per request, and per matrix product / streamed group
+BATCH_MAX_PROBLEMS = 500
+BATCH_GROUP = 16
+# Lexical channel: BM25 top hits added to the ontology candidates, and the
+# ranker's weight for BM25 evidence (both off unless configured)
+LEXICAL_CANDIDATES = int(os.getenv("CLUSTAURA_LEXICAL_CANDIDATES", "0"))
+LEXICAL_WEIGHT = float(os.getenv("CLUSTAURA_LEXICAL_WEIGHT", "0"))
+if LEXICAL_CANDIDATES < 0:
+    raise ValueError(f"CLUSTAURA_LEXICAL_CANDIDATES must be 0 or more, got {LEXICAL_CANDIDATES}")
+
+def _load_index() -> IndexHandle:
+    handle = IndexHandle(IndexSnapshot("live", OntologyManager(), {}))
+    initial_index = os.getenv("CLUSTAURA_INDEX_PATH")
+    if initial_index:
+        handle.swap(IndexSnapshot.load(initial_index), carry_over=False)
+    return handle
+
+def _read_index(read):
+    """read(index) on a pinned snapshot, so its epoch cannot be reclaimed meanwhile."""
+    with index_handle.acquire() as index:
+        return read(index)
+
+def load_components():
+    """
+    Load the model, classifier and index into the module globals.
+    The transformer, the joblib classifier and the ontology/index load
+    concurrently; each is recorded on the startup timeline.
+    Skips anything already loaded, so a pre-forking launcher can call this
+    once in the parent and let every worker inherit the result.
+    """
+    global nlp_engine, ranker, intent_classifier, guide_logic, index_handle
+
+    with ThreadPoolExecutor(max_workers=3, thread_name_prefix="startup") as pool:
+        index_future = nlp_future = classifier_future = None
+        if index_handle is None:
+            index_future = pool.submit(startup_timeline.timed("index", _load_index))
+        if nlp_engine is None:
+            nlp_future = pool.submit(startup_timeline.timed("nlp_engine", NLPEngine))
+        # Initialize Guide Components
+        if intent_classifier is None:
+            classifier_future = pool.submit(startup_timeline.timed("intent_classifier", IntentClassifier))
+        if ranker is None:
+            ranker = HybridRanker(w_lexical=LEXICAL_WEIGHT)
+        if guide_logic is None:
+            guide_logic = GuideLogic()
+
+        # .result() re-raises a loader's exception here, failing startup
+        if index_future:
+            index_handle = index_future.result()
+        if nlp_future:
+            nlp_engine = nlp_future.result()
+        if classifier_future:
+            intent_classifier = classifier_future.result()
+    intent_classifier.nlp_engine = nlp_engine
+
+    INDEX_USERS.set_function(lambda: _read_index(lambda index: len(index.users)))
+    INDEX_EPOCH.set_function(lambda: _read_index(lambda index: index.epoch))
+    INDEX_IN_FLIGHT.set_function(lambda: index_handle.status()["in_flight"])
 
 @app.on_event("startup")
 async def startup_event():
-    global ontology_manager, nlp_engine, ranker, intent_classifier, guide_logic
+    global shared_index, standing_queries, similar_index
+    tracing.configure_logging()
+    capture.configure_capture()
     print("Initializing ClustAura AI Engine...")
     
-    ontology_manager = OntologyManager()
-    nlp_engine = NLPEngine()
-    ranker = HybridRanker()
-    
-    # Initialize Guide Components
-    intent_classifier = IntentClassifier(nlp_engine)
-    guide_logic = GuideLogic()
-    
+    load_components()
+
+    # Background threads are started here rather than in load_components():
+    # threads do not survive fork, so each worker starts its own.
+    if SHARED_INDEX_PREFIX:
+        # One worker owns writes; the others map its exports read-only
+        shared_index = SharedIndexCoordinator(SHARED_INDEX_PREFIX, index_handle)
+        shared_index.handlers["load"] = lambda op: _load_artifact(op["path"], op.get("carry_over", True))
+        shared_index.handlers["rebuild"] = lambda op: threading.Thread(
+            target=_rebuild_index, args=(op.get("save_as"),), daemon=True
+        ).start()
+        shared_index.start()
+    else:
+        index_handle.start_publisher()
+    lexical.attach(index_handle)
+    standing_queries = StandingQueries(index_handle, nlp_engine, ranker, _recommend, lexical)
+    standing_queries.start()
+    similar_index = SimilarIndex(index_handle, nlp_engine)
+    similar_index.start()
+
+    # Warm up in the background so /health/live answers meanwhile; load
+    # balancers should route on /health/ready.
+    threading.Thread(target=_warm_up, name="warmup", daemon=True).start()
+
+def _warm_up():
+    readiness.state = "warming_up"
+    error = None
+    timings = {}
+    try:
+        with startup_timeline.phase("warmup"):
+            with index_handle.acquire() as index:
+                timings = run_warmup(nlp_engine, intent_classifier, index.ontology, ranker)
+    except Exception as e:
+        # A failed warm-up only costs latency; serve anyway
+        print(f"Warm-up failed: {e}")
+        error = str(e)
+    readiness.set_ready(timings, error)
+    startup_timeline.mark_ready()
     print("AI Engine Ready.")
+    print(startup_timeline.summary())
+
+def _require_single_process():
+    if not SINGLE_PROCESS:
+        raise HTTPException(status_code=501,
+                            detail="Open problems are kept per process; they need a single worker "
+                                   "without a shared index")
+
+def _require_ready():
+    if readiness.ready:
+        return
+    with span("ready_wait"):
+        ready = readiness.wait(READY_WAIT_TIMEOUT)
+    if not ready:
+        raise HTTPException(status_code=503, detail="AI Engine is warming up",
+                            headers={"Retry-After": "5"})
+
+@app.on_event("shutdown")
+def shutdown_event():
+    if shared_index:
+        shared_index.stop()
+    if standing_queries:
+        standing_queries.stop()
+    if similar_index:
+        similar_index.stop()
+    if index_handle:
+        index_handle.stop_publisher()
+    capture.shutdown_capture()
+    tracing.shutdown_logging()
+
+def _admission_lane(request: Request) -> Optional[str]:
+    # Middleware runs before routing, so find the route the router will pick
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return ADMISSION_LANES.get((request.method, route.path))
+    return None
+
+# Registered before trace_requests so it runs inside it: shed requests are
+# still counted, logged and given a request ID.
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    lane = _admission_lane(request)
+    if lane is None:
+        return await call_next(request)
+    try:
+        with span("admission"):
+            await admission.acquire(lane)
+    except Rejected as e:
+        log.warning("admission.rejected", extra={"fields": {"lane": lane, "reason": e.reason}})
+        return JSONResponse({"detail": f"AI Engine overloaded ({e.reason})"}, status_code=429,
+                            headers={"Retry-After": str(e.retry_after)})
+    start = time.perf_counter()
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            admission.release(lane, time.perf_counter() - start)
+
+    try:
+        response = await call_next(request)
+    except BaseException:
+        release()
+        raise
+    # call_next returns once the headers are ready, while a streamed body
+    # (/recommend/batch) is still being computed: hold the slot until the
+    # body has been sent, or the response is abandoned before it starts
+    body = response.body_iterator
+
+    async def hold_slot():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            release()
+
+    response.body_iterator = hold_slot()
+    response.background = BackgroundTask(release)
+    return response
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    trace, token = tracing.start_trace(request.headers.get("x-request-id"))
+    traffic = capture.active()
+    captured = None
+    if traffic and request.url.path in capture.CAPTURED_PATHS and traffic.sampled():
+        # Read before call_next; Starlette caches it for the endpoint
+        captured = await request.body()
+    try:
+        response = await call_next(request)
+    except BaseException:
+        tracing.end_trace(token)
+        raise
+    finally:
+        active_profiler = profiler.active()
+        if active_profiler:
+            active_profiler.request_done()
+    finished = False
+
+    def finish():
+        # Once the body has been sent, so a streamed body's spans (/recommend/batch)
+        # are in the duration, the histogram and the request log line
+        nonlocal finished
+        if finished:
+            return
+        finished = True
+        elapsed = trace.elapsed()
+        if captured is not None:
+            traffic.record(capture.CAPTURED_PATHS[request.url.path], captured, response.status_code, elapsed)
+        # Label by route template, not raw path, to keep the series count bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_SECONDS.observe(elapsed, method=request.method, route=route)
+        HTTP_REQUESTS.inc(method=request.method, route=route, status=str(response.status_code))
+        log.info("request", extra={"fields": {
+            "method": request.method, "route": route, "status": response.status_code,
+            "duration_ms": round(elapsed * 1000, 3), "spans": trace.span_ms(),
+        }})
+
+    # Server-Timing can only report the spans recorded before the headers;
+    # for a streamed body that is the time to the first line
+    response.headers["X-Request-ID"] = trace.request_id
+    response.headers["Server-Timing"] = trace.server_timing()
+    body = response.body_iterator
+
+    async def finish_trace():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            finish()
+
+    response.body_iterator = finish_trace()
+    response.background = BackgroundTask(finish)
+    tracing.end_trace(token)
+    return response
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """
+    Prometheus text exposition of this process's counters and histograms.
+    """
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/")
 def read_root():
     return {"status": "online", "service": "ClustAura AI Engine"}
 
+@app.get("/health/live")
+def liveness():
+    """
+    The process is up and serving HTTP; says nothing about the models.
+    """
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+def readiness_status():
+    """
+    200 once components are loaded and warmed up, 503 before.
+    """
+    status = readiness.describe()
+    if not readiness.ready:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+@app.get("/admin/admission")
+def admission_status():
+    """
+    Per-endpoint concurrency, queue depth, pressure and whether the lane is degraded.
+    """
+    return admission.describe()
+
+@app.get("/health/startup")
+def startup_status():
+    """
+    Start-up timeline: imports and each component load, in seconds since process start.
+    """
+    return startup_timeline.as_dict()
+
 @app.post("/recommend", response_model=List[ExpertRecommendation])
-async def recommend_experts(problem: ProblemStatement):
+def recommend_experts(problem: ProblemStatement, explain: bool = False):
     """
     Main endpoint to get expert recommendations for a given problem.
+    Runs in the threadpool; it reads one immutable index epoch, so it needs
+    no lock against concurrent ingests.
+    With ?explain=1 the response is {"results": [...], "explain": {...}}: a
+    query profile with stage counts, candidate sources, stage timings, cache
+    hits and each result's score breakdown.
     """
-    print(f"Received recommendation request for problem: {problem.title}")
-    
-    # 1. Generate Problem Embedding
+    log.info("recommend.received", extra={"fields": {"problem_id": problem.problem_id}})
+
+    _require_ready()
+    if shared_index:
+        shared_index.refresh()
+
+    # Under sustained overload: a cached answer if there is one, otherwise
+    # ontology-only scoring (no embedding, which is most of the cost).
+    degraded = admission.degraded("recommend") and not explain
+    cache_key = recommend_cache.key(problem.dict())
+    if degraded:
+        cached = recommend_cache.get(cache_key)
+        if cached is not None:
+            RECOMMEND_TIER.inc(tier="cache")
+            return JSONResponse(cached, headers={"X-Service-Tier": "cache"})
+    tier = "ontology_only" if degraded else "full"
+
+    # Capture one index epoch for the whole request so a concurrent ingest or
+    # swap can never mix users from one version with vectors from another.
+    profile = {} if explain else None
+    deadline = Deadline.from_budget(problem.deadline_ms)
+    with RECOMMEND_STAGE_SECONDS.time(stage="total"):
+        with index_handle.acquire() as index:
+            results = _recommend(index, problem, profile, semantic=not degraded, deadline=deadline)
+
+        # Serialise here rather than via response_model so the cost is measured
+        with _stage("serialize"):
+            body = [ExpertRecommendation(**r).dict() for r in results]
+            headers = {"X-Service-Tier": tier}
+            partial = deadline is not None and deadline.partial
+            if partial:
+                headers["X-Partial-Results"] = f"scored={deadline.scored}; candidates={deadline.candidates}"
+                RECOMMEND_PARTIAL.inc(stage=deadline.expired_in)
+            elif not degraded:
+                recommend_cache.put(cache_key, body)
+            if explain:
+                body = {"results": body, "explain": _explain(profile, results)}
+            RECOMMEND_TIER.inc(tier=tier)
+            return JSONResponse(body, headers=headers)
+
+def _explain(profile: Dict[str, Any], results: List[Dict]) -> Dict[str, Any]:
+    trace = tracing.current_trace()
+    profile["candidates"]["returned"] = len(results)
+    profile["stages_ms"] = trace.span_ms() if trace else {}
+    profile["weights"] = {
+        "ontology": ranker.w_ontology, "semantic": ranker.w_semantic,
+        "experience": ranker.w_experience, "activity": ranker.w_activity,
+        "lexical": ranker.w_lexical,
+    }
+    profile["scores"] = [
+        {
+            "user_id": r["user_id"],
+            "rank": r["rank"],
+            "match_score": r["match_score"],
+            "ontology_score": r["ontology_score"],
+            "semantic_score": r["semantic_score"],
+            "experience_score": r["experience_score"],
+            "activity_score": r["activity_score"],
+            "lexical_score": r["lexical_score"],
+        }
+        for r in results
+    ]
+    return profile
+
+def _stage(name: str):
+    # A request span (Server-Timing) that also feeds the stage histogram
+    return span(name, RECOMMEND_STAGE_SECONDS, stage=name)
+
+def _recommend(index: IndexSnapshot, problem: ProblemStatement, profile: Optional[Dict[str, Any]] = None,
+               semantic: bool = True, deadline: Optional[Deadline] = None):
+    """
+    Rank experts for problem on one index epoch. When profile is a dict it is
+    filled in with what each stage did, for ?explain=1. semantic=False skips
+    the embedding stages (degraded mode); semantic scores are then 0. With a
+    deadline, candidates are scored best-first in chunks until it passes and
+    only the scored ones are ranked (deadline.partial says whether any were cut).
+    """
+    user_db = index.users
+    ontology_manager = index.ontology
+    if profile is not None:
+        profile["index"] = {"version": index.version, "epoch": index.epoch, "users": len(user_db)}
+        profile["candidates"] = {"ontology": 0, "candidate_ids_requested": 0, "candidate_ids_valid": 0,
+                                 "scored": 0, "returned": 0}
+        profile["sources"] = []
+        profile["cache"] = {"hits": 0, "misses": 0}
+
     problem_text = f"{problem.title} {problem.description}"
-    problem_vec = nlp_engine.embed(problem_text)
-    
+
     # 2. Ontology Filtering (The Gatekeeper)
     # Find all users capable of solving this problem
-    capable_user_ids = ontology_manager.find_capable_users(problem.required_skills)
-    
+    with _stage("find_capable_users"):
+        capable_user_ids = ontology_manager.find_capable_users(problem.required_skills)
+    source = "ontology"
+    if profile is not None:
+        profile["candidates"]["ontology"] = len(capable_user_ids)
     
     # 2.5 Filter by Candidate IDs (if provided)
     if problem.candidate_ids is not None:
@@ -97,99 +605,511 @@ async def recommend_experts(problem: ProblemStatement):
         
         # However, ranker needs them to be in user_db
         valid_candidates = [uid for uid in problem.candidate_ids if uid in user_db]
+        if profile is not None:
+            profile["candidates"]["candidate_ids_requested"] = len(problem.candidate_ids)
+            profile["candidates"]["candidate_ids_valid"] = len(valid_candidates)
         
         if not valid_candidates:
-             print("No valid candidates found in provided candidate_ids (not in user_db).")
+             log.info("recommend.no_valid_candidates", extra={"fields": {"requested": len(problem.candidate_ids)}})
+             RECOMMEND_CANDIDATES.observe(0, source="candidate_ids")
              return []
              
         # We override capable_user_ids with the provided list (filtered by valid users)
         # We allow them even if ontology says "False" because we want to rank THIS group.
         capable_user_ids = valid_candidates
-        print(f"Filtered to {len(capable_user_ids)} specific candidates.")
+        source = "candidate_ids"
+
+    if profile is not None:
+        # Which sources produced the candidate set that was scored
+        profile["sources"] = [
+            {"source": "ontology", "candidates": profile["candidates"]["ontology"], "used": source == "ontology"},
+        ]
+        if problem.candidate_ids is not None:
+            profile["sources"].append({"source": "candidate_ids", "candidates": len(capable_user_ids), "used": True})
+
+    # 2.6 Lexical candidates: strong keyword matches the ontology missed
+    if source == "ontology" and LEXICAL_CANDIDATES:
+        with _stage("lexical_candidates"):
+            added = lexical_candidates(lexical, problem_text, capable_user_ids, user_db, LEXICAL_CANDIDATES)
+        capable_user_ids = capable_user_ids + added
+        if profile is not None:
+            profile["sources"].append({"source": "lexical", "candidates": len(added), "used": bool(added)})
 
-    elif not capable_user_ids:
-        print("No capable users found via Ontology.")
+    if source == "ontology" and not capable_user_ids:
+        log.info("recommend.no_capable_users")
+        RECOMMEND_CANDIDATES.observe(0, source=source)
         return []
         
-    print(f"Found {len(capable_user_ids)} capable candidates: {capable_user_ids}")
+    log.info("recommend.candidates", extra={"fields": {"source": source, "count": len(capable_user_ids)}})
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("recommend.candidate_ids", extra={"fields": {"candidate_ids": capable_user_ids[:100]}})
+    RECOMMEND_CANDIDATES.observe(len(capable_user_ids), source=source)
 
     # 3. Compute Scores for Candidates
     semantic_scores = {}
     ontology_scores = {}
-    
-    for uid in capable_user_ids:
-        user_data = user_db.get(uid)
-        if user_data:
-            # A. Semantic Score (Bio + Projects + Posts)
-            # Combine all textual evidence of expertise
-            project_text = " ".join([p.get('description', '') for p in user_data.projects])
-            
-            # [NEW] Include Post content
-            post_text = " ".join([f"{p.get('title', '')} {p.get('content', '')}" for p in user_data.posts])
-            
-            user_text = f"{user_data.bio} {project_text} {post_text}"
-            
-            user_vec = nlp_engine.embed(user_text)
-            sim_score = nlp_engine.compute_similarity(problem_vec, user_vec)
-            semantic_scores[uid] = sim_score
-            
-            # B. Ontology Score (Tree Distance)
-            onto_score = ontology_manager.calculate_user_similarity(user_data.skills, problem.required_skills)
-            ontology_scores[uid] = onto_score
-    
+    known = [uid for uid in capable_user_ids if uid in user_db]
+    # Without a deadline every stage runs as one chunk (one embedding batch);
+    # with one, the deadline is checked between chunks. The first chunk always
+    # runs, so a response is never empty just because the budget was tight.
+    chunk = DEADLINE_CHUNK if deadline else max(1, len(known))
+    if deadline:
+        deadline.candidates = len(known)
+
+    # A. Ontology Score (Tree Distance); first, because it orders the semantic pass
+    for start in range(0, len(known), chunk):
+        if start and deadline and deadline.expired("ontology_scores"):
+            break
+        with _stage("ontology_scores"):
+            for uid in known[start:start + chunk]:
+                onto_score = ontology_manager.calculate_user_similarity(get_field(user_db[uid], 'skills', []), problem.required_skills)
+                ontology_scores[uid] = onto_score
+    scored = [uid for uid in known if uid in ontology_scores]
+
+    # B. Semantic Score (Bio + Projects + Posts)
+    # Users without a stored vector (new or updated since the index was built)
+    # are embedded in batches and cached on this index version.
+    if semantic:
+        # 1. Generate Problem Embedding; only now, so the cheap ontology pass
+        # sees the deadline before the model calls have used it up
+        with _stage("embed_problem"):
+            problem_vec = nlp_engine.embed_batch([problem_text])[0]
+        if deadline:
+            # Best ontology matches first, so a cut-off drops the weakest candidates
+            scored.sort(key=lambda uid: ontology_scores[uid], reverse=True)
+        hits = misses = 0
+        for start in range(0, len(scored), chunk):
+            if start and deadline and deadline.expired("semantic_scores"):
+                break
+            batch = scored[start:start + chunk]
+            missing = [uid for uid in batch if index.vector_for(uid) is None]
+            hits += len(batch) - len(missing)
+            misses += len(missing)
+            if missing:
+                with _stage("embed_candidates"):
+                    vectors = nlp_engine.embed_batch([user_text(user_db[uid]) for uid in missing])
+                for uid, vec in zip(missing, vectors):
+                    index.overlay[uid] = vec
+
+            with _stage("semantic_scores"):
+                for uid in batch:
+                    # Rows are L2-normalised, so the dot product is the cosine similarity
+                    semantic_scores[uid] = float(np.dot(problem_vec, index.vector_for(uid)))
+        VECTOR_CACHE.inc(hits, result="hit")
+        VECTOR_CACHE.inc(misses, result="miss")
+        if profile is not None:
+            profile["cache"] = {"hits": hits, "misses": misses}
+        # A candidate without a semantic score would be ranked on 3 of 4 terms
+        scored = [uid for uid in scored if uid in semantic_scores]
+
+    if deadline:
+        deadline.scored = len(scored)
+    if profile is not None:
+        profile["candidates"]["scored"] = len(scored)
+        if deadline:
+            profile["deadline"] = deadline.describe()
+
+    # C. Lexical Score (BM25 over the same text); reported by ?explain=1 even when unweighted
+    lexical_scores = None
+    if ranker.w_lexical or profile is not None:
+        with _stage("lexical_scores"):
+            lexical_scores = _lexical_scores(problem_text, scored)
+
     # 4. Hybrid Ranking
-    ranked_experts = ranker.rank(
-        candidates=capable_user_ids,
-        problem_data=problem,
-        user_db=user_db,
-        semantic_score_map=semantic_scores,
-        ontology_score_map=ontology_scores
-    )
+    with _stage("rank"):
+        ranked_experts = ranker.rank(
+            candidates=scored,
+            problem_data=problem,
+            user_db=user_db,
+            semantic_score_map=semantic_scores,
+            ontology_score_map=ontology_scores,
+            lexical_score_map=lexical_scores
+        )
     
     return ranked_experts
 
+def _lexical_scores(problem_text: str, user_ids: List[str]) -> Dict[str, float]:
+    return {uid: lexical_index.normalise(score) for uid, score in lexical.scores(problem_text, user_ids).items()}
+
+@app.post("/recommend/batch")
+def recommend_batch(batch: ProblemBatch):
+    """
+    Recommendations for many problems in one call, streamed back as NDJSON:
+    one {"problem_id", "results"} line per problem, in request order, as each
+    group of BATCH_GROUP problems finishes. All problems are embedded in one
+    batch, each group is scored with one matrix product against the
+    candidates' vectors, and skill closures and similarities are shared across
+    the whole batch. deadline_ms is ignored here; results stream instead.
+    """
+    if len(batch.problems) > BATCH_MAX_PROBLEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_PROBLEMS} problems per batch")
+    _require_ready()
+    if shared_index:
+        shared_index.refresh()
+
+    semantic = not admission.degraded("recommend")
+    tier = "full" if semantic else "ontology_only"
+    RECOMMEND_TIER.inc(len(batch.problems), tier=tier)
+    # The body is iterated after this returns: keep its stage spans on this request's trace
+    return StreamingResponse(tracing.bind_context(_stream_batch(batch.problems, semantic)),
+                             media_type="application/x-ndjson", headers={"X-Service-Tier": tier})
+
+def _stream_batch(problems: List[ProblemStatement], semantic: bool):
+    # One epoch for the whole batch; released when the stream ends or the client goes away
+    with index_handle.acquire() as index:
+        done = 0
+        try:
+            for problem, results in _recommend_batch(index, problems, semantic):
+                body = [ExpertRecommendation(**r).dict() for r in results]
+                yield json.dumps({"problem_id": problem.problem_id, "results": body}) + "\n"
+                done += 1
+        except Exception as e:
+            # Headers are already sent; report the failure in-band for the rest
+            log.exception("recommend_batch.failed", extra={"fields": {"completed": done}})
+            for problem in problems[done:]:
+                yield json.dumps({"problem_id": problem.problem_id, "error": str(e)}) + "\n"
+
+def _recommend_batch(index: IndexSnapshot, problems: List[ProblemStatement], semantic: bool = True):
+    """Yield (problem, ranked results) for each problem, scored group by group on one index epoch."""
+    user_db = index.users
+    closure = SkillClosure(index.ontology)
+    if semantic and problems:
+        with _stage("embed_problem"):
+            problem_vecs = np.asarray(nlp_engine.embed_batch([f"{p.title} {p.description}" for p in problems]))
+
+    for start in range(0, len(problems), BATCH_GROUP):
+        group = problems[start:start + BATCH_GROUP]
+        with _stage("find_capable_users"):
+            pools = [candidate_pool(closure, user_db, problem, lexical, LEXICAL_CANDIDATES) for problem in group]
+        for pool, problem in zip(pools, group):
+            RECOMMEND_CANDIDATES.observe(len(pool), source="candidate_ids" if problem.candidate_ids is not None else "ontology")
+
+        semantic_maps = [{} for _ in group]
+        union = list(dict.fromkeys(uid for pool in pools for uid in pool))
+        if semantic and union:
+            missing = [uid for uid in union if index.vector_for(uid) is None]
+            VECTOR_CACHE.inc(len(union) - len(missing), result="hit")
+            VECTOR_CACHE.inc(len(missing), result="miss")
+            if missing:
+                with _stage("embed_candidates"):
+                    vectors = nlp_engine.embed_batch([user_text(user_db[uid]) for uid in missing])
+                for uid, vec in zip(missing, vectors):
+                    index.overlay[uid] = vec
+
+            with _stage("semantic_scores"):
+                # (candidates x dim) @ (dim x problems): every score of the group in one product
+                matrix = np.stack([index.vector_for(uid) for uid in union])
+                scores = matrix @ problem_vecs[start:start + len(group)].T
+                column = {uid: i for i, uid in enumerate(union)}
+                for j, pool in enumerate(pools):
+                    semantic_maps[j] = {uid: float(scores[column[uid], j]) for uid in pool}
+
+        for problem, pool, semantic_scores in zip(group, pools, semantic_maps):
+            with _stage("ontology_scores"):
+                ontology_scores = {
+                    uid: closure.calculate_user_similarity(get_field(user_db[uid], 'skills', []), problem.required_skills)
+                    for uid in pool
+                }
+            lexical_scores = None
+            if ranker.w_lexical:
+                with _stage("lexical_scores"):
+                    lexical_scores = _lexical_scores(f"{problem.title} {problem.description}", pool)
+            with _stage("rank"):
+                results = ranker.rank(
+                    candidates=pool,
+                    problem_data=problem,
+                    user_db=user_db,
+                    semantic_score_map=semantic_scores,
+                    ontology_score_map=ontology_scores,
+                    lexical_score_map=lexical_scores
+                )
+            yield problem, results
+
+@app.post("/recommend/team", response_model=TeamRecommendation)
+def recommend_team(request: TeamRequest):
+    """
+    A team of team_size users that together cover the required skills (by
+    ontology similarity) and fit the title/description, chosen by lazy
+    greedy submodular maximisation; see team.py. Members are listed in the
+    order they were picked, each with the required skills they cover best.
+    """
+    if request.team_size < 1:
+        raise HTTPException(status_code=422, detail="team_size must be at least 1")
+    _require_ready()
+    if shared_index:
+        shared_index.refresh()
+    query = None
+    text = f"{request.title} {request.description}".strip()
+    # Degraded: ontology coverage only, no embedding
+    if text and not admission.degraded("recommend"):
+        with _stage("embed_problem"):
+            query = nlp_engine.embed_batch([text])[0]
+    with index_handle.acquire() as index:
+        with span("form_team"):
+            return form_team(index, request.required_skills, request.team_size, query, nlp_engine,
+                             request.candidate_ids)
+
+@app.get("/recommend/problems/{user_id}", response_model=List[ProblemRecommendation])
+def recommend_problems(user_id: str, top_k: int = 50):
+    """
+    The reverse query: the open problems (see /problems/open) best suited to
+    a user. A problem is considered exactly when /recommend would consider
+    this user for it, and match_score is the score the user has there.
+    Open problems are per process, so like /problems/open this answers 501
+    when running several workers.
+    """
+    _require_single_process()
+    if top_k < 1:
+        raise HTTPException(status_code=422, detail="top_k must be at least 1")
+    _require_ready()
+    if shared_index:
+        shared_index.refresh()
+    with index_handle.acquire() as index:
+        if user_id not in index.users:
+            raise HTTPException(status_code=404, detail=f"Unknown user {user_id!r}")
+        vector = index.vector_for(user_id)
+        if vector is None:
+            with _stage("embed_candidates"):
+                vector = nlp_engine.embed_batch([user_text(index.users[user_id])])[0]
+            index.overlay[user_id] = vector
+        with span("match_problems"):
+            results = standing_queries.problems.match(SkillClosure(index.ontology), ranker, index.users,
+                                                      user_id, vector, top_k, lexical)
+    return [ProblemRecommendation(**r).dict() for r in results]
+
+@app.get("/users/{user_id}/similar", response_model=List[SimilarUser])
+def similar_users(user_id: str, k: int = 10):
+    """
+    The k users most similar to user_id: embedding cosine from the stored
+    user matrix (an IVF index on large indexes) blended with ontology
+    skill-set overlap. See similar_users.py for bulk precomputation.
+    """
+    if k < 1:
+        raise HTTPException(status_code=422, detail="k must be at least 1")
+    _require_ready()
+    if shared_index:
+        shared_index.refresh()
+    with index_handle.acquire() as index:
+        if user_id not in index.users:
+            raise HTTPException(status_code=404, detail=f"Unknown user {user_id!r}")
+        # The finder follows the index from a background thread; a user
+        # ingested a moment ago waits for it to catch up. Results come from
+        # the finder's own pinned epoch, which is checked for the user too.
+        with similar_index.acquire(user_id) as finder:
+            if finder is None or user_id not in finder.index.users:
+                raise HTTPException(status_code=503, detail="Similar users index is catching up",
+                                    headers={"Retry-After": "1"})
+            with span("similar_users"):
+                results = finder.similar(user_id, k)
+    return [SimilarUser(**r).dict() for r in results]
+
+@app.post("/problems/open")
+def open_problem(problem: ProblemStatement, top_k: int = 10):
+    """
+    Register an open problem as a standing query. Its top_k recommendations
+    are ranked now and then kept up to date as users are ingested, so
+    GET /problems/open/{problem_id} is a lookup rather than a ranking.
+    Registering the same problem_id again replaces it. Registrations are
+    held per process and are not persisted, so this (like every
+    /problems/open endpoint) answers 501 when running several workers.
+    """
+    _require_single_process()
+    if top_k < 1:
+        raise HTTPException(status_code=422, detail="top_k must be at least 1")
+    _require_ready()
+    if shared_index:
+        shared_index.refresh()
+    query = standing_queries.register(problem, top_k)
+    return _standing_response(problem.problem_id, query)
+
+@app.get("/problems/open")
+def list_open_problems():
+    _require_single_process()
+    return standing_queries.describe()
+
+@app.get("/problems/open/events")
+def open_problem_events(since: int = 0):
+    """
+    New matches since event `since`: one event each time a user enters an
+    open problem's top_k. Poll with the last seq seen.
+    """
+    _require_single_process()
+    events = standing_queries.events(since)
+    return {"events": events, "last_seq": events[-1]["seq"] if events else since}
+
+@app.get("/problems/open/{problem_id}")
+def get_open_problem(problem_id: str):
+    _require_single_process()
+    if shared_index:
+        shared_index.refresh()
+    query = standing_queries.get(problem_id)
+    if query is None:
+        raise HTTPException(status_code=404, detail=f"No open problem {problem_id!r}")
+    return _standing_response(problem_id, query)
+
+@app.delete("/problems/open/{problem_id}")
+def close_problem(problem_id: str):
+    _require_single_process()
+    if not standing_queries.unregister(problem_id):
+        raise HTTPException(status_code=404, detail=f"No open problem {problem_id!r}")
+    return {"status": "closed", "problem_id": problem_id}
+
+def _standing_response(problem_id: str, query) -> Dict[str, Any]:
+    return {
+        "problem_id": problem_id,
+        "top_k": query.top_k,
+        "epoch": query.epoch,
+        "updated_at": query.updated_at,
+        "results": [ExpertRecommendation(**r).dict() for r in query.top()],
+    }
+
 @app.post("/ingest/user")
-async def ingest_user(user: UserProfile):
+def ingest_user(user: UserProfile):
     """
     Endpoint to add/update a user in the ontology and semantic index.
     """
     try:
-        # Update In-Memory DB
-        user_db[user.user_id] = user
-        
-        # Update Ontology
-        # Convert Pydantic model to dict for manager
-        ontology_manager.add_user(user.dict())
+        # Queue the write for the next index epoch; concurrent ingests are
+        # batched into one epoch. Wait until it is visible so a /recommend
+        # issued after this call returns sees the user.
+        with span("index_write"):
+            if shared_index:
+                visible = shared_index.submit("ingest", {"user": user.dict()}, timeout=INGEST_VISIBILITY_TIMEOUT)
+            else:
+                seq = index_handle.write(user)
+                visible = index_handle.wait_for(seq, timeout=INGEST_VISIBILITY_TIMEOUT)
+        if not visible:
+            log.warning("ingest.queued", extra={"fields": {"user_id": user.user_id}})
+            return {"status": "queued", "user_id": user.user_id}
         
-        print(f"User {user.user_id} ingested successfully.")
+        log.debug("ingest.visible", extra={"fields": {"user_id": user.user_id}})
         return {"status": "success", "user_id": user.user_id}
     except Exception as e:
-        print(f"Error ingesting user: {e}")
+        log.exception("ingest.failed", extra={"fields": {"user_id": user.user_id}})
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/admin/index")
+def index_status():
+    """
+    Current index version and how many requests still hold retired versions.
+    """
+    status = index_handle.status()
+    # Which worker answered (the launcher benchmark counts them)
+    status["pid"] = os.getpid()
+    if shared_index:
+        status["shared"] = shared_index.status()
+    return status
+
+def _load_artifact(path: str, carry_over: bool):
+    snapshot = IndexSnapshot.load(path)
+    previous = index_handle.swap(snapshot, carry_over=carry_over)
+    return snapshot, previous
+
+@app.post("/admin/index/load")
+def load_index(request: IndexArtifactRequest):
+    """
+    Load an index artifact from INDEX_DIR and atomically flip to it.
+    Runs in the threadpool, so serving continues on the old version meanwhile.
+    """
+    try:
+        path = resolve_artifact_path(request.path, INDEX_DIR)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Index artifact not found: {request.path}")
+
+    if shared_index:
+        # Only the owning worker loads; every worker remaps once it is exported
+        shared_index.submit("load", {"path": path, "carry_over": request.carry_over}, timeout=0)
+        return {"status": "accepted", "current_version": _read_index(lambda index: index.version)}
+
+    try:
+        snapshot, previous = _load_artifact(path, request.carry_over)
+    except Exception as e:
+        log.exception("index.load_failed", extra={"fields": {"path": path}})
+        raise HTTPException(status_code=422, detail=f"Could not load index artifact: {e}")
+
+    return {"status": "success", "version": snapshot.version, "previous_version": previous.version}
+
+def _rebuild_index(save_as: Optional[str]):
+    users, since = index_handle.capture()
+    snapshot = IndexSnapshot.build(users, nlp_engine, version=f"rebuild-{time.strftime('%Y%m%d-%H%M%S')}")
+    if save_as:
+        snapshot.save(resolve_artifact_path(save_as, INDEX_DIR))
+    index_handle.swap(snapshot, since=since)
+
+@app.post("/admin/index/rebuild")
+def rebuild_index(request: IndexRebuildRequest, background_tasks: BackgroundTasks):
+    """
+    Re-embed every current user in the background, then swap to the result.
+    """
+    if request.save_as:
+        try:
+            resolve_artifact_path(request.save_as, INDEX_DIR)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        os.makedirs(INDEX_DIR, exist_ok=True)
+    if shared_index:
+        shared_index.submit("rebuild", {"save_as": request.save_as}, timeout=0)
+    else:
+        background_tasks.add_task(_rebuild_index, request.save_as)
+    return {"status": "accepted", "current_version": _read_index(lambda index: index.version)}
+
+MAX_PROFILE_SECONDS = 300.0
+
+@app.post("/admin/profile")
+def profile_requests(request: ProfileRequest):
+    """
+    Sample this worker's stacks for the next `requests` requests or `seconds`
+    seconds (whichever comes first) and return them as a collapsed-stack
+    file for flamegraph.pl / speedscope. Only this worker is profiled.
+    """
+    if not 0 < request.seconds <= MAX_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {MAX_PROFILE_SECONDS:g}]")
+    if request.interval_ms < 1:
+        raise HTTPException(status_code=400, detail="interval_ms must be at least 1")
+    try:
+        session = profiler.run(request.seconds, request.requests, request.interval_ms / 1000.0, request.all_threads)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    filename = f"clustaura-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.folded"
+    return PlainTextResponse(session.collapsed(), headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "X-Profile-Samples": str(session.samples),
+        "X-Profile-Requests": str(session.requests),
+        "X-Profile-Seconds": f"{session.duration:.2f}",
+    })
+
 class GuideQuery(BaseModel):
     query: str
     current_page: Optional[str] = None
 
 @app.post("/guide/query")
-async def query_guide(request: GuideQuery):
+def query_guide(request: GuideQuery):
     """
-    Endpoint for the AI Guide chatbot.
+    Endpoint for the AI Guide chatbot. A plain def: classification runs on the
+    threadpool, not the event loop.
     """
     global intent_classifier, guide_logic
-    
+
+    _require_ready()
     if not intent_classifier or not guide_logic:
         raise HTTPException(status_code=503, detail="AI Guide services not initialized")
 
-    print(f"DEBUG: Guide Query Received: {request.query} on page {request.current_page}")
+    start = time.perf_counter()
     
     # 1. Classify Intent
-    intent, score = intent_classifier.classify(request.query)
-    print(f"DEBUG: Classified Intent: {intent} with score {score:.4f}")
+    with span("classify"):
+        intent, score = intent_classifier.classify(request.query)
     
     # 2. Generate Response
-    response = guide_logic.get_response(intent, score, request.current_page)
-    print(f"DEBUG: Generated Response: {response['text'][:50]}...")
+    with span("respond"):
+        response = guide_logic.get_response(intent, score, request.current_page)
+    GUIDE_SECONDS.observe(time.perf_counter() - start, intent=intent)
+    log.info("guide.answered", extra={"fields": {
+        "intent": intent, "score": round(score, 4), "page": request.current_page,
+    }})
     
     return response
 
@@ -0,0 +1,710 @@
+import os
+import sys
+import json
+import time
+import fcntl
+import struct
+import tempfile
+import mmap
+import threading
+import logging
+import _posixshmem
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import numpy as np
+from rdflib import URIRef
+
+from ontology import OntologyManager, OntologySnapshot
+from index_store import IndexHandle, IndexSnapshot, as_user_dict
+
+log = logging.getLogger("clustaura.shared_index")
+
+# Control segment: seqlock counter, index generation, journal position the
+# exported generation includes, bytes compacted out of the journal, latest
+# full (checkpoint) generation, data segment name
+CONTROL = struct.Struct("<qqqqq64s")
+# After it: the ID of the run that created the shared state
+RUN = struct.Struct("<32s")
+ALIGN = 64
+# Delta generations exported between two full checkpoints
+CHECKPOINT_EVERY = 64
+
+
+class _Segment:
+    """
+    A named POSIX shared memory mapping, like multiprocessing's SharedMemory
+    but never registered with its resource tracker. uvicorn workers share
+    one tracker, which would otherwise unlink segments other workers still
+    use (or log errors when several workers release the same name).
+    Segment lifetime is managed explicitly by the owner instead.
+    """
+
+    def __init__(self, name: str, create: bool = False, size: int = 0):
+        self.name = name
+        flags = os.O_RDWR | (os.O_CREAT | os.O_EXCL if create else 0)
+        fd = _posixshmem.shm_open("/" + name, flags, mode=0o600)
+        try:
+            if create:
+                os.ftruncate(fd, size)
+            self._mmap = mmap.mmap(fd, os.fstat(fd).st_size)
+        finally:
+            os.close(fd)
+        self.buf = memoryview(self._mmap)
+
+    def close(self):
+        if hasattr(self, "buf"):
+            self.buf.release()
+            self._mmap.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except (BufferError, ValueError):
+            # numpy views are still alive; the mapping goes when they do
+            pass
+
+
+def _unlink(name: str):
+    try:
+        _posixshmem.shm_unlink("/" + name)
+    except FileNotFoundError:
+        pass
+
+
+def _ontology_arrays(ontology: OntologyManager) -> Dict[str, Any]:
+    """Flatten the ontology's dict indexes into CSR-style numpy arrays."""
+    skill_ids: Dict[URIRef, int] = {}
+
+    def skill_id(uri):
+        if uri not in skill_ids:
+            skill_ids[uri] = len(skill_ids)
+        return skill_ids[uri]
+
+    for child, parents in ontology._parents.items():
+        skill_id(child)
+        for p in parents:
+            skill_id(p)
+    for skills in ontology._user_skills.values():
+        for s in skills:
+            skill_id(s)
+    for s in ontology.levels:
+        skill_id(s)
+    skills = list(skill_ids)
+
+    parent_indptr = np.zeros(len(skills) + 1, dtype=np.int32)
+    parent_indices, parent_weights = [], []
+    for i, s in enumerate(skills):
+        for p in ontology._parents.get(s, ()):
+            parent_indices.append(skill_ids[p])
+            parent_weights.append(ontology.edge_weights.get((s, p), np.nan))
+        parent_indptr[i + 1] = len(parent_indices)
+
+    onto_user_ids = list(ontology._user_skills.keys())
+    user_skill_indptr = np.zeros(len(onto_user_ids) + 1, dtype=np.int32)
+    user_skill_indices = []
+    for i, uid in enumerate(onto_user_ids):
+        user_skill_indices.extend(skill_ids[s] for s in ontology._user_skills[uid])
+        user_skill_indptr[i + 1] = len(user_skill_indices)
+
+    return {
+        "skills": [str(s) for s in skills],
+        "onto_user_ids": onto_user_ids,
+        "arrays": {
+            "parent_indptr": parent_indptr,
+            "parent_indices": np.asarray(parent_indices, dtype=np.int32),
+            "parent_weights": np.asarray(parent_weights, dtype=np.float32),
+            "levels": np.asarray([ontology.levels.get(s, -1) for s in skills], dtype=np.int32),
+            "user_skill_indptr": user_skill_indptr,
+            "user_skill_indices": np.asarray(user_skill_indices, dtype=np.int32),
+        },
+    }
+
+
+def _ontology_from_arrays(skills: List[str], onto_user_ids: List[str], arrays: Dict[str, np.ndarray]) -> OntologySnapshot:
+    uris = [URIRef(s) for s in skills]
+    parent_indptr, parent_indices = arrays["parent_indptr"], arrays["parent_indices"]
+    parent_weights = arrays["parent_weights"]
+
+    parents, edge_weights, levels = {}, {}, {}
+    for i, uri in enumerate(uris):
+        start, end = parent_indptr[i], parent_indptr[i + 1]
+        if end > start:
+            parents[uri] = tuple(uris[j] for j in parent_indices[start:end])
+            for j, w in zip(parent_indices[start:end], parent_weights[start:end]):
+                if not np.isnan(w):
+                    edge_weights[(uri, uris[j])] = float(w)
+        if arrays["levels"][i] >= 0:
+            levels[uri] = int(arrays["levels"][i])
+
+    indptr, indices = arrays["user_skill_indptr"], arrays["user_skill_indices"]
+    user_skills = {
+        uid: frozenset(uris[j] for j in indices[indptr[i]:indptr[i + 1]])
+        for i, uid in enumerate(onto_user_ids)
+    }
+    return OntologySnapshot(parents, user_skills, levels, edge_weights)
+
+
+def _write_segment(name: str, header: Dict[str, Any], arrays: Dict[str, np.ndarray], blob: bytes) -> int:
+    """
+    Write a new shared memory segment:
+    [u64 header length][JSON header][aligned numpy arrays][JSON blob].
+    Returns the segment size.
+    """
+    layout, offset = {}, 0
+    for key, arr in arrays.items():
+        offset = (offset + ALIGN - 1) // ALIGN * ALIGN
+        layout[key] = {"offset": offset, "dtype": arr.dtype.str, "shape": list(arr.shape)}
+        offset += arr.nbytes
+    header = dict(header, arrays=layout, blob={"offset": offset, "length": len(blob)})
+    header_blob = json.dumps(header).encode()
+    data_start = (8 + len(header_blob) + ALIGN - 1) // ALIGN * ALIGN
+    size = data_start + offset + len(blob)
+
+    shm = _Segment(name, create=True, size=max(size, 1))
+    try:
+        struct.pack_into("<Q", shm.buf, 0, len(header_blob))
+        shm.buf[8:8 + len(header_blob)] = header_blob
+        for key, arr in arrays.items():
+            start = data_start + layout[key]["offset"]
+            shm.buf[start:start + arr.nbytes] = np.ascontiguousarray(arr).tobytes()
+        start = data_start + offset
+        shm.buf[start:start + len(blob)] = blob
+    finally:
+        shm.close()
+    return size
+
+
+def _read_segment(name: str):
+    """(mapping, header, read-only array views, parsed JSON blob) of a segment."""
+    shm = _Segment(name)
+    header_len = struct.unpack_from("<Q", shm.buf, 0)[0]
+    header = json.loads(bytes(shm.buf[8:8 + header_len]))
+    data_start = (8 + header_len + ALIGN - 1) // ALIGN * ALIGN
+
+    arrays = {}
+    for key, spec in header["arrays"].items():
+        arr = np.ndarray(tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]), buffer=shm.buf,
+                         offset=data_start + spec["offset"])
+        arr.flags.writeable = False
+        arrays[key] = arr
+
+    start = data_start + header["blob"]["offset"]
+    blob = json.loads(bytes(shm.buf[start:start + header["blob"]["length"]]))
+    return shm, header, arrays, blob
+
+
+def write_segment(name: str, snapshot: IndexSnapshot, changed: Optional[List[str]] = None) -> int:
+    """
+    Serialise a whole snapshot (a full checkpoint) into a new segment.
+    changed lists the users that differ from the previous generation, or
+    None when the base was replaced (load, rebuild, takeover).
+    """
+    user_ids = [uid for uid in snapshot.user_ids if uid not in snapshot.stale and uid not in snapshot.overlay]
+    rows = [snapshot.embeddings[snapshot.row_of[uid]] for uid in user_ids]
+    overlay = dict(snapshot.overlay)
+    user_ids += list(overlay.keys())
+    rows += list(overlay.values())
+    embeddings = np.stack(rows).astype(np.float32) if rows else np.zeros((0, 0), dtype=np.float32)
+
+    onto = _ontology_arrays(snapshot.ontology)
+    header = {
+        "kind": "full",
+        "changed": changed,
+        "version": snapshot.version,
+        "epoch": snapshot.epoch,
+        "user_ids": user_ids,
+        "skills": onto["skills"],
+        "onto_user_ids": onto["onto_user_ids"],
+    }
+    users_blob = json.dumps({uid: as_user_dict(u) for uid, u in snapshot.users.items()}).encode()
+    return _write_segment(name, header, dict(onto["arrays"], embeddings=embeddings), users_blob)
+
+
+def write_delta(name: str, snapshot: IndexSnapshot, user_ids: List[str]) -> int:
+    """
+    Serialise the users changed since the previous generation: their
+    profiles, skill sets and, where already embedded, their vectors.
+    """
+    vector_ids, vectors = [], []
+    for uid in user_ids:
+        vec = snapshot.vector_for(uid)
+        if vec is not None:
+            vector_ids.append(uid)
+            vectors.append(vec)
+    header = {
+        "kind": "delta",
+        "changed": user_ids,
+        "user_skills": {uid: [str(s) for s in snapshot.ontology._user_skills.get(uid, ())] for uid in user_ids},
+        "vector_ids": vector_ids,
+    }
+    arrays = {"vectors": np.stack(vectors).astype(np.float32) if vectors else np.zeros((0, 0), dtype=np.float32)}
+    users_blob = json.dumps({uid: as_user_dict(snapshot.users[uid]) for uid in user_ids}).encode()
+    return _write_segment(name, header, arrays, users_blob)
+
+
+def _snapshot_from(shm, header, arrays, users) -> IndexSnapshot:
+    """
+    The snapshot of a full segment. The embedding matrix is a read-only view
+    straight onto shared memory; the ontology is rebuilt from the shared arrays.
+    """
+    ontology = _ontology_from_arrays(header["skills"], header["onto_user_ids"], arrays)
+    snapshot = IndexSnapshot(header["version"], ontology, users, header["user_ids"], arrays["embeddings"],
+                             epoch=header["epoch"])
+    # Keep the mapping alive for as long as the snapshot is
+    snapshot.resources.append(shm)
+    return snapshot
+
+
+def _apply_delta(snapshot: IndexSnapshot, header, arrays, users) -> IndexSnapshot:
+    """The next epoch of snapshot with a delta segment applied (snapshot is not modified)."""
+    ontology = snapshot.ontology
+    user_skills = dict(ontology._user_skills)
+    for uid, uris in header["user_skills"].items():
+        user_skills[uid] = frozenset(URIRef(s) for s in uris)
+    ontology = OntologySnapshot(ontology._parents, user_skills, ontology.levels, ontology.edge_weights)
+    applied = snapshot.next_epoch(users, ontology, snapshot.epoch)
+    # Copied out, so the delta's mapping can go
+    applied.overlay.update(zip(header["vector_ids"], np.array(arrays["vectors"])))
+    return applied
+
+
+def read_segment(name: str) -> IndexSnapshot:
+    """Map a full segment written by write_segment()."""
+    return _snapshot_from(*_read_segment(name))
+
+
+class SharedIndexCoordinator:
+    """
+    Shares one index between several uvicorn worker processes.
+
+    Exactly one worker (whoever holds an flock on the owner lock file) owns
+    writes. Every worker appends ingests and admin operations to a shared
+    journal; the owner applies them to its IndexHandle and exports each new
+    epoch into a fresh shared memory segment. A small control segment holds
+    the current generation: workers poll it and catch up when it changes.
+    If the owner dies, another worker takes the lock and resumes from the
+    last exported generation.
+
+    Most generations are deltas: only the users changed since the previous
+    generation, which workers apply incrementally (IndexHandle.advance), so
+    their listeners see which users changed. Every CHECKPOINT_EVERY
+    generations, and after the base is replaced, the owner exports a full
+    checkpoint instead; workers that fall behind the retained deltas restart
+    from it. A checkpoint that adds nothing to the previous generation is
+    remapped on the background thread rather than in a request.
+    """
+
+    def __init__(self, prefix: str, handle: IndexHandle, state_dir: Optional[str] = None,
+                 poll_interval: float = 0.05, run_id: Optional[str] = None):
+        self.prefix = prefix
+        self.handle = handle
+        self.state_dir = state_dir or os.path.join(tempfile.gettempdir(), prefix)
+        # Workers of one server run share it; state left by another run is
+        # discarded rather than adopted. The launcher sets it; plain
+        # `uvicorn --workers` workers share their parent's pid.
+        self.run_id = run_id or os.getenv("CLUSTAURA_SHARED_INDEX_RUN") or f"ppid-{os.getppid()}"
+        self.poll_interval = poll_interval
+        # Non-ingest journal ops (e.g. "load", "rebuild"), executed by the owner
+        self.handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+
+        os.makedirs(self.state_dir, exist_ok=True)
+        self.journal_path = os.path.join(self.state_dir, "journal.jsonl")
+        self.lock_path = os.path.join(self.state_dir, "owner.lock")
+
+        self.owner = False
+        self._lock_fd = None
+        self._control = None
+        self._journal_offset = 0
+        self._mapped_generation = 0
+        self._remap_lock = threading.Lock()
+        # Owner: users changed since the last export (None: export a full checkpoint)
+        self._changed: Optional[Set[str]] = None
+        self._changes_lock = threading.Lock()
+        # Owner: generations before this one have been unlinked
+        self._pruned = 1
+        # Worker: a checkpoint with no new content, not yet remapped
+        self._checkpoint_due: Optional[int] = None
+        # Journal position visible to this worker's readers
+        self.visible_position = 0
+        self._progress = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        handle.listeners.append(self._on_publish)
+
+    def _segment_name(self, generation: int) -> str:
+        return f"{self.prefix}_g{generation}"
+
+    # --- control segment ---
+
+    def _read_control(self):
+        while True:
+            seq1 = struct.unpack_from("<q", self._control.buf, 0)[0]
+            if seq1 % 2 == 0:
+                seq, generation, applied, base, checkpoint, name = CONTROL.unpack_from(self._control.buf, 0)
+                if seq == seq1:
+                    return generation, applied, base, checkpoint, name.rstrip(b"\0").decode()
+            time.sleep(0)
+
+    def _write_control(self, generation: int, applied: int, base: int, checkpoint: int, name: str):
+        seq = struct.unpack_from("<q", self._control.buf, 0)[0]
+        struct.pack_into("<q", self._control.buf, 0, seq + 1)
+        CONTROL.pack_into(self._control.buf, 0, seq + 1, generation, applied, base, checkpoint, name.encode())
+        struct.pack_into("<q", self._control.buf, 0, seq + 2)
+
+    # --- journal ---
+
+    def _append(self, record: Dict[str, Any]) -> int:
+        """Append one record; returns its absolute end position in the journal."""
+        line = (json.dumps(record) + "\n").encode()
+        with open(self.journal_path, "ab") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                base = self._read_control()[2]
+                f.write(line)
+                f.flush()
+                return base + f.tell()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_journal(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.journal_path):
+            return []
+        with open(self.journal_path, "rb") as f:
+            f.seek(self._journal_offset)
+            data = f.read()
+        complete = data[:data.rfind(b"\n") + 1]
+        self._journal_offset += len(complete)
+        return [json.loads(line) for line in complete.splitlines() if line.strip()]
+
+    def _compact_journal(self):
+        """Truncate the journal once everything in it has been applied and exported."""
+        with open(self.journal_path, "r+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                if f.seek(0, os.SEEK_END) == self._journal_offset:
+                    generation, _, base, checkpoint, name = self._read_control()
+                    base += self._journal_offset
+                    f.truncate(0)
+                    self._journal_offset = 0
+                    self._write_control(generation, base, base, checkpoint, name)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # --- lifecycle ---
+
+    def start(self):
+        try:
+            self._control = _Segment(f"{self.prefix}_ctl", create=True, size=CONTROL.size + RUN.size)
+        except FileExistsError:
+            self._control = _Segment(f"{self.prefix}_ctl")
+        with open(self.journal_path, "ab") as journal:
+            fcntl.flock(journal, fcntl.LOCK_EX)
+            try:
+                if len(self._control.buf) < CONTROL.size + RUN.size or self._read_run() != self.run_id:
+                    self._reset()
+            finally:
+                fcntl.flock(journal, fcntl.LOCK_UN)
+
+        self._try_become_owner()
+        if not self.owner:
+            self.refresh()
+        self._thread = threading.Thread(target=self._run, name="shared-index", daemon=True)
+        self._thread.start()
+
+    def _read_run(self) -> str:
+        return RUN.unpack_from(self._control.buf, CONTROL.size)[0].rstrip(b"\0").decode()
+
+    def _reset(self):
+        """
+        Discard shared state left by an earlier run (caller holds the journal
+        lock): its exports would otherwise be adopted over the index this run
+        just loaded.
+        """
+        stale = self._read_run() if len(self._control.buf) >= CONTROL.size + RUN.size else "unknown"
+        if len(self._control.buf) < CONTROL.size + RUN.size:
+            # A control segment from before run IDs: replace it
+            self._control.close()
+            _unlink(f"{self.prefix}_ctl")
+            self._control = _Segment(f"{self.prefix}_ctl", create=True, size=CONTROL.size + RUN.size)
+        _unlink_segments(self.prefix, keep=f"{self.prefix}_ctl")
+        with open(self.journal_path, "r+b") as journal:
+            journal.truncate(0)
+        self._write_control(0, 0, 0, 0, "")
+        RUN.pack_into(self._control.buf, CONTROL.size, self.run_id.encode())
+        if stale:
+            log.warning("shared_index.stale_state_discarded", extra={"fields": {"prefix": self.prefix, "run": stale}})
+
+    def stop(self):
+        self._stopping = True
+        if self._thread:
+            self._thread.join(timeout=1.0)
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+            self.owner = False
+
+    def _try_become_owner(self):
+        fd = os.open(self.lock_path, os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return
+        self._lock_fd = fd
+        with self._remap_lock:
+            # Bring the mapped index up to the last export before writing on top of it
+            if self._read_control()[0] > 0:
+                self._catch_up(background=True)
+            self.owner = True
+            self._checkpoint_due = None
+            generation, applied, base, _, _ = self._read_control()
+            if generation > 0:
+                # Take over from a previous owner: rebuild a writable index from what is mapped.
+                # Ingests it had not exported yet are still in the journal past
+                # `applied`, and are replayed from there below.
+                current = self.handle.current
+                ontology = OntologyManager()
+                for user in current.users.values():
+                    ontology.add_user(as_user_dict(user))
+                user_ids = [uid for uid in current.user_ids if uid not in current.stale]
+                rows = [current.row_of[uid] for uid in user_ids]
+                snapshot = IndexSnapshot(current.version, ontology, dict(current.users), user_ids,
+                                         current.embeddings[rows] if rows else None)
+                snapshot.overlay.update(current.overlay)
+                self.handle.swap(snapshot, carry_over=False, changed=[])
+            # The first export has the same content as the last generation
+            with self._changes_lock:
+                self._changed = set()
+            self._journal_offset = applied - base
+        log.info("shared_index.owner", extra={"fields": {"pid": os.getpid(), "generation": generation}})
+        self._export(full=True)
+
+    def _run(self):
+        while not self._stopping:
+            try:
+                if self.owner:
+                    self._owner_step()
+                else:
+                    self._try_become_owner()
+                    if not self.owner:
+                        self.refresh()
+                        self._remap_checkpoint()
+            except Exception:
+                log.exception("shared_index.failed", extra={"fields": {"pid": os.getpid(), "owner": self.owner}})
+            time.sleep(self.poll_interval)
+
+    # --- owner ---
+
+    def _on_publish(self, changed: Optional[List[str]]):
+        """IndexHandle listener: record what the next export must carry (owner only)."""
+        if not self.owner:
+            return
+        with self._changes_lock:
+            if changed is None:
+                self._changed = None
+            elif self._changed is not None:
+                self._changed.update(changed)
+
+    def _owner_step(self):
+        records = self._read_journal()
+        batch = []
+        for record in records:
+            if record["op"] == "ingest":
+                batch.append(record["user"])
+                continue
+            if batch:
+                self.handle.write_many(batch)
+                batch = []
+            handler = self.handlers.get(record["op"])
+            if handler is None:
+                log.warning("shared_index.unknown_op", extra={"fields": {"op": record["op"]}})
+            else:
+                handler(record)
+        if batch:
+            self.handle.write_many(batch)
+
+        with self._changes_lock:
+            changed = self._changed
+        generation, _, _, checkpoint, _ = self._read_control()
+        if records or changed is None or changed:
+            self._export()
+        elif generation - checkpoint >= CHECKPOINT_EVERY:
+            # Only once idle, so the checkpoint adds nothing and workers can
+            # remap it in the background
+            self._export(full=True)
+
+    def _export(self, full: bool = False):
+        generation, applied, base, checkpoint, _ = self._read_control()
+        generation += 1
+        name = self._segment_name(generation)
+        # Take the changes before reading current: a change installed after
+        # this point is either in current (and exported again next time) or not
+        with self._changes_lock:
+            changed, self._changed = self._changed, set()
+        snapshot = self.handle.current
+        if changed is None or full:
+            write_segment(name, snapshot, sorted(changed) if changed is not None else None)
+            previous, checkpoint = checkpoint, generation
+        else:
+            write_delta(name, snapshot, sorted(changed))
+            previous = None
+        position = base + self._journal_offset
+        self._write_control(generation, position, base, checkpoint, name)
+        self._mapped_generation = generation
+        if previous:
+            # Keep the previous checkpoint and the deltas after it for workers
+            # that are still catching up from it
+            for old in range(self._pruned, previous):
+                _unlink(self._segment_name(old))
+            self._pruned = max(self._pruned, previous)
+        self._compact_journal()
+        self._set_visible(position)
+
+    # --- workers ---
+
+    def refresh(self):
+        """
+        Catch up with the owner's exports. Cheap when nothing changed (one
+        read of the control block) and incremental otherwise, so request
+        handlers call it too: a write acknowledged by any worker is then
+        visible on every worker.
+        """
+        if self.owner or self._read_control()[0] == self._mapped_generation:
+            return
+        with self._remap_lock:
+            if not self.owner:
+                self._catch_up()
+
+    def _catch_up(self, background: bool = False):
+        """
+        Apply every generation after the mapped one (caller holds _remap_lock).
+        With background=False, checkpoints that add nothing are left to
+        _remap_checkpoint().
+        """
+        for _ in range(3):
+            generation, applied, _, checkpoint, _ = self._read_control()
+            try:
+                while self._mapped_generation < generation:
+                    target = self._mapped_generation + 1
+                    try:
+                        if not self._mapped_generation:
+                            raise FileNotFoundError(target)
+                        shm, header, arrays, users = _read_segment(self._segment_name(target))
+                    except FileNotFoundError:
+                        if checkpoint <= self._mapped_generation:
+                            raise
+                        # Nothing mapped yet, or behind the retained deltas
+                        self._map_checkpoint(checkpoint)
+                        continue
+                    if header["kind"] == "delta":
+                        self.handle.advance(_apply_delta(self.handle.current, header, arrays, users),
+                                            header["changed"])
+                    elif header["changed"] == [] and not background:
+                        # Same content as the generation before
+                        self._checkpoint_due = target
+                    else:
+                        self.handle.swap(_snapshot_from(shm, header, arrays, users), carry_over=False,
+                                         changed=header["changed"])
+                        self._checkpoint_due = None
+                    self._mapped_generation = target
+            except FileNotFoundError:
+                # The checkpoint was superseded meanwhile; read the control block again
+                continue
+            self._set_visible(applied)
+            return
+
+    def _map_checkpoint(self, checkpoint: int):
+        snapshot = read_segment(self._segment_name(checkpoint))
+        self.handle.swap(snapshot, carry_over=False, changed=None)
+        self._mapped_generation = checkpoint
+        self._checkpoint_due = None
+
+    def _remap_checkpoint(self):
+        """
+        Move onto a checkpoint skipped by _catch_up(): map it and replay the
+        deltas after it, off the request path, then install it in place of the
+        equivalent delta-built snapshot. Folds the deltas' vectors back into
+        one shared matrix.
+        """
+        due = self._checkpoint_due
+        if due is None:
+            return
+        try:
+            snapshot = read_segment(self._segment_name(due))
+        except FileNotFoundError:
+            return
+        with self._remap_lock:
+            if self._checkpoint_due != due:
+                return
+            try:
+                for generation in range(due + 1, self._mapped_generation + 1):
+                    _, header, arrays, users = _read_segment(self._segment_name(generation))
+                    if header["kind"] != "delta":
+                        return
+                    snapshot = _apply_delta(snapshot, header, arrays, users)
+            except FileNotFoundError:
+                return
+            # Keep the vectors this worker embedded on the fly
+            current = self.handle.current
+            snapshot.overlay.update({uid: vec for uid, vec in current.overlay.items()
+                                     if snapshot.vector_for(uid) is None})
+            self.handle.swap(snapshot, carry_over=False, changed=[])
+            self._checkpoint_due = None
+
+    def _set_visible(self, position: int):
+        with self._progress:
+            self.visible_position = max(self.visible_position, position)
+            self._progress.notify_all()
+
+    # --- client API ---
+
+    def submit(self, op: str, payload: Dict[str, Any], timeout: Optional[float] = None) -> bool:
+        """
+        Journal an operation for the owner and wait until this worker serves
+        an index that includes it. Returns False on timeout (still queued).
+        """
+        end = self._append(dict(payload, op=op))
+        with self._progress:
+            return self._progress.wait_for(lambda: self.visible_position >= end, timeout)
+
+    def status(self) -> Dict[str, Any]:
+        generation, applied, base, checkpoint, name = self._read_control()
+        return {
+            "owner": self.owner,
+            "pid": os.getpid(),
+            "generation": generation,
+            "mapped_generation": self._mapped_generation,
+            "checkpoint": checkpoint,
+            "segment": name,
+        }
+
+
+def _unlink_segments(prefix: str, keep: Optional[str] = None) -> int:
+    removed = 0
+    if os.path.isdir("/dev/shm"):
+        for entry in os.listdir("/dev/shm"):
+            if entry.startswith(f"{prefix}_") and entry != keep:
+                _unlink(entry)
+                removed += 1
+    elif keep != f"{prefix}_ctl":
+        _unlink(f"{prefix}_ctl")
+    return removed
+
+
+def cleanup(prefix: str, state_dir: Optional[str] = None):
+    """Remove every segment, the journal and the owner lock of prefix (after all workers have stopped)."""
+    removed = _unlink_segments(prefix)
+    state_dir = state_dir or os.path.join(tempfile.gettempdir(), prefix)
+    for name in ("journal.jsonl", "owner.lock"):
+        try:
+            os.unlink(os.path.join(state_dir, name))
+        except FileNotFoundError:
+            pass
+    print(f"Removed {removed} shared memory segments for {prefix}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "cleanup":
+        print("Usage: python shared_index.py cleanup <prefix>")
+        sys.exit(1)
+    cleanup(sys.argv[2])
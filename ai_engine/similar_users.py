@@ -0,0 +1,512 @@
+"""
+"People like you": the users closest to a given user.
+
+Similarity blends the embedding cosine (a dot product, since rows are
+L2-normalised) with the overlap of the two users' skill sets in the ontology
+(Jaccard over each user's covered skills, i.e. declared skills plus their
+ancestors):
+
+    similarity = W_SEMANTIC * cosine + W_SKILLS * skill_overlap
+
+Candidates come from two pools: the best users by cosine from the stored
+user matrix (an exact scan for small indexes, and above EXACT_BELOW users an
+inverted-file (IVF) index of spherical k-means clusters, probing the NPROBE
+clusters nearest the query), and the best by skill overlap from per-skill
+posting lists. Users whose vector is not their row in the matrix (or IVF
+index) searched, because they were ingested since it was built, are scanned
+exactly from their fresh vectors instead.
+
+The server keeps one SimilarUsers per index epoch in a SimilarIndex, which
+follows the index from a background thread: each published epoch embeds
+the users it changed and patches the previous epoch's finder with them.
+The IVF index is built in the background once per index version (a loaded
+or rebuilt artifact); until it is ready queries use the exact scan.
+
+Bulk mode precomputes the lists for every user of an index artifact:
+    python similar_users.py --index indexes/nightly.joblib --out similar.jsonl --k 20
+"""
+import copy
+import json
+import time
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from index_store import IndexHandle, IndexSnapshot, get_field, user_text
+from ontology import SkillClosure
+
+log = logging.getLogger("clustaura.similar_users")
+
+W_SEMANTIC = 0.6
+W_SKILLS = 0.4
+POOL_FACTOR = 4
+MIN_POOL = 50
+EXACT_BELOW = 20_000
+NPROBE = 16
+KMEANS_ITERATIONS = 10
+# Users changed since the skill posting lists were built before they are rebuilt
+SKILLS_REBUILD_AFTER = 1000
+# How long a request for a just-ingested user waits for the finder to catch up
+CATCH_UP_TIMEOUT = 2.0
+
+
+def _kmeans(vectors: np.ndarray, n_lists: int, rng: np.random.Generator) -> np.ndarray:
+    """Spherical k-means on a sample of the rows; returns unit-length centroids."""
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), n_lists * 64), replace=False)]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].astype(np.float32)
+    for _ in range(KMEANS_ITERATIONS):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        norms = np.linalg.norm(sums, axis=1)
+        # Empty clusters keep their previous centroid
+        filled = norms > 0
+        centroids[filled] = sums[filled] / norms[filled, None]
+    return centroids
+
+
+class UserANN:
+    """IVF index over the vectors of one index version (rows must be L2-normalised)."""
+
+    def __init__(self, user_ids: List[str], embeddings: np.ndarray, version: str, seed: int = 0):
+        started = time.perf_counter()
+        self.user_ids = user_ids
+        self.row_of = {uid: row for row, uid in enumerate(user_ids)}
+        self.embeddings = embeddings
+        self.version = version
+        n_lists = max(1, int(np.sqrt(len(embeddings))))
+        self.centroids = _kmeans(embeddings, n_lists, np.random.default_rng(seed))
+        assign = np.concatenate([
+            np.argmax(embeddings[start:start + 8192] @ self.centroids.T, axis=1)
+            for start in range(0, len(embeddings), 8192)
+        ])
+        # Row ids grouped by list: list c is order[offsets[c]:offsets[c + 1]]
+        self.order = np.argsort(assign, kind="stable")
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))])
+        self.build_seconds = time.perf_counter() - started
+
+    @classmethod
+    def from_index(cls, index: IndexSnapshot) -> "UserANN":
+        """Index every embedded user of a snapshot: its matrix rows and overlay vectors."""
+        user_ids = [uid for uid in index.user_ids if uid not in index.stale and uid not in index.overlay]
+        rows = [index.embeddings[index.row_of[uid]] for uid in user_ids]
+        overlay = dict(index.overlay)
+        user_ids += list(overlay.keys())
+        rows += list(overlay.values())
+        ann = cls(user_ids, np.stack(rows).astype(np.float32), index.version)
+        log.info("similar_users.ann_built", extra={"fields": {
+            "version": index.version, "rows": len(user_ids), "lists": len(ann.centroids),
+            "seconds": round(ann.build_seconds, 3)}})
+        return ann
+
+    def search(self, query: np.ndarray, n: int, nprobe: int = NPROBE) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, cosines) of up to n approximate nearest rows, best first."""
+        nprobe = min(nprobe, len(self.centroids))
+        probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probes])
+        return _top(rows, self.embeddings[rows] @ query, n)
+
+
+def _top(rows: np.ndarray, scores: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    if len(rows) > n:
+        keep = np.argpartition(-scores, n - 1)[:n]
+        rows, scores = rows[keep], scores[keep]
+    order = np.argsort(-scores, kind="stable")
+    return rows[order], scores[order]
+
+
+def embed_missing(index: IndexSnapshot, nlp_engine, user_ids: List[str]):
+    """Embed the given users that have no vector yet into the snapshot's overlay."""
+    missing = [uid for uid in user_ids if uid in index.users and index.vector_for(uid) is None]
+    if missing and nlp_engine is not None:
+        vectors = nlp_engine.embed_batch([user_text(index.users[uid]) for uid in missing])
+        for uid, vec in zip(missing, vectors):
+            index.overlay[uid] = vec
+
+
+class SkillSets:
+    """
+    Covered-skill sets of every user in one frozen ontology, as posting
+    lists, so one user's overlap with everyone is a bincount over the
+    posting lists of the skills they cover.
+
+    advance() carries the posting lists to later epochs: users changed since
+    they were built are masked out of them and scored one by one instead.
+    """
+
+    def __init__(self, ontology):
+        self.closure = SkillClosure(ontology)
+        self.user_ids, holders = self.closure.holders()
+        self.position = {uid: i for i, uid in enumerate(self.user_ids)}
+        self.holders = {uri: np.asarray(positions, dtype=np.int64) for uri, positions in holders.items()}
+        # Size of each user's covered set
+        self.sizes = np.bincount(np.concatenate(list(self.holders.values())), minlength=len(self.user_ids)) \
+            if self.holders else np.zeros(len(self.user_ids), dtype=np.int64)
+        self.changed: FrozenSet[str] = frozenset()
+        self._masked = np.zeros(0, dtype=np.int64)
+
+    def advance(self, ontology, changed: List[str]) -> "SkillSets":
+        """These posting lists on a later epoch whose users differ only in `changed`.
+        Ingest never changes the taxonomy, so unchanged users' covered sets still hold."""
+        sets = copy.copy(self)
+        sets.closure = SkillClosure(ontology)
+        sets.changed = self.changed.union(changed)
+        sets._masked = np.asarray([self.position[uid] for uid in sets.changed if uid in self.position],
+                                  dtype=np.int64)
+        return sets
+
+    def overlaps(self, user_id: str) -> np.ndarray:
+        """Jaccard overlap of user_id's covered skills with every unchanged user's, by position."""
+        covered = self.closure.covered(user_id)
+        lists = [self.holders[uri] for uri in covered if uri in self.holders]
+        if not lists:
+            return np.zeros(len(self.user_ids))
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.user_ids))
+        overlaps = shared / (len(covered) + self.sizes - shared)
+        overlaps[self._masked] = 0.0
+        return overlaps
+
+    def overlap(self, user_a: str, user_b: str) -> float:
+        a, b = self.closure.covered(user_a), self.closure.covered(user_b)
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+
+def _base_row(index: IndexSnapshot, ann: Optional[UserANN], user_id: str) -> Optional[np.ndarray]:
+    """user_id's row in what _by_cosine searches: the IVF index if given, else the snapshot's matrix."""
+    if ann is not None:
+        row = ann.row_of.get(user_id)
+        return None if row is None else ann.embeddings[row]
+    if user_id in index.stale or user_id not in index.row_of:
+        return None
+    return index.embeddings[index.row_of[user_id]]
+
+
+def _classify(index: IndexSnapshot, ann: Optional[UserANN], user_id: str,
+              extra: Dict[str, np.ndarray], unembedded: Set[str]):
+    """Record user_id in extra if its vector is not its searched row, or in unembedded if it has none."""
+    vec = index.vector_for(user_id)
+    row = _base_row(index, ann, user_id)
+    if vec is None:
+        if row is not None:
+            unembedded.add(user_id)
+    elif row is None or not np.array_equal(row, vec):
+        extra[user_id] = vec
+
+
+class SimilarUsers:
+    """
+    Similar-user queries on one index epoch.
+
+    Each query takes a pool of the best users by cosine and a pool of the
+    best by skill overlap and scores their union with the blend. Nobody
+    outside both pools can score above W_SEMANTIC * (lowest cosine in the
+    pool) + W_SKILLS * (lowest overlap in the pool); with the exact scan the
+    pools grow until the k-th result reaches that bound, so results are
+    exact. With the IVF index the cosine pool is approximate.
+
+    Users without a vector are not embedded here (see embed_missing); they
+    are reached through the skill pool only.
+    """
+
+    def __init__(self, index: IndexSnapshot, nlp_engine=None, skills: Optional[SkillSets] = None,
+                 ann: Optional[UserANN] = None, extra: Optional[Dict[str, np.ndarray]] = None,
+                 unembedded: Optional[Set[str]] = None):
+        self.index = index
+        self.nlp_engine = nlp_engine
+        self.skills = skills if skills is not None else SkillSets(index.ontology)
+        self._ann = ann
+        # Users whose vector is not their row in the matrix (or IVF index)
+        # searched, scanned exactly; and users whose row is outdated but who
+        # have no vector yet
+        if extra is None:
+            extra, unembedded = self._find_extra()
+        self.extra = extra
+        self.unembedded = unembedded if unembedded is not None else set()
+        self._extra_ids = list(extra)
+        self._extra = np.stack([extra[uid] for uid in self._extra_ids]) if self._extra_ids else None
+
+    def _find_extra(self) -> Tuple[Dict[str, np.ndarray], Set[str]]:
+        index = self.index
+        if self._ann is None:
+            overlay = dict(index.overlay)
+            extra = {uid: vec for uid, vec in overlay.items() if uid in index.users}
+            return extra, {uid for uid in index.stale if uid not in overlay}
+        extra, unembedded = {}, set()
+        for uid in index.users:
+            _classify(index, self._ann, uid, extra, unembedded)
+        return extra, unembedded
+
+    def advance(self, index: IndexSnapshot, changed: List[str], skills: Optional[SkillSets] = None) -> "SimilarUsers":
+        """This finder on a later epoch that differs from this one's in the `changed` users only."""
+        skills = skills if skills is not None else self.skills.advance(index.ontology, changed)
+        if self._ann is None and index.embeddings is not self.index.embeddings:
+            # A new matrix (a shared index checkpoint): rows have moved
+            return SimilarUsers(index, self.nlp_engine, skills)
+        extra, unembedded = dict(self.extra), set(self.unembedded)
+        for uid in changed:
+            extra.pop(uid, None)
+            unembedded.discard(uid)
+            if uid in index.users:
+                _classify(index, self._ann, uid, extra, unembedded)
+        return SimilarUsers(index, self.nlp_engine, skills, self._ann, extra, unembedded)
+
+    def vector(self, user_id: str) -> np.ndarray:
+        vector = self.index.vector_for(user_id)
+        if vector is None:
+            vector = self.nlp_engine.embed_batch([user_text(self.index.users[user_id])])[0]
+            self.index.overlay[user_id] = vector
+        return vector
+
+    def _by_cosine(self, query: np.ndarray, n: int) -> Tuple[Dict[str, float], float]:
+        """The best n users by cosine, and the best cosine anyone else can have."""
+        index = self.index
+        found: Dict[str, float] = {}
+        floor = -1.0
+        if self._ann is not None:
+            user_ids = self._ann.user_ids
+            rows, scores = self._ann.search(query, n)
+        else:
+            user_ids = index.user_ids
+            rows, scores = _top(np.arange(len(user_ids)), index.embeddings @ query, n) if len(user_ids) \
+                else (np.zeros(0, dtype=np.int64), np.zeros(0))
+        if len(rows) == n:
+            floor = float(scores[-1])
+        for row, score in zip(rows, scores):
+            uid = user_ids[row]
+            if uid not in self.extra and uid not in self.unembedded and uid in index.users:
+                found[uid] = float(score)
+        if self._extra is not None:
+            rows, scores = _top(np.arange(len(self._extra_ids)), self._extra @ query, n)
+            if len(rows) == n:
+                floor = max(floor, float(scores[-1]))
+            for row, score in zip(rows, scores):
+                found[self._extra_ids[row]] = float(score)
+        return found, floor
+
+    def _by_skills(self, user_id: str, n: int) -> Tuple[Dict[str, float], float]:
+        """The best n users by skill overlap, and the best overlap anyone else can have."""
+        overlaps = self.skills.overlaps(user_id)
+        rows, scores = _top(np.flatnonzero(overlaps), overlaps[overlaps > 0], n)
+        found = {self.skills.user_ids[row]: float(score) for row, score in zip(rows, scores)}
+        # Users changed since the posting lists were built are masked out of them
+        for uid in self.skills.changed:
+            if uid in self.index.users:
+                overlap = self.skills.overlap(user_id, uid)
+                if overlap > 0:
+                    found[uid] = overlap
+        return found, float(scores[-1]) if len(rows) == n else 0.0
+
+    def similar(self, user_id: str, k: int) -> List[Dict[str, Any]]:
+        query = self.vector(user_id)
+        users = self.index.users
+        pool = max(MIN_POOL, POOL_FACTOR * k)
+        while True:
+            by_cosine, cosine_floor = self._by_cosine(query, pool + 1)
+            by_skills, skill_floor = self._by_skills(user_id, pool + 1)
+            scored = []
+            for uid in set(by_cosine) | set(by_skills):
+                if uid == user_id or uid not in users:
+                    continue
+                cosine = by_cosine[uid] if uid in by_cosine else float(self.vector(uid) @ query)
+                overlap = by_skills[uid] if uid in by_skills else self.skills.overlap(user_id, uid)
+                scored.append((W_SEMANTIC * cosine + W_SKILLS * overlap, uid, cosine, overlap))
+            scored.sort(key=lambda item: item[0], reverse=True)
+            bound = W_SEMANTIC * cosine_floor + W_SKILLS * skill_floor
+            exhausted = cosine_floor <= -1.0 and skill_floor <= 0.0
+            if self._ann is not None or exhausted or (len(scored) >= k and scored[k - 1][0] >= bound):
+                break
+            pool *= 4
+
+        own = set(s.lower() for s in get_field(users[user_id], 'skills', []))
+        results = []
+        for rank, (similarity, uid, cosine, overlap) in enumerate(scored[:k], start=1):
+            results.append({
+                "user_id": uid,
+                "rank": rank,
+                "similarity": round(similarity, 4),
+                "semantic_score": round(cosine, 4),
+                "skill_score": round(overlap, 4),
+                "shared_skills": sorted(own & set(s.lower() for s in get_field(users[uid], 'skills', []))),
+            })
+        return results
+
+    def similar_for_all(self, k: int, user_ids: Optional[List[str]] = None) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """Yield (user_id, similar users) for every user (bulk mode)."""
+        for user_id in user_ids if user_ids is not None else list(self.index.users):
+            yield user_id, self.similar(user_id, k)
+
+
+class SimilarIndex:
+    """
+    The SimilarUsers of an IndexHandle's latest epoch, kept up to date by a
+    background thread so requests never embed users or build posting lists.
+
+    Each published epoch embeds the users it changed into the snapshot's
+    overlay and advances the previous finder by those users; swapping in a
+    whole new index builds a new finder. The finder's snapshot stays pinned
+    while it is the latest, so requests can use it after the handle moves on.
+    """
+
+    def __init__(self, handle: IndexHandle, nlp_engine):
+        self.handle = handle
+        self.nlp_engine = nlp_engine
+        self._finder: Optional[SimilarUsers] = None
+        # Guards _finder, and is notified whenever it is replaced
+        self._updated = threading.Condition()
+        self._ann: Optional[UserANN] = None
+        self._ann_building: Optional[str] = None
+
+        self._changed: Set[str] = set()
+        self._swapped = True
+        self._ann_ready = False
+        self._wake = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        handle.listeners.append(self._on_publish)
+
+    @contextmanager
+    def acquire(self, user_id: Optional[str] = None, timeout: float = CATCH_UP_TIMEOUT) -> Iterator[Optional[SimilarUsers]]:
+        """
+        The latest finder, pinned for the duration (None before the first
+        one is built). With user_id, first wait up to timeout for a finder
+        that knows that user, e.g. one ingested a moment ago.
+        """
+        with self._updated:
+            self._updated.wait_for(lambda: self._finder is not None
+                                   and (user_id is None or user_id in self._finder.index.users), timeout)
+            finder = self._finder
+            if finder is not None:
+                self.handle.pin(finder.index)
+        try:
+            yield finder
+        finally:
+            if finder is not None:
+                self.handle.unpin(finder.index)
+
+    def _on_publish(self, changed: Optional[List[str]]):
+        """IndexHandle listener: called on the publisher thread, so it only records the change."""
+        with self._wake:
+            if changed is None:
+                self._swapped = True
+            else:
+                self._changed.update(changed)
+            self._wake.notify()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="similar-users", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        with self._wake:
+            self._stopping = True
+            self._wake.notify()
+        self._thread.join(timeout=5.0)
+        self._thread = None
+
+    def _run(self):
+        while True:
+            with self._wake:
+                self._wake.wait_for(lambda: self._changed or self._swapped or self._ann_ready or self._stopping)
+                if self._stopping:
+                    return
+                changed, self._changed = self._changed, set()
+                swapped, self._swapped = self._swapped, False
+                self._ann_ready = False
+            try:
+                with self.handle.acquire() as index:
+                    self._update(index, None if swapped else sorted(changed))
+            except Exception:
+                log.exception("similar_users.update_failed", extra={"fields": {"changed": len(changed),
+                                                                               "swapped": swapped}})
+
+    def _update(self, index: IndexSnapshot, changed: Optional[List[str]]):
+        previous = self._finder
+        embed_missing(index, self.nlp_engine, list(index.users) if changed is None or previous is None else changed)
+        ann = self._ann_for(index)
+        if changed is None or previous is None:
+            finder = SimilarUsers(index, self.nlp_engine, ann=ann)
+        else:
+            skills = previous.skills.advance(index.ontology, changed)
+            if len(skills.changed) > SKILLS_REBUILD_AFTER:
+                skills = SkillSets(index.ontology)
+            if ann is not previous._ann:
+                finder = SimilarUsers(index, self.nlp_engine, skills, ann)
+            else:
+                finder = previous.advance(index, changed, skills)
+        with self._updated:
+            self.handle.pin(index)
+            self._finder = finder
+            self._updated.notify_all()
+        if previous is not None:
+            self.handle.unpin(previous.index)
+
+    def _ann_for(self, index: IndexSnapshot) -> Optional[UserANN]:
+        """The IVF index to search on this epoch, starting a build for a new index version."""
+        if len(index.users) < EXACT_BELOW:
+            return None
+        if (self._ann is None or self._ann.version != index.version) and self._ann_building != index.version:
+            self._ann_building = index.version
+            # Built from this snapshot, pinned until the build is done
+            self.handle.pin(index)
+            threading.Thread(target=self._build_ann, args=(index,), name="user-ann", daemon=True).start()
+        # Until then the previous version's index, if any, still serves:
+        # users whose vector changed since are scanned exactly
+        return self._ann
+
+    def _build_ann(self, index: IndexSnapshot):
+        ann = None
+        try:
+            ann = UserANN.from_index(index)
+        except Exception:
+            log.exception("similar_users.ann_failed", extra={"fields": {"version": index.version}})
+        finally:
+            self.handle.unpin(index)
+        with self._wake:
+            if ann is not None:
+                self._ann = ann
+                self._ann_ready = True
+                self._wake.notify()
+            self._ann_building = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute similar-user lists for every user of an index")
+    parser.add_argument("--index", required=True, help="index artifact written by index_store.py / the server")
+    parser.add_argument("--out", required=True, help="JSONL output, one {user_id, similar} line per user")
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    snapshot = IndexSnapshot.load(args.index)
+    snapshot.ontology = snapshot.ontology.freeze()
+    nlp_engine = None
+    if len(snapshot.row_of) < len(snapshot.users):
+        from nlp_engine import NLPEngine
+        nlp_engine = NLPEngine()
+        embed_missing(snapshot, nlp_engine, list(snapshot.users))
+    ann = UserANN.from_index(snapshot) if len(snapshot.users) >= EXACT_BELOW else None
+    finder = SimilarUsers(snapshot, nlp_engine, ann=ann)
+
+    done = 0
+    with open(args.out, "w") as out:
+        for user_id, similar in finder.similar_for_all(args.k):
+            out.write(json.dumps({"user_id": user_id, "similar": similar, "index_version": snapshot.version}) + "\n")
+            done += 1
+            if done % 10_000 == 0:
+                print(f"{done}/{len(snapshot.users)} users")
+    print(f"Wrote {done} users to {args.out} in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Standing queries: open problems whose top-K expert lists are kept up to date
+as users are ingested, so reading them is a dictionary lookup.
+
+A problem is ranked in full once when it is registered. Each stored list
+keeps the top K + LIST_SLACK candidates. After that, every published index
+epoch hands the users it changed to a background thread. That thread embeds
+those users once, scores them against every registered problem with one
+(problems x dim) @ (dim x users) product, and patches each list:
+  - a changed user's old entry is removed and re-inserted with its new
+    score if it still qualifies
+  - the list stays an exact prefix of the full ranking as long as it has at
+    least K entries; when it drops below K it is re-ranked in full
+Swapping in a whole new index re-ranks every list.
+
+When a user enters a problem's top K, an event is appended to a bounded log
+(events(since)), which callers can poll to push "new expert matches your
+challenge" notifications.
+
+The registered problems are also indexed in a ProblemIndex, for the reverse
+query (open problems for a user, /recommend/problems/{user_id}).
+
+Registrations live in this process only and are not persisted; callers
+re-register open problems after a restart. The server refuses the
+/problems/open endpoints and /recommend/problems/{user_id} when it runs
+several workers or a shared index, where a registration would only be seen
+by the worker that took it.
+"""
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+import numpy as np
+
+import lexical_index
+from index_store import IndexHandle, IndexSnapshot, get_field, user_text
+from ontology import SkillClosure
+from problem_index import ProblemIndex
+
+log = logging.getLogger("clustaura.standing_queries")
+
+LIST_SLACK = 20
+MAX_EVENTS = 10000
+
+
+class StandingQuery:
+    def __init__(self, problem, top_k: int):
+        self.problem = problem
+        self.top_k = top_k
+        self.vector: Optional[np.ndarray] = None
+        # user_id -> ranker result, at most top_k + LIST_SLACK of them
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        # True when candidates beyond the stored ones exist
+        self.truncated = False
+        self.dirty = True
+        self.epoch = -1
+        self.updated_at = 0.0
+
+    def ranked(self) -> List[Dict[str, Any]]:
+        ordered = sorted(self.entries.values(), key=lambda r: r["match_score"], reverse=True)
+        return [{**r, "rank": i + 1} for i, r in enumerate(ordered)]
+
+    def top(self) -> List[Dict[str, Any]]:
+        return self.ranked()[:self.top_k]
+
+    def store(self, ranked: List[Dict[str, Any]]):
+        keep = self.top_k + LIST_SLACK
+        self.entries = {r["user_id"]: r for r in ranked[:keep]}
+        self.truncated = len(ranked) > keep
+        self.dirty = False
+
+    def patch(self, user_id: str, result: Optional[Dict[str, Any]]) -> bool:
+        """
+        Apply one changed user (result None = no longer a candidate).
+        Returns True if the user newly entered the top K.
+        """
+        was_top = user_id in {r["user_id"] for r in self.top()}
+        self.entries.pop(user_id, None)
+        if result is not None:
+            floor = min((r["match_score"] for r in self.entries.values()), default=None)
+            if not self.truncated or floor is None or result["match_score"] >= floor:
+                self.entries[user_id] = result
+                keep = self.top_k + LIST_SLACK
+                if len(self.entries) > keep:
+                    weakest = min(self.entries.values(), key=lambda r: r["match_score"])
+                    del self.entries[weakest["user_id"]]
+                    self.truncated = True
+        if self.truncated and len(self.entries) < self.top_k:
+            # Someone outside the stored slack may now belong in the top K
+            self.dirty = True
+        return not was_top and user_id in {r["user_id"] for r in self.top()}
+
+
+class StandingQueries:
+    def __init__(self, handle: IndexHandle, nlp_engine, ranker,
+                 rank_all: Callable[[IndexSnapshot, Any], List[Dict[str, Any]]], lexical=None):
+        self.handle = handle
+        self.nlp_engine = nlp_engine
+        self.ranker = ranker
+        # The full /recommend pipeline, for registration and re-ranking
+        self.rank_all = rank_all
+        # LexicalIndex, for the ranker's BM25 feature when it is weighted
+        self.lexical = lexical
+        self.queries: Dict[str, StandingQuery] = {}
+        self.problems = ProblemIndex()
+        self._lock = threading.Lock()
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=MAX_EVENTS)
+        self._event_seq = 0
+
+        self._changed: Set[str] = set()
+        self._swapped = False
+        self._wake = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        handle.listeners.append(self._on_publish)
+
+    # --- registration and reads ---
+
+    def register(self, problem, top_k: int) -> StandingQuery:
+        query = StandingQuery(problem, top_k)
+        query.vector = self.nlp_engine.embed_batch([f"{problem.title} {problem.description}"])[0]
+        # Registered (dirty) before it is ranked: an epoch published while it
+        # ranks leaves it dirty, so get() re-ranks it instead of losing the change
+        with self._lock:
+            self.queries[problem.problem_id] = query
+        with self.handle.acquire() as index:
+            self._rerank(index, query)
+            self.problems.add(problem, query.vector, index.ontology._skill_uri)
+        return query
+
+    def unregister(self, problem_id: str) -> bool:
+        self.problems.remove(problem_id)
+        with self._lock:
+            return self.queries.pop(problem_id, None) is not None
+
+    def get(self, problem_id: str) -> Optional[StandingQuery]:
+        with self._lock:
+            query = self.queries.get(problem_id)
+        if query is not None and query.dirty:
+            with self.handle.acquire() as index:
+                self._rerank(index, query)
+        return query
+
+    def events(self, since: int = 0) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [event for event in self._events if event["seq"] > since]
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queries": len(self.queries),
+                "dirty": sum(q.dirty for q in self.queries.values()),
+                "last_event_seq": self._event_seq,
+            }
+
+    # --- maintenance ---
+
+    def _rerank(self, index: IndexSnapshot, query: StandingQuery):
+        ranked = self.rank_all(index, query.problem)
+        with self._lock:
+            query.store(ranked)
+            query.epoch = index.epoch
+            query.updated_at = time.time()
+            if self.handle.epoch > index.epoch:
+                # apply() skipped it for an epoch published while it was ranked
+                query.dirty = True
+
+    def _on_publish(self, changed: Optional[List[str]]):
+        """IndexHandle listener: called on the publisher thread, so it only records the change."""
+        with self._wake:
+            if changed is None:
+                self._swapped = True
+            else:
+                self._changed.update(changed)
+            self._wake.notify()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="standing-queries", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        with self._wake:
+            self._stopping = True
+            self._wake.notify()
+        self._thread.join(timeout=5.0)
+        self._thread = None
+
+    def _run(self):
+        while True:
+            with self._wake:
+                self._wake.wait_for(lambda: self._changed or self._swapped or self._stopping)
+                if self._stopping:
+                    return
+                changed, self._changed = self._changed, set()
+                swapped, self._swapped = self._swapped, False
+            try:
+                with self.handle.acquire() as index:
+                    if swapped:
+                        self._rerank_all(index)
+                    elif changed:
+                        self.apply(index, sorted(changed))
+            except Exception:
+                log.exception("standing_queries.update_failed",
+                              extra={"fields": {"changed": len(changed), "swapped": swapped}})
+
+    def _rerank_all(self, index: IndexSnapshot):
+        with self._lock:
+            queries = list(self.queries.values())
+        for query in queries:
+            self._rerank(index, query)
+
+    def apply(self, index: IndexSnapshot, user_ids: List[str]):
+        """Score changed users against every registered problem and patch the lists."""
+        with self._lock:
+            queries = [q for q in self.queries.values() if q.vector is not None]
+        user_ids = [uid for uid in user_ids if uid in index.users]
+        if not queries or not user_ids:
+            return
+
+        missing = [uid for uid in user_ids if index.vector_for(uid) is None]
+        if missing:
+            vectors = self.nlp_engine.embed_batch([user_text(index.users[uid]) for uid in missing])
+            for uid, vec in zip(missing, vectors):
+                index.overlay[uid] = vec
+        # (problems x dim) @ (dim x users): every semantic score in one product
+        scores = np.stack([q.vector for q in queries]) @ np.stack([index.vector_for(uid) for uid in user_ids]).T
+
+        closure = SkillClosure(index.ontology)
+        now = time.time()
+        with self._lock:
+            for row, query in enumerate(queries):
+                if self.queries.get(query.problem.problem_id) is not query or query.dirty:
+                    # Unregistered meanwhile, or about to be re-ranked anyway
+                    continue
+                problem = query.problem
+                lexical_scores = None
+                if self.lexical is not None and self.ranker.w_lexical:
+                    lexical_scores = {uid: lexical_index.normalise(score) for uid, score in
+                                      self.lexical.scores(f"{problem.title} {problem.description}", user_ids).items()}
+                for column, uid in enumerate(user_ids):
+                    result = None
+                    if self._is_candidate(closure, problem, uid):
+                        onto_score = closure.calculate_user_similarity(
+                            get_field(index.users[uid], 'skills', []), problem.required_skills)
+                        result = self.ranker.rank(
+                            candidates=[uid], problem_data=problem, user_db=index.users,
+                            semantic_score_map={uid: float(scores[row, column])},
+                            ontology_score_map={uid: onto_score},
+                            lexical_score_map=lexical_scores,
+                        )[0]
+                    if query.patch(uid, result):
+                        self._event(problem.problem_id, uid, query, now)
+                query.epoch = index.epoch
+                query.updated_at = now
+
+    @staticmethod
+    def _is_candidate(closure: SkillClosure, problem, user_id: str) -> bool:
+        # Same candidate rules as /recommend, except lexical candidates
+        # (CLUSTAURA_LEXICAL_CANDIDATES), which only a full re-rank picks up
+        if problem.candidate_ids is not None:
+            return user_id in problem.candidate_ids
+        return closure.is_capable(user_id, problem.required_skills)
+
+    def _event(self, problem_id: str, user_id: str, query: StandingQuery, at: float):
+        top = query.top()
+        entry = next(r for r in top if r["user_id"] == user_id)
+        self._event_seq += 1
+        self._events.append({
+            "seq": self._event_seq, "type": "new_match", "problem_id": problem_id, "user_id": user_id,
+            "rank": entry["rank"], "match_score": entry["match_score"], "at": at,
+        })
@@ -0,0 +1,82 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+
+def process_start_time() -> float:
+    """
+    Wall-clock time the current process was started (Linux /proc), so the
+    timeline also covers the interpreter start-up and imports before ours.
+    Falls back to now on other platforms.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name may contain spaces; fields resume after its ')'
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+class StartupTimeline:
+    """
+    Records when each start-up phase (imports, component loads, warm-up)
+    ran relative to process start, and on which thread.
+    """
+    def __init__(self):
+        self.process_started_at = process_start_time()
+        self._lock = threading.Lock()
+        self.phases: List[Dict[str, Any]] = []
+        self.ready_at: Optional[float] = None
+
+    def record(self, name: str, started_at: float, finished_at: float):
+        with self._lock:
+            self.phases.append({
+                "name": name,
+                "start_s": round(started_at - self.process_started_at, 4),
+                "duration_s": round(finished_at - started_at, 4),
+                "thread": threading.current_thread().name,
+            })
+
+    @contextmanager
+    def phase(self, name: str):
+        started_at = time.time()
+        try:
+            yield
+        finally:
+            self.record(name, started_at, time.time())
+
+    def timed(self, name: str, fn: Callable, *args, **kwargs) -> Callable[[], Any]:
+        """Wrap fn(*args, **kwargs) so it records a phase when called (e.g. on a pool thread)."""
+        def run():
+            with self.phase(name):
+                return fn(*args, **kwargs)
+        return run
+
+    def mark_ready(self):
+        if self.ready_at is None:
+            self.ready_at = time.time()
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            phases = sorted(self.phases, key=lambda p: p["start_s"])
+        return {
+            "process_started_at": self.process_started_at,
+            "ready_s": round(self.ready_at - self.process_started_at, 4) if self.ready_at else None,
+            "phases": phases,
+        }
+
+    def summary(self) -> str:
+        timeline = self.as_dict()
+        parts = [f"{p['name']}={p['duration_s']:.2f}s" for p in timeline["phases"]]
+        ready = f"ready after {timeline['ready_s']:.2f}s" if timeline["ready_s"] is not None else "not ready"
+        return f"Startup {ready} ({', '.join(parts)})"
+
+
+# One timeline per process; server.py records into it from import onwards
+timeline = StartupTimeline()
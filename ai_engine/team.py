@@ -0,0 +1,210 @@
+"""
+Team formation: pick team_size users who together cover a set of required
+skills.
+
+A team S is scored as
+
+    F(S) = W_COVERAGE * mean over required skills r of max_{u in S} SF(u, r)
+         + W_SEMANTIC * sum over u in S of fit(u) / team_size
+
+where SF(u, r) is the ontology similarity of u's best matching skill to r
+(the per-skill term of calculate_user_similarity, so a one-person team's
+coverage is that person's /recommend ontology score) and fit(u) is the
+cosine of u's vector with the team's description, clipped at 0. The
+coverage term is a facility-location function and the fit term is modular,
+so F is monotone submodular and greedy selection is within (1 - 1/e) of the
+best team.
+
+Greedy uses lazy evaluation: marginal gains only shrink as the team grows,
+so a candidate's last computed gain is an upper bound. Each step
+re-evaluates only the LAZY_BLOCK candidates with the highest bounds, in one
+vector op against the current per-skill coverage, and takes the best of
+them once it beats every other bound (widening the block otherwise).
+Evaluating a block at a time matters because SF values are discrete and
+many candidates share the same bound.
+SF(u, r) for every user and requirement comes from TeamIndex: each distinct
+skill in the index is compared with r once, and users take the maximum over
+their skills with one np.maximum.reduceat.
+"""
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from index_store import IndexSnapshot, get_field, user_text
+from ontology import SkillClosure
+
+W_COVERAGE = 0.7
+W_SEMANTIC = 0.3
+# Candidates re-evaluated together (one vector op) per lazy greedy round
+LAZY_BLOCK = 64
+
+
+class TeamIndex:
+    """
+    Per-epoch user -> skill incidence, for building SF matrices. Built on the
+    first team request after each ingest epoch; the SF column of each
+    required skill is then computed once per epoch.
+    """
+
+    def __init__(self, index: IndexSnapshot):
+        self.closure = SkillClosure(index.ontology)
+        self.user_ids = list(index.users)
+        skill_of: Dict[str, int] = {}
+        self.skill_names: List[str] = []
+        skills, starts, owners = [], [], []
+        for position, uid in enumerate(self.user_ids):
+            names = get_field(index.users[uid], 'skills', [])
+            if not names:
+                continue
+            owners.append(position)
+            starts.append(len(skills))
+            for name in names:
+                # skill_similarity normalises names the same way
+                key = name.lower().replace(" ", "_")
+                if key not in skill_of:
+                    skill_of[key] = len(self.skill_names)
+                    self.skill_names.append(name)
+                skills.append(skill_of[key])
+        # Users with at least one skill, and where their run in `skills` starts
+        self.owners = np.asarray(owners, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.skills = np.asarray(skills, dtype=np.int64)
+        self.position_of = {uid: i for i, uid in enumerate(self.user_ids)}
+        self.rows = np.asarray([index.row_of.get(uid, -1) for uid in self.user_ids], dtype=np.int64)
+        # required skill -> SF against every distinct skill
+        self._columns: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def column(self, required_skill: str) -> np.ndarray:
+        column = self._columns.get(required_skill)
+        if column is None:
+            with self._lock:
+                column = np.fromiter((self.closure.skill_similarity(required_skill, name) for name in self.skill_names),
+                                     dtype=np.float64, count=len(self.skill_names))
+                self._columns[required_skill] = column
+        return column
+
+    def coverage_matrix(self, required_skills: List[str]) -> np.ndarray:
+        """SF(u, r) as a (users x required skills) matrix."""
+        matrix = np.zeros((len(self.user_ids), len(required_skills)))
+        if len(self.owners):
+            for j, skill in enumerate(required_skills):
+                matrix[self.owners, j] = np.maximum.reduceat(self.column(skill)[self.skills], self.starts)
+        return matrix
+
+
+_team_index: Optional[Tuple[Any, TeamIndex]] = None
+_team_index_lock = threading.Lock()
+
+
+def team_index_for(index: IndexSnapshot) -> TeamIndex:
+    """The TeamIndex of this epoch, built on first use."""
+    global _team_index
+    with _team_index_lock:
+        if _team_index is None or _team_index[0] is not index.users:
+            _team_index = (index.users, TeamIndex(index))
+        return _team_index[1]
+
+
+def semantic_fit(index: IndexSnapshot, team_index: TeamIndex, query: np.ndarray, nlp_engine) -> np.ndarray:
+    """Clipped cosine of every user (in TeamIndex order) with the query vector."""
+    fit = np.zeros(len(team_index.user_ids))
+    fresh = team_index.rows >= 0
+    if fresh.any():
+        # Score the whole matrix in place rather than gathering rows first
+        fit[fresh] = (index.embeddings @ query)[team_index.rows[fresh]]
+    # Users without a matrix row, or whose row is stale
+    others = set(np.flatnonzero(~fresh).tolist())
+    others.update(team_index.position_of[uid] for uid in index.stale | set(index.overlay)
+                  if uid in team_index.position_of)
+    others = sorted(others)
+    missing = [team_index.user_ids[i] for i in others if index.vector_for(team_index.user_ids[i]) is None]
+    if missing:
+        for uid, vec in zip(missing, nlp_engine.embed_batch([user_text(index.users[uid]) for uid in missing])):
+            index.overlay[uid] = vec
+    for i in others:
+        fit[i] = float(index.vector_for(team_index.user_ids[i]) @ query)
+    return np.maximum(fit, 0.0)
+
+
+def lazy_greedy(coverage: np.ndarray, fit: np.ndarray, team_size: int,
+                candidates: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+    """
+    Greedy maximisation of F with lazy gain updates.
+    Returns [(user position, marginal gain)] in the order picked.
+    """
+    n_required = coverage.shape[1]
+    scale = W_COVERAGE / n_required if n_required else 0.0
+    bounds = scale * coverage.sum(axis=1) + W_SEMANTIC * fit / team_size
+    if candidates is not None:
+        allowed = np.full(len(bounds), -np.inf)
+        allowed[candidates] = bounds[candidates]
+        bounds = allowed
+    available = len(bounds) if candidates is None else len(candidates)
+
+    covered = np.zeros(n_required)
+    team: List[Tuple[int, float]] = []
+    while len(team) < min(team_size, available):
+        block = LAZY_BLOCK
+        while True:
+            top = np.argpartition(-bounds, block - 1)[:block] if block < len(bounds) else np.arange(len(bounds))
+            top = top[np.isfinite(bounds[top])]
+            gains = scale * np.maximum(coverage[top] - covered, 0.0).sum(axis=1) + W_SEMANTIC * fit[top] / team_size
+            # Still upper bounds for later steps: gains only shrink
+            bounds[top] = gains
+            best = int(np.argmax(gains))
+            saved = bounds[top]
+            bounds[top] = -np.inf
+            rest = bounds.max()
+            bounds[top] = saved
+            if gains[best] >= rest:
+                break
+            block *= 4
+        position = int(top[best])
+        team.append((position, float(gains[best])))
+        covered = np.maximum(covered, coverage[position])
+        bounds[position] = -np.inf
+    return team
+
+
+def form_team(index: IndexSnapshot, required_skills: List[str], team_size: int, query: Optional[np.ndarray] = None,
+              nlp_engine=None, candidate_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+    team_index = team_index_for(index)
+    coverage = team_index.coverage_matrix(required_skills)
+    fit = semantic_fit(index, team_index, query, nlp_engine) if query is not None else np.zeros(len(team_index.user_ids))
+
+    candidates = None
+    if candidate_ids is not None:
+        candidates = np.asarray(sorted({team_index.position_of[uid] for uid in candidate_ids
+                                        if uid in team_index.position_of}), dtype=np.int64)
+    team = lazy_greedy(coverage, fit, team_size, candidates)
+
+    members = []
+    best: Dict[str, Tuple[float, str]] = {}
+    for order, (position, gain) in enumerate(team, start=1):
+        uid = team_index.user_ids[position]
+        members.append({
+            "user_id": uid,
+            "order": order,
+            "marginal_gain": round(gain, 4),
+            "ontology_score": round(float(coverage[position].mean()) if required_skills else 1.0, 4),
+            "semantic_score": round(float(fit[position]), 4),
+            "covers": [],
+        })
+        for j, skill in enumerate(required_skills):
+            if coverage[position, j] > best.get(skill, (-1.0, None))[0]:
+                best[skill] = (float(coverage[position, j]), uid)
+    by_id = {member["user_id"]: member for member in members}
+    for skill, (_, uid) in best.items():
+        by_id[uid]["covers"].append(skill)
+
+    coverage_score = float(np.mean([score for score, _ in best.values()])) if best else 0.0
+    fit_score = float(sum(fit[position] for position, _ in team)) / team_size
+    return {
+        "members": members,
+        "coverage": {skill: {"score": round(score, 4), "user_id": uid} for skill, (score, uid) in best.items()},
+        "coverage_score": round(coverage_score, 4),
+        "objective": round(W_COVERAGE * coverage_score + W_SEMANTIC * fit_score, 4),
+        "candidates": len(team_index.user_ids) if candidates is None else len(candidates),
+    }
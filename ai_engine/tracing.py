@@ -0,0 +1,203 @@
+"""
+Request tracing and structured logging for the AI Engine.
+
+Each HTTP request gets a RequestTrace (request ID + span timings) held in a
+context variable, so code on the event loop and in the threadpool can add
+spans without passing it around. Log records are JSON lines, enqueued by the
+calling thread and written by a background QueueListener, so stdout I/O never
+blocks a request. Below WARNING, only a sampled fraction of requests log.
+
+Environment:
+    CLUSTAURA_LOG_LEVEL        DEBUG / INFO / WARNING ... (default INFO)
+    CLUSTAURA_LOG_SAMPLE_RATE  fraction of requests whose INFO/DEBUG lines are kept (default 1.0)
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import queue
+import random
+import logging
+import logging.handlers
+import contextvars
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+LOG_QUEUE_SIZE = 10000
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+class RequestTrace:
+    def __init__(self, request_id: str, sampled: bool):
+        self.request_id = request_id
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+
+    def add_span(self, name: str, seconds: float):
+        self.spans.append((name, seconds))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def totals(self) -> dict:
+        """Seconds per span name; a stage run in several chunks is summed."""
+        totals = {}
+        for name, seconds in self.spans:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def span_ms(self) -> dict:
+        return {name: round(seconds * 1000, 3) for name, seconds in self.totals().items()}
+
+    def server_timing(self) -> str:
+        """Spans as a Server-Timing header value (durations in milliseconds)."""
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.totals().items()]
+        parts.append(f"total;dur={self.elapsed() * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("clustaura_trace", default=None)
+_sample_rate = 1.0
+
+
+def start_trace(request_id: Optional[str] = None) -> Tuple[RequestTrace, contextvars.Token]:
+    """Begin a trace for the current request; reuse the caller's ID when it is well-formed."""
+    if not request_id or not _VALID_REQUEST_ID.match(request_id):
+        request_id = uuid.uuid4().hex
+    trace = RequestTrace(request_id, sampled=random.random() < _sample_rate)
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token: contextvars.Token):
+    _current_trace.reset(token)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def bind_context(iterator: Iterator) -> Iterator:
+    """
+    Iterate iterator in the context current now: a streamed response body is
+    consumed after the request's trace has been reset, step by step on
+    threadpool threads.
+    """
+    context = contextvars.copy_context()
+    try:
+        while True:
+            try:
+                item = context.run(next, iterator)
+            except StopIteration:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            context.run(close)
+
+
+@contextmanager
+def span(name: str, histogram=None, **labels):
+    """Time a block as a span of the current request; optionally also observe a histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(name, seconds)
+        if histogram is not None:
+            histogram.observe(seconds, **labels)
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Runs in the calling thread: stamps the request ID and drops INFO/DEBUG
+    records of unsampled requests before they are queued.
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace = _current_trace.get()
+        if trace is None:
+            return True
+        record.request_id = trace.request_id
+        return trace.sampled or record.levelno >= logging.WARNING
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks: when the queue is full the record is counted and dropped."""
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens on the listener thread; only freeze the message here
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_configured_pid: Optional[int] = None
+
+
+def configure_logging(level: Optional[str] = None, sample_rate: Optional[float] = None, stream=None):
+    """
+    Route the "clustaura" loggers through a non-blocking queue to JSON lines
+    on stdout. Safe to call more than once; after a fork the listener thread
+    is restarted in the child.
+    """
+    global _listener, _configured_pid, _sample_rate
+    if _configured_pid == os.getpid():
+        return
+
+    _sample_rate = sample_rate if sample_rate is not None else float(os.getenv("CLUSTAURA_LOG_SAMPLE_RATE", "1.0"))
+    level = level or os.getenv("CLUSTAURA_LOG_LEVEL", "INFO")
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+
+    logger = logging.getLogger("clustaura")
+    logger.setLevel(level.upper())
+    logger.handlers = [handler]
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    _configured_pid = os.getpid()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener, _configured_pid
+    if _listener is not None and _configured_pid == os.getpid():
+        _listener.stop()
+    _listener = None
+    _configured_pid = None
@@ -0,0 +1,69 @@
+import sys
+import os
+import json
+
+# Add current directory to path so we can import capture
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from capture import TrafficCapture
+
+# The raw values that must not reach a capture file
+PII = [
+    "65f1c0ffee0000000000abcd", "65f1c0ffee0000000000beef", "65f1c0ffee0000000000f00d",
+    "Jane Doe", "jane.doe@example.com", "+1 (555) 123-4567", "https://github.com/janedoe/secret-repo",
+    "Acme Payroll Migration", "@janedoe", "janedoe",
+]
+
+
+def sync_service_payload():
+    """An /ingest/user body as server/services/syncService.js sends it, plus profile extras."""
+    return {
+        "user_id": "65f1c0ffee0000000000abcd",
+        "bio": "Backend engineer, reach me at jane.doe@example.com or +1 (555) 123-4567. I am @janedoe.",
+        "skills": ["Python", "Node.js"],
+        "projects": [{
+            "name": "Acme Payroll Migration",
+            "link": "https://github.com/janedoe/secret-repo",
+            "description": "Moved payroll to Postgres, code at https://github.com/janedoe/secret-repo",
+            "skills_demonstrated": ["Python"],
+        }],
+        "posts": [{
+            "id": "65f1c0ffee0000000000beef",
+            "_id": {"$oid": "65f1c0ffee0000000000f00d"},
+            "author": {"name": "Jane Doe", "email": "jane.doe@example.com", "username": "janedoe"},
+            "title": "Profiling Node.js services",
+            "content": "Ping @janedoe for the flame graphs.",
+            "description": "",
+            "likes": 12,
+        }],
+    }
+
+
+def test_capture_anonymisation():
+    print("Testing capture anonymisation...")
+    capture = TrafficCapture("unused.jsonl.gz", salt="fixed")
+    body = capture.anonymise(sync_service_payload())
+    dumped = json.dumps(body)
+    print(json.dumps(body, indent=2))
+
+    leaked = [value for value in PII if value in dumped]
+    assert not leaked, f"raw PII in capture: {leaked}"
+
+    # Structure and scoring inputs survive
+    assert body["user_id"] == capture.pseudonym("65f1c0ffee0000000000abcd")
+    assert body["skills"] == ["Python", "Node.js"]
+    assert body["projects"][0]["skills_demonstrated"] == ["Python"]
+    assert "name" not in body["projects"][0] and "link" not in body["projects"][0]
+    assert body["posts"][0]["title"] == "Profiling Node.js services"
+    assert body["posts"][0]["likes"] == 12
+    assert body["posts"][0]["author"] == {}
+
+    problem = capture.anonymise({"problem_id": "p1", "title": "t", "description": "d", "required_skills": ["React"],
+                                 "candidate_ids": ["a", "b"], "deadline_ms": 250})
+    assert problem["candidate_ids"] == [capture.pseudonym("a"), capture.pseudonym("b")]
+    assert problem["required_skills"] == ["React"] and problem["deadline_ms"] == 250
+    print("\nNo raw PII in the anonymised payload.")
+
+
+if __name__ == "__main__":
+    test_capture_anonymisation()
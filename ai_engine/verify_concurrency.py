@@ -0,0 +1,111 @@
+import sys
+import os
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+# Add current directory to path so we can import the server
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+import server
+
+SKILLS = ["Python", "JavaScript", "React", "Node.js", "Machine Learning", "Deep Learning", "Anomaly Detection"]
+WRITERS = 4
+READERS = 8
+OPS_PER_THREAD = 100
+
+
+def make_user(i, rng):
+    return {
+        "user_id": f"stress_{i}",
+        "bio": f"Engineer {i} working on {' and '.join(rng.sample(SKILLS, 2))}.",
+        "skills": rng.sample(SKILLS, rng.randint(1, 3)),
+        "projects": [{"description": "Built a thing", "skills_demonstrated": [rng.choice(SKILLS)]}],
+        "posts": [{"title": "Notes", "content": "Lessons learned"}] * rng.randint(0, 3),
+    }
+
+
+def writer(client, worker_id, errors, ingested):
+    rng = random.Random(worker_id)
+    for n in range(OPS_PER_THREAD):
+        # Mostly new users, some re-ingests of users other writers created
+        i = rng.randrange(WRITERS * OPS_PER_THREAD) if n % 4 == 0 else worker_id * OPS_PER_THREAD + n
+        user = make_user(i, rng)
+        response = client.post("/ingest/user", json=user)
+        if response.status_code != 200:
+            errors.append(f"ingest {user['user_id']}: {response.status_code} {response.text}")
+            continue
+        ingested.add(user["user_id"])
+
+        # Read-your-writes: the user must be visible as soon as ingest returns
+        if n % 10 == 0:
+            problem = {
+                "problem_id": f"ryw_{i}",
+                "title": "Check visibility",
+                "description": "Freshly ingested user",
+                "required_skills": [],
+                "candidate_ids": [user["user_id"]],
+            }
+            result = client.post("/recommend", json=problem).json()
+            if not result or result[0]["user_id"] != user["user_id"]:
+                errors.append(f"ingested user {user['user_id']} not visible to the next recommend")
+
+
+def reader(client, worker_id, errors, stats):
+    rng = random.Random(1000 + worker_id)
+    for n in range(OPS_PER_THREAD):
+        problem = {
+            "problem_id": f"p_{worker_id}_{n}",
+            "title": "Need help with a model",
+            "description": "Detect anomalies in production logs",
+            "required_skills": rng.sample(SKILLS, 2),
+        }
+        response = client.post("/recommend", json=problem)
+        if response.status_code != 200:
+            errors.append(f"recommend: {response.status_code} {response.text}")
+            continue
+        results = response.json()
+        ranks = [r["rank"] for r in results]
+        if ranks != list(range(1, len(results) + 1)):
+            errors.append(f"recommend returned non-contiguous ranks: {ranks}")
+        stats.append(len(results))
+
+
+def test_concurrency():
+    print("Stress testing concurrent ingest + recommend...")
+    errors = []
+    ingested = set()
+    stats = []
+
+    with TestClient(server.app) as client:
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=WRITERS + READERS) as pool:
+            futures = [pool.submit(writer, client, w, errors, ingested) for w in range(WRITERS)]
+            futures += [pool.submit(reader, client, r, errors, stats) for r in range(READERS)]
+            for f in futures:
+                f.result()
+        elapsed = time.time() - start
+
+        status = client.get("/admin/index").json()
+
+    total_ops = (WRITERS + READERS) * OPS_PER_THREAD
+    print(f"  {total_ops} operations in {elapsed:.2f}s ({total_ops / elapsed:.0f} ops/s)")
+    print(f"  Final epoch: {status['current']['epoch']} with {status['current']['users']} users")
+    print(f"  Average result size: {sum(stats) / max(len(stats), 1):.1f}")
+
+    if status["current"]["users"] != len(ingested):
+        errors.append(f"expected {len(ingested)} users in final epoch, found {status['current']['users']}")
+    if status["draining"]:
+        errors.append(f"retired epochs still held after all requests finished: {status['draining']}")
+
+    if errors:
+        print(f"\nFAILED with {len(errors)} errors:")
+        for e in errors[:20]:
+            print(f"  {e}")
+        sys.exit(1)
+    print("\nPASSED: no errors, all writes visible, no epochs leaked.")
+
+
+if __name__ == "__main__":
+    test_concurrency()
@@ -0,0 +1,55 @@
+import sys
+import os
+import random
+
+# Add current directory to path so we can import ranker
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ranker import SortedFeature, threshold_top_k
+
+
+def brute_force(features, k, allowed):
+    """Every competing user scored in full: the allowed ones, or anyone in some list."""
+    users = allowed if allowed is not None else {uid for _, f in features for uid in f.user_ids}
+    totals = [(sum(weight * f.score(uid) for weight, f in features), uid) for uid in users]
+    return sorted(totals, reverse=True)[:k]
+
+
+def random_feature(rng, users, coverage):
+    listed = [uid for uid in users if rng.random() < coverage]
+    # Negative scores as well as positive ones, and defaults on either side of them
+    scores = {uid: round(rng.uniform(-1.0, 1.0), 3) for uid in listed}
+    return SortedFeature.from_scores(scores, default=round(rng.uniform(-1.0, 1.0), 3))
+
+
+def test_missing_users_score_default():
+    print("Testing users missing from a list...")
+    # c is only in the second list but scores the first list's default of 0.4
+    first = SortedFeature.from_scores({"a": 0.9, "b": 0.05}, default=0.4)
+    second = SortedFeature.from_scores({"a": 0.5, "b": 0.0, "c": 0.2})
+    top, _ = threshold_top_k([(1.0, first), (1.0, second)], 2, {"a", "b", "c"})
+    assert [uid for _, uid in top] == ["a", "c"], top
+    print("Missing users are bounded by the list default.")
+
+
+def test_threshold_matches_brute_force():
+    print("Testing threshold_top_k against a full scan...")
+    rng = random.Random(0)
+    for trial in range(2000):
+        users = [f"u{i}" for i in range(rng.randint(1, 40))]
+        features = [(round(rng.uniform(0.0, 1.0), 3), random_feature(rng, users, rng.choice([0.3, 0.7, 1.0])))
+                    for _ in range(rng.randint(1, 4))]
+        allowed = None if rng.random() < 0.2 else {uid for uid in users if rng.random() < 0.8}
+        k = rng.randint(1, 10)
+
+        got, _ = threshold_top_k(features, k, allowed)
+        expected = brute_force(features, k, allowed)
+        # Ties may order differently; the scores must match exactly
+        assert [round(score, 9) for score, _ in got] == [round(score, 9) for score, _ in expected], \
+            f"trial {trial}: got {got}, expected {expected}"
+    print("threshold_top_k matched the full scan in 2000 random trials.")
+
+
+if __name__ == "__main__":
+    test_missing_users_score_default()
+    test_threshold_matches_brute_force()
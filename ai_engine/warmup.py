@@ -0,0 +1,89 @@
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from types import SimpleNamespace
+
+# Representative inputs: problem-statement-sized texts and seeded skill names
+WARMUP_TEXTS = [
+    "Detect anomalies in production logs with a deep learning model",
+    "Build a React dashboard backed by a Node.js API",
+    "Speed up a slow Python data pipeline",
+    "Experienced machine learning engineer. Built fraud detection and recommendation systems.",
+]
+WARMUP_SKILLS = ["Python", "JavaScript", "React", "Node.js", "Machine Learning", "Deep Learning", "Anomaly Detection"]
+# Batch sizes the request paths actually use: 1 for a problem, larger for
+# embedding a batch of candidates, and the default encode batch.
+WARMUP_BATCH_SIZES = [1, 8, 64]
+WARMUP_ROUNDS = 2
+
+
+class Readiness:
+    """
+    Tracks whether this process may take traffic: components loaded and the
+    warm-up finished. Request handlers wait on it instead of failing.
+    """
+    def __init__(self):
+        self._ready = threading.Event()
+        self.state = "starting"
+        self.warmup: Dict[str, float] = {}
+        self.error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def set_ready(self, warmup: Dict[str, float], error: Optional[str] = None):
+        self.warmup = warmup
+        self.error = error
+        self.state = "ready"
+        self._ready.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def describe(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "state": self.state, "warmup": self.warmup, "error": self.error}
+
+
+def _time(timings: Dict[str, float], name: str, fn: Callable, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    timings[name] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def run_warmup(nlp_engine, intent_classifier, ontology, ranker) -> Dict[str, float]:
+    """
+    Run each hot path a few times so torch kernels, tokenizer caches and
+    first-call allocations are paid for before the first real request.
+    Returns {step: seconds} for the last round; the first-round cost of each
+    step is reported as "<step>.first".
+    """
+    timings: Dict[str, float] = {}
+    for round_no in range(WARMUP_ROUNDS):
+        suffix = ".first" if round_no == 0 else ""
+        step_timings: Dict[str, float] = {}
+
+        for batch_size in WARMUP_BATCH_SIZES:
+            texts = (WARMUP_TEXTS * (batch_size // len(WARMUP_TEXTS) + 1))[:batch_size]
+            _time(step_timings, f"embed_batch_{batch_size}", nlp_engine.embed_batch, texts)
+        # The classifier embeds single queries through embed(), a different encode path
+        queries: List[str] = [examples[0] for examples in intent_classifier.intents.values()]
+        _time(step_timings, "embed_single", nlp_engine.embed, queries[0])
+        _time(step_timings, "classify", lambda: [intent_classifier.classify(q) for q in queries])
+
+        _time(step_timings, "find_capable_users", ontology.find_capable_users, WARMUP_SKILLS[:2])
+        _time(step_timings, "ontology_scoring", lambda: [
+            ontology.calculate_user_similarity(WARMUP_SKILLS[i:i + 2], WARMUP_SKILLS[-2:])
+            for i in range(len(WARMUP_SKILLS))
+        ])
+
+        user_db = {"warmup": {"skills": WARMUP_SKILLS[:2], "projects": [{}], "posts": []}}
+        problem = SimpleNamespace(required_skills=WARMUP_SKILLS[-2:])
+        _time(step_timings, "rank", ranker.rank, ["warmup"], problem, user_db, {"warmup": 0.5}, {"warmup": 0.5})
+
+        for name, seconds in step_timings.items():
+            timings[name + suffix] = seconds
+
+    timings["total"] = round(sum(timings.values()), 4)
+    return timings
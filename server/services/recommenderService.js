@@ -8,7 +8,7 @@ const AI_ENGINE_URL = process.env.AI_ENGINE_URL || 'http://localhost:8000';
 class RecommenderService {
     /**
      * Get expert recommendations for a specific problem statement
-     * @param {Object} problemData - { problem_id, title, description, required_skills }
+     * @param {Object} problemData - { problem_id, title, description, required_skills, candidate_ids?, deadline_ms? }
      */
     async getRecommendations(problemData) {
         try {
@@ -17,7 +17,8 @@ class RecommenderService {
                 title: problemData.title,
                 description: problemData.description,
                 required_skills: problemData.required_skills || [],
-                candidate_ids: problemData.candidate_ids || null // Optional filter
+                candidate_ids: problemData.candidate_ids || null, // Optional filter
+                deadline_ms: problemData.deadline_ms ?? null // Optional latency budget
             });
             return response.data;
         } catch (error) {
@@ -26,6 +27,26 @@ class RecommenderService {
         }
     }
 
+    /**
+     * Assemble a team covering the required skills
+     * @param {Object} teamData - { required_skills, team_size, title?, description?, candidate_ids? }
+     */
+    async recommendTeam(teamData) {
+        try {
+            const response = await axios.post(`${AI_ENGINE_URL}/recommend/team`, {
+                required_skills: teamData.required_skills || [],
+                team_size: teamData.team_size,
+                title: teamData.title || '',
+                description: teamData.description || '',
+                candidate_ids: teamData.candidate_ids || null // Optional filter
+            });
+            return response.data;
+        } catch (error) {
+            console.error('Error fetching a team from AI Engine:', error.message);
+            return null;
+        }
+    }
+
     /**
      * Ingest or Update a user profile in the AI Engine's index
      * @param {Object} userData - { user_id, bio, skills, projects, posts }